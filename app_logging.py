@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 日志子系统：分级日志、重复消息去重与限流、后台线程写入的滚动日志文件，
+# 以及固定行数(环形缓冲)、批量刷新的界面日志查看器。
+
+import os
+import re
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QPlainTextEdit
+
+LOGGER_NAME = "videoapp"
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+DEFAULT_LOG_DIR = "./logs"
+
+# 兼容原有 "[INFO] xxx" 形式的消息前缀
+_PREFIX_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARN": logging.WARNING,
+    "WARNING": logging.WARNING,
+    "警告": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "错误": logging.ERROR,
+}
+_PREFIX_RE = re.compile(r"^\s*\[([^\]]+)\]\s*")
+
+_listener = None
+
+
+def get_logger(name=None):
+    """ 获取应用日志器，name 作为子日志器名称 """
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def parse_level_prefix(text):
+    """ 解析 "[LEVEL] 消息" 形式的文本，返回 (level, 去掉前缀的消息) """
+    m = _PREFIX_RE.match(text)
+    if m and m.group(1).upper() in _PREFIX_LEVELS:
+        return _PREFIX_LEVELS[m.group(1).upper()], text[m.end():]
+    return logging.INFO, text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    对重复消息去重与限流：数字不同但其余相同的消息视为同一类，
+    每个 interval 秒内同类消息最多放行 burst 条，窗口结束后补记被省略的条数。
+    挂在处理器上(日志器上的过滤器对子日志器传上来的记录不生效)；
+    同一条记录经过多个处理器时只判定一次，各处理器结果一致。
+    """
+    _DIGITS_RE = re.compile(r"\d+")
+
+    def __init__(self, interval=5.0, burst=1):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._state = {}  # key -> [窗口开始时间, 已放行数, 已省略数]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        decided = getattr(record, "rate_limit_passed", None)
+        if decided is not None:
+            return decided
+        record.rate_limit_passed = self._decide(record)
+        return record.rate_limit_passed
+
+    def _decide(self, record):
+        if record.levelno >= logging.ERROR:
+            return True  # 错误总是放行
+        key = (record.levelno, self._DIGITS_RE.sub("#", record.getMessage()))
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.interval:
+                suppressed = state[2] if state else 0
+                self._state[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.getMessage()} (同类消息已省略 {suppressed} 条)"
+                    record.args = None
+                if len(self._state) > 1024:
+                    self._prune(now)
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+    def _prune(self, now):
+        for key in [k for k, v in self._state.items() if now - v[0] >= self.interval and not v[2]]:
+            del self._state[key]
+
+
+# 文件与界面两个处理器共用的去重限流过滤器
+RATE_LIMIT_FILTER = RateLimitFilter()
+
+
+class BufferedViewerHandler(logging.Handler):
+    """
+    把日志行放入有界缓冲区，由界面线程定时批量取出；
+    emit 可在任意线程调用，不直接触碰界面控件
+    """
+    def __init__(self, capacity=2000):
+        super().__init__()
+        self.pending = deque(maxlen=capacity)
+
+    def emit(self, record):
+        try:
+            self.pending.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def drain(self):
+        lines = []
+        while True:
+            try:
+                lines.append(self.pending.popleft())
+            except IndexError:
+                return lines
+
+
+def setup_logging(log_dir=DEFAULT_LOG_DIR, level=logging.DEBUG, max_bytes=5 * 1024 * 1024, backup_count=5):
+    """
+    初始化应用日志：日志器只把记录放入队列，由后台 QueueListener 线程写滚动文件，
+    热路径上不做任何磁盘IO。重复调用时直接返回已有日志器。
+    """
+    global _listener
+    logger = get_logger()
+    if _listener is not None:
+        return logger
+
+    logger.setLevel(level)
+    logger.propagate = False
+
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = RotatingFileHandler(
+        os.path.join(log_dir, "app.log"), maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.Queue(-1)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RATE_LIMIT_FILTER)
+    logger.addHandler(queue_handler)
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    return logger
+
+
+def shutdown_logging():
+    """ 停止后台写文件线程，确保队列中的日志全部落盘 """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class LogViewer(QPlainTextEdit):
+    """
+    界面日志查看器：最多保留 max_lines 行(超出后丢弃最旧的行)，
+    日志先进入缓冲区，再由定时器每 flush_ms 毫秒批量追加一次。
+    保留 append(text) 接口，兼容原有 "[INFO] xxx" 形式的调用。
+    """
+    def __init__(self, max_lines=2000, flush_ms=200, level=logging.INFO, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lines)
+        self.logger = get_logger()
+        self.handler = BufferedViewerHandler(capacity=max_lines)
+        self.handler.setLevel(level)
+        self.handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%H:%M:%S"))
+        self.handler.addFilter(RATE_LIMIT_FILTER)
+        self.logger.addHandler(self.handler)
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start(flush_ms)
+
+    def set_level(self, level):
+        self.handler.setLevel(level)
+
+    def append(self, text):
+        """ 兼容接口：按前缀解析级别后写入日志系统 """
+        level, msg = parse_level_prefix(str(text))
+        self.logger.log(level, msg)
+
+    def flush(self):
+        lines = self.handler.drain()
+        if not lines:
+            return
+        bar = self.verticalScrollBar()
+        at_bottom = bar.value() >= bar.maximum() - 4
+        self.appendPlainText("\n".join(lines))
+        if at_bottom:
+            bar.setValue(bar.maximum())
+
+    def close_handler(self):
+        self._timer.stop()
+        self.logger.removeHandler(self.handler)
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 可复现的流水线基准测试：无需摄像头与GPU，使用合成帧或本地视频文件，
+# 依次经过 采集 -> 检测(真实模型或固定延迟桩) -> 显示转换 -> 录像(与界面相同的写入器与恒定帧率对齐) 各阶段，
+# 输出吞吐、p50/p99延迟、峰值内存与丢帧数(JSON)，并可与基线结果对比。
+# 每个场景开始前清空帧池，峰值内存与帧池命中率不受场景顺序影响。
+#
+# 用法示例：
+#   python benchmark.py --resolutions 480P 720P 1080P --detector stub --frames 300
+#   python benchmark.py --source ./videos/sample.mp4 --detector yolo --model ./models/yolov5su.pt
+#   python benchmark.py --output new.json --compare baseline.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from utils import SUPPORTED_RESOLUTIONS
+from detection import Detections, draw_detections
+from frame_pool import FRAME_POOL, pooled_read, scale_to_fit
+from video_writer import create_video_writer, BACKEND_AUTO, BACKEND_FFMPEG, BACKEND_OPENCV
+
+DISPLAY_SIZE = (960, 540)  # 模拟界面显示区域大小
+REGRESSION_THRESHOLD = 0.10  # 与基线相比变差超过10%视为回归
+
+
+class SyntheticSource:
+    """
+    合成视频源：预先生成若干帧(噪声背景+移动方块)循环输出，
+    生成开销不计入采集耗时
+    """
+    def __init__(self, width, height, num_unique=30, seed=0):
+        rng = np.random.RandomState(seed)
+        background = rng.randint(0, 255, (height, width, 3), dtype=np.uint8)
+        self.frames = []
+        box = max(16, height // 8)
+        for i in range(num_unique):
+            frame = background.copy()
+            x = int((width - box) * i / max(num_unique - 1, 1))
+            y = (height - box) // 2
+            cv2.rectangle(frame, (x, y), (x + box, y + box), (0, 255, 0), -1)
+            self.frames.append(frame)
+        self.index = 0
+        self.width, self.height = width, height
+
+    def read(self):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        # 与真实采集一样每帧写入一个新的帧池缓冲区(相当于 cap.read(image))
+        buf = FRAME_POOL.like(frame)
+        np.copyto(buf, frame)
+        return True, buf
+
+    def release(self):
+        self.frames = []
+
+
+class FileSource:
+    """ 本地视频文件源，读到结尾后从头循环 """
+    def __init__(self, path, width=None, height=None):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"无法打开视频文件: {path}")
+        self.resize_to = (width, height) if width and height else None
+        self.width = width or int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = height or int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.shape = None
+
+    def read(self):
+        ret, frame = pooled_read(self.cap, self.shape)
+        if not ret:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = pooled_read(self.cap, self.shape)
+        if not ret:
+            return ret, frame
+        self.shape = frame.shape
+        if self.resize_to and frame.shape[1::-1] != self.resize_to:
+            resized = FRAME_POOL.acquire((self.resize_to[1], self.resize_to[0], 3))
+            cv2.resize(frame, self.resize_to, dst=resized)
+            FRAME_POOL.release(frame)
+            frame = resized
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class StubDetector:
+    """
+    固定延迟的检测桩：模拟推理耗时并输出固定检测框，
+    用于在没有模型/GPU的机器上衡量流水线其余部分的开销
+    """
+    def __init__(self, latency_ms=20.0, skip_frames=2):
+        self.latency = latency_ms / 1000.0
+        self.skip_frames = skip_frames
+        self.frame_count = 0
+        self.last_detections = Detections()
+
+    def detect_and_plot(self, frame, conf_thres=0.25, classes=None):
+        self.frame_count += 1
+        if (self.frame_count - 1) % (self.skip_frames + 1) == 0:
+            time.sleep(self.latency)
+            h, w = frame.shape[:2]
+            self.last_detections = Detections(
+                [[w * 0.1, h * 0.1, w * 0.3, h * 0.5], [w * 0.6, h * 0.4, w * 0.9, h * 0.9]],
+                [0.9, 0.6], [0, 2]
+            )
+        return draw_detections(frame, self.last_detections, {0: "person", 2: "car"}, copy=False)
+
+
+def make_detector(kind, model_path, stub_latency_ms):
+    if kind == "none":
+        return None
+    if kind == "stub":
+        return StubDetector(latency_ms=stub_latency_ms)
+    from detection import YoloDetector
+    return YoloDetector(model_path=model_path)
+
+
+def convert_for_display(frame, use_qt=False):
+    """ 与 MainWindow.update_frame 相同的显示转换：等比缩放到显示区域(帧池缓冲区)后包装为 QImage """
+    display, _ = scale_to_fit(frame, DISPLAY_SIZE[0], DISPLAY_SIZE[1])
+    try:
+        h, w = display.shape[:2]
+        if use_qt:
+            from PyQt5.QtGui import QImage, QPixmap
+            fmt = getattr(QImage, "Format_BGR888", None)
+            if fmt is None:
+                cv2.cvtColor(display, cv2.COLOR_BGR2RGB, dst=display)
+                fmt = QImage.Format_RGB888
+            return QPixmap.fromImage(QImage(display.data, w, h, display.strides[0], fmt))
+        return w, h
+    finally:
+        FRAME_POOL.release(display)
+
+
+def summarize(samples):
+    if not samples:
+        return {"p50_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+    arr = np.asarray(samples) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+    }
+
+
+def run_scenario(name, source, detector, frames, fps, record_dir, realtime, use_qt, encoder=BACKEND_AUTO):
+    """
+    运行一个场景并返回结果字典。
+    realtime=True 时按 fps 模拟实时相机：处理跟不上时，期间产生的帧计为丢帧。
+    录像使用界面的 create_video_writer，按模拟相机的采集时刻写入，经 CfrPacer 补帧/跳帧
+    """
+    stages = {"capture": [], "inference": [], "display": [], "record": []}
+    end_to_end = []
+    # 帧池是进程内共享的，先清空，避免前一个场景填满的缓冲区让本场景的峰值内存接近0
+    FRAME_POOL.clear(reset_stats=True)
+    writer = None
+    if record_dir is not None:
+        path = os.path.join(record_dir, f"{name}.mp4")
+        writer = create_video_writer(path, float(fps), (source.width, source.height), backend=encoder)
+
+    dropped = 0
+    last_index = -1
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    processed = 0
+    while processed < frames:
+        if realtime:
+            # 实时源：取当前时刻相机"最新"的一帧，中间错过的帧计入丢帧
+            index = int((time.perf_counter() - t0) * fps)
+            if index == last_index:
+                time.sleep(max(0.0, (index + 1) / fps - (time.perf_counter() - t0)))
+                continue
+            dropped += max(0, index - last_index - 1)
+            last_index = index
+
+        start = time.perf_counter()
+        ret, frame = source.read()
+        if not ret:
+            break
+        t = time.perf_counter()
+        stages["capture"].append(t - start)
+
+        if detector is not None:
+            s = time.perf_counter()
+            frame = detector.detect_and_plot(frame)
+            stages["inference"].append(time.perf_counter() - s)
+
+        s = time.perf_counter()
+        convert_for_display(frame, use_qt)
+        stages["display"].append(time.perf_counter() - s)
+
+        if writer is not None:
+            s = time.perf_counter()
+            # 模拟相机时间轴上的采集时刻；实时模式下丢帧处由 CfrPacer 重复上一帧补齐
+            captured = last_index if realtime else processed
+            writer.write(frame, timestamp=t0 + captured / fps)
+            stages["record"].append(time.perf_counter() - s)
+        FRAME_POOL.release(frame)
+
+        end_to_end.append(time.perf_counter() - start)
+        processed += 1
+
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    record = None
+    if writer is not None:
+        writer.release()
+        record = {"writer": type(writer).__name__, "frames": writer.frames, "duplicated": writer.duplicated,
+                  "skipped": writer.skipped, "dropped": writer.dropped}
+    pool = FRAME_POOL.stats()
+
+    return {
+        "scenario": name,
+        "resolution": f"{source.width}x{source.height}",
+        "frames": processed,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_fps": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency": summarize(end_to_end),
+        "stages": {k: summarize(v) for k, v in stages.items() if v},
+        "peak_traced_mb": round(peak / 1e6, 2),
+        "dropped_frames": dropped,
+        "record": record,
+        "frame_pool": {"hits": pool["hits"], "misses": pool["misses"], "hit_ratio": round(pool["hit_ratio"], 4)},
+    }
+
+
+def peak_rss_mb():
+    """ 进程峰值常驻内存(MB)，Windows 上不可用时返回 None """
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(rss / (1e6 if sys.platform == "darwin" else 1e3), 1)
+    except ImportError:
+        return None
+
+
+def compare(results, baseline_path):
+    """ 与基线结果逐场景对比，返回回归列表 """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get(r["scenario"])
+        if base is None:
+            continue
+        checks = [
+            ("throughput_fps", base["throughput_fps"], r["throughput_fps"], True),
+            ("latency.p99_ms", base["latency"]["p99_ms"], r["latency"]["p99_ms"], False),
+            ("peak_traced_mb", base["peak_traced_mb"], r["peak_traced_mb"], False),
+        ]
+        for metric, old, new, higher_is_better in checks:
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "回归" if worse > REGRESSION_THRESHOLD else "ok"
+            print(f"{r['scenario']:<28} {metric:<16} {old:>10.2f} -> {new:>10.2f} ({change * 100:+.1f}%) {flag}")
+            if worse > REGRESSION_THRESHOLD:
+                regressions.append((r["scenario"], metric))
+        if r["dropped_frames"] > base["dropped_frames"]:
+            regressions.append((r["scenario"], "dropped_frames"))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="视频采集与检测流水线基准测试")
+    parser.add_argument("--resolutions", nargs="+", default=list(SUPPORTED_RESOLUTIONS.keys()),
+                        choices=list(SUPPORTED_RESOLUTIONS.keys()))
+    parser.add_argument("--source", default=None, help="本地视频文件，不指定则使用合成帧")
+    parser.add_argument("--detector", nargs="+", default=["none", "stub"], choices=["none", "stub", "yolo"])
+    parser.add_argument("--model", default="./models/yolov5su.pt")
+    parser.add_argument("--stub-latency", type=float, default=20.0, help="检测桩的固定推理延迟(毫秒)")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--realtime", action="store_true", help="按fps模拟实时相机并统计丢帧")
+    parser.add_argument("--no-record", action="store_true", help="跳过录像阶段")
+    parser.add_argument("--encoder", default=BACKEND_AUTO, choices=[BACKEND_AUTO, BACKEND_FFMPEG, BACKEND_OPENCV],
+                        help="录像写入器后端(与界面的编码设置相同)")
+    parser.add_argument("--qt", action="store_true", help="显示转换使用QImage(与界面一致)")
+    parser.add_argument("--output", default=None, help="结果JSON输出路径")
+    parser.add_argument("--compare", default=None, help="基线结果JSON，用于回归对比")
+    args = parser.parse_args(argv)
+
+    cv2.setRNGSeed(0)
+    record_dir = None if args.no_record else tempfile.mkdtemp(prefix="bench_rec_")
+    results = []
+    try:
+        for res_name in args.resolutions:
+            width, height = SUPPORTED_RESOLUTIONS[res_name]
+            for kind in args.detector:
+                source = FileSource(args.source, width, height) if args.source else SyntheticSource(width, height)
+                detector = make_detector(kind, args.model, args.stub_latency)
+                name = f"{res_name}-{kind}{'-rt' if args.realtime else ''}"
+                result = run_scenario(name, source, detector, args.frames, args.fps,
+                                      record_dir, args.realtime, args.qt, args.encoder)
+                source.release()
+                results.append(result)
+                print(f"{name:<28} {result['throughput_fps']:8.1f} fps  "
+                      f"p50 {result['latency']['p50_ms']:7.2f}ms  p99 {result['latency']['p99_ms']:7.2f}ms  "
+                      f"peak {result['peak_traced_mb']:7.1f}MB  dropped {result['dropped_frames']}")
+    finally:
+        if record_dir is not None:
+            shutil.rmtree(record_dir, ignore_errors=True)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare)
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能回归")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
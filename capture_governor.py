@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 采集负载调节：CPU占用或采集流水线延迟持续超限时逐级降低采集分辨率/帧率，
+# 负载回落且有余量时再逐级恢复，过载的机器画质平滑下降，而不是延迟不断累积。
+# 档位切换复用 latency_controller.HysteresisLadder 的迟滞与冷却逻辑。
+# 检测区域与计数线/区域按原图像素坐标保存，设置了它们时调节器只降帧率、保持分辨率不变。
+
+import cv2
+
+from latency_controller import HysteresisLadder
+from utils import SUPPORTED_RESOLUTIONS
+
+try:
+    import psutil
+except ImportError:
+    psutil = None  # 没有psutil时读取 /proc/stat
+
+# 调节器可用的分辨率(含比界面选项更低的一档)与帧率档位
+GOVERNOR_RESOLUTIONS = sorted(set(SUPPORTED_RESOLUTIONS.values()) | {(320, 240)},
+                              key=lambda wh: wh[0] * wh[1], reverse=True)
+GOVERNOR_FPS = (60, 30, 25, 20, 15, 10)
+MIN_GOVERNOR_FPS = 10
+
+
+_last_cpu_times = None  # 上次读取 /proc/stat 的 (总时间, 空闲时间)
+
+
+def _proc_stat_times():
+    """ /proc/stat 中所有CPU的 (总时间, 空闲时间)，不可读时返回 None """
+    try:
+        with open("/proc/stat") as f:
+            fields = f.readline().split()
+    except OSError:
+        return None
+    if not fields or fields[0] != "cpu":
+        return None
+    values = [int(v) for v in fields[1:]]
+    # idle + iowait；guest 已计入 user，不再重复累加
+    return sum(values[:8]), sum(values[3:5])
+
+
+def cpu_percent():
+    """
+    系统CPU占用百分比，取两次调用之间的平均值；有psutil时使用psutil，
+    否则由 /proc/stat 的差值计算。都不可用或首次调用没有基准时返回 None(调节器忽略CPU)
+    """
+    global _last_cpu_times
+    if psutil is not None:
+        return psutil.cpu_percent(interval=None)
+    times = _proc_stat_times()
+    if times is None:
+        return None
+    last, _last_cpu_times = _last_cpu_times, times
+    if last is None or times[0] <= last[0]:
+        return None
+    busy = (times[0] - last[0]) - (times[1] - last[1])
+    return max(0.0, min(100.0, busy / (times[0] - last[0]) * 100.0))
+
+
+def negotiate_format(cap, width, height, fps):
+    """
+    向摄像头请求分辨率 / 帧率，返回实际生效的 (宽, 高, 帧率)。
+    后端不支持查询时尺寸按请求值返回，收到第一帧后应以实际帧尺寸为准；帧率未知时返回 0
+    """
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+    actual_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    actual_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    actual_fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+    if actual_w <= 0 or actual_h <= 0:
+        actual_w, actual_h = width, height
+    return actual_w, actual_h, actual_fps
+
+
+def build_capture_levels(width, height, fps, resolutions=GOVERNOR_RESOLUTIONS, fps_steps=GOVERNOR_FPS,
+                         min_fps=MIN_GOVERNOR_FPS):
+    """
+    生成 [(宽, 高, 帧率)] 档位表，索引0为用户选择的格式，之后帧率与分辨率交替降一档，
+    先降帧率(对画面观感影响较小)，直到两者都降到最低
+    """
+    res = [(width, height)] + [r for r in resolutions if r[0] * r[1] < width * height]
+    rates = [fps] + [f for f in fps_steps if min_fps <= f < fps]
+    levels = [(res[0][0], res[0][1], rates[0])]
+    ri = fi = 0
+    while ri < len(res) - 1 or fi < len(rates) - 1:
+        if fi < len(rates) - 1 and (fi <= ri or ri >= len(res) - 1):
+            fi += 1
+        else:
+            ri += 1
+        levels.append((res[ri][0], res[ri][1], rates[fi]))
+    return levels
+
+
+class CaptureGovernor:
+    """
+    采集线程每秒调用一次 update() 上报负载：
+      busy_ratio   每帧处理耗时(读取之后到发出之前)与帧间隔之比
+      queue_depth  等待界面处理的帧数
+      dropped      本周期内因积压丢弃的帧数
+    任一项持续超限即视为过载；CPU占用作为附加条件(取不到时忽略)。
+    fps_only 为 True 时只使用降帧率的档位(分辨率保持用户选择的值)，可在运行中由其他线程修改，
+    下一次 update() 时生效。
+    """
+    def __init__(self, width, height, fps, cpu_high=85.0, cpu_low=60.0, busy_high=0.9, busy_low=0.5,
+                 max_queue=2, down_after=3, up_after=30, cooldown=10.0, fps_only=False):
+        self._all_levels = build_capture_levels(width, height, fps)
+        self._fps_levels = build_capture_levels(width, height, fps, resolutions=())
+        self.fps_only = fps_only
+        self._levels_fps_only = fps_only
+        self.levels = self._fps_levels if fps_only else self._all_levels
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.busy_high = busy_high
+        self.busy_low = busy_low
+        self.max_queue = max_queue
+        self.ladder = HysteresisLadder(len(self.levels), 0, down_after=down_after,
+                                       up_after=up_after, cooldown=cooldown)
+        self.cpu = None
+        self.busy_ratio = 0.0
+        self.queue_depth = 0
+        self.dropped = 0
+        self.reason = ""
+
+    @property
+    def level(self):
+        return self.ladder.level
+
+    @property
+    def target(self):
+        """ 当前档位的 (宽, 高, 帧率) """
+        return self.levels[self.ladder.level]
+
+    def _sync_levels(self):
+        """
+        fps_only 变化时切换档位表，返回目标格式是否变化。优先保持当前分辨率、取不高于当前帧率的档位；
+        新表中没有当前分辨率时按帧率对应，已降到最低帧率时取该分辨率下的最后一档
+        """
+        if self.fps_only == self._levels_fps_only:
+            return False
+        old = self.target
+        self._levels_fps_only = self.fps_only
+        self.levels = self._fps_levels if self.fps_only else self._all_levels
+        same = [i for i, level in enumerate(self.levels) if level[:2] == old[:2]]
+        if same:
+            level = next((i for i in same if self.levels[i][2] <= old[2]), same[-1])
+        else:
+            level = next((i for i, (_, _, fps) in enumerate(self.levels) if fps <= old[2]), len(self.levels) - 1)
+        self.ladder.num_levels = len(self.levels)
+        self.ladder.level = level
+        if self.target == old:
+            return False
+        self.reason = "检测区域/计数线需保持分辨率"
+        return True
+
+    def update(self, busy_ratio, queue_depth, dropped=0, now=None):
+        """ 输入一个采样周期的测量值，返回目标格式是否发生变化 """
+        switched = self._sync_levels()
+        self.cpu = cpu_percent()
+        self.busy_ratio = busy_ratio
+        self.queue_depth = queue_depth
+        self.dropped = dropped
+
+        reasons = []
+        if busy_ratio > self.busy_high:
+            reasons.append("处理耗时")
+        if queue_depth > self.max_queue or dropped > 0:
+            reasons.append("队列积压")
+        if self.cpu is not None and self.cpu > self.cpu_high:
+            reasons.append("CPU")
+        idle = (busy_ratio < self.busy_low and queue_depth == 0 and dropped == 0
+                and (self.cpu is None or self.cpu < self.cpu_low))
+        changed = self.ladder.update(bool(reasons), idle, now)
+        if changed:
+            self.reason = "、".join(reasons) if reasons else "负载回落"
+        return changed or switched
+
+    def stats(self):
+        width, height, fps = self.target
+        return {
+            "level": self.ladder.level,
+            "levels": len(self.levels),
+            "fps_only": self._levels_fps_only,
+            "width": width,
+            "height": height,
+            "fps": fps,
+            "cpu": self.cpu,
+            "busy_ratio": self.busy_ratio,
+            "queue_depth": self.queue_depth,
+            "changes": self.ladder.changes,
+            "reason": self.reason,
+        }
@@ -4,18 +4,38 @@
 # 并可选用YOLO检测后再发送给主界面进行显示与录像。
 
 import time
+import queue
+import threading
+import multiprocessing
 import cv2
+import numpy as np
 import traceback
 from PyQt5.QtCore import QThread, pyqtSignal
+from metrics import REGISTRY
+from app_logging import get_logger
+from network_stream import NetworkStreamReader, is_network_source
+from capture_governor import negotiate_format
+from frame_pool import FRAME_POOL, pooled_read
+from frame_envelope import FrameEnvelope
+from shm_transport import (
+    SharedFrameRing, capture_worker, MAX_FRAME_BYTES, MSG_ERROR, MSG_STATUS, MSG_LOG,
+    MSG_FORMAT, MSG_GOVERNOR, MSG_DUAL_STREAM
+)
+
+logger = get_logger("capture")
 
 class VideoCaptureThread(QThread):
     """
     在单独的线程中执行视频采集/检测，发出frameCaptured信号供主界面更新UI。
+    帧解码到帧缓冲池的缓冲区中，装入帧信封随信号交给界面，界面处理完后负责 env.release()。
     """
-    frameCaptured = pyqtSignal(object)   # 发送图像帧
+    frameCaptured = pyqtSignal(object)   # 发送帧信封(FrameEnvelope)
     cameraError = pyqtSignal(str)        # 发送摄像头错误消息
+    streamStatus = pyqtSignal(str)       # 网络视频流状态变化(连接/重连)
+    formatNegotiated = pyqtSignal(int, int, float)  # 实际生效的 宽, 高, 帧率
 
-    def __init__(self, cameraIndex=0, width=640, height=480, fps=30, detector=None):
+    def __init__(self, cameraIndex=0, width=640, height=480, fps=30, detector=None, maxPending=4,
+                 governor=None, dualStream=None):
         super().__init__()
         self.cameraIndex = cameraIndex
         self.width = width
@@ -24,44 +44,212 @@ class VideoCaptureThread(QThread):
         self.detector = detector
         self._running = True
         self.cap = None
+        self._pending = 0  # 已发出但界面尚未处理的帧数(队列深度)
+        self._pendingLock = threading.Lock()
+        self.maxPending = maxPending  # 界面积压超过该帧数时丢弃新帧，避免延迟累积
+        self.metricsSource = str(cameraIndex)
+        self.governor = governor  # 可选的采集负载调节器(capture_governor.CaptureGovernor)
+        self.negotiated = None    # 摄像头实际生效的 (宽, 高, 帧率)
+        self.dualStream = dualStream  # 可选的双码流(dual_stream.DualStream)，为推理/预览提供低分辨率分析流
 
-    def run(self):
-        """ 线程主体：打开摄像头，循环采集帧并检测 """
+    def frame_consumed(self):
+        """ 界面处理完一帧后调用，用于统计队列深度 """
+        with self._pendingLock:
+            self._pending = max(0, self._pending - 1)
+        REGISTRY.set_gauge("queue_depth", self._pending, self.metricsSource)
+
+    @property
+    def queueDepth(self):
+        return self._pending
+
+    @property
+    def governorStats(self):
+        return self.governor.stats() if self.governor is not None else None
+
+    @property
+    def dualStreamStats(self):
+        return self.dualStream.stats() if self.dualStream is not None else None
+
+    def _create_capture(self):
         try:
             # 有些平台需要CV_CAP_DSHOW等，做更多尝试
             self.cap = cv2.VideoCapture(self.cameraIndex, cv2.CAP_DSHOW)
         except:
             self.cap = cv2.VideoCapture(self.cameraIndex)
 
-        # 设置分辨率 / 帧率
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-        self.cap.set(cv2.CAP_PROP_FPS, self.fps)
-
+    def _open_local(self):
+        """ 打开本机摄像头并设置分辨率 / 帧率 """
+        self._create_capture()
         if not self.cap.isOpened():
+            return False
+        self._set_format(self.width, self.height, self.fps)
+        return True
+
+    def _set_format(self, width, height, fps):
+        """
+        请求分辨率 / 帧率并读回摄像头实际生效的值；
+        运行中修改分辨率不生效的后端(如部分V4L2驱动)重新打开一次设备再试
+        """
+        self.width, self.height = width, height
+        actual = negotiate_format(self.cap, width, height, fps)
+        if actual[:2] != (width, height) and self.negotiated is not None:
+            self.cap.release()
+            self._create_capture()
+            actual = negotiate_format(self.cap, width, height, fps)
+        if actual[:2] != (width, height) or abs(actual[2] - fps) > 0.5:
+            logger.warning(f"摄像头 {self.cameraIndex} 请求 {width}x{height}@{fps}，"
+                           f"实际为 {actual[0]}x{actual[1]}@{actual[2]:g}")
+        # 按请求的帧率节拍采集，摄像头帧率更高时由采集循环限速
+        self.fps = min(fps, actual[2]) if actual[2] > 0 else fps
+        self._publish_format(actual[0], actual[1], self.fps)
+
+    def _publish_format(self, width, height, fps):
+        fmt = (width, height, round(fps, 2))
+        if fmt == self.negotiated:
+            return
+        self.negotiated = fmt
+        REGISTRY.set_gauge("capture_width", width, self.metricsSource)
+        REGISTRY.set_gauge("capture_height", height, self.metricsSource)
+        REGISTRY.set_gauge("capture_target_fps", fmt[2], self.metricsSource)
+        self.formatNegotiated.emit(width, height, float(fmt[2]))
+
+    def _govern(self, reader, busyRatio, dropped):
+        """ 每秒一次：上报负载，调节器换档时应用新的采集格式 """
+        if not self.governor.update(busyRatio, self._pending, dropped):
+            return
+        width, height, fps = self.governor.target
+        st = self.governor.stats()
+        logger.info(f"采集负载调节({st['reason']}): 切换为 {width}x{height}@{fps}")
+        if reader is None:
+            self._set_format(width, height, fps)
+        else:
+            # 网络流的分辨率由对端决定，只能在本端降低处理帧率
+            self.fps = fps
+            if self.negotiated is not None:
+                self._publish_format(self.negotiated[0], self.negotiated[1], fps)
+
+    def _report_stream_stats(self, reader, lastState):
+        """ 网络流状态变化时通知界面，并更新指标 """
+        st = reader.stats()
+        if st["state"] != lastState:
+            self.streamStatus.emit(st["state"])
+        REGISTRY.set_gauge("stream_fps", round(st["fps"], 2), self.metricsSource)
+        if st["bitrate_kbps"] is not None:
+            REGISTRY.set_gauge("stream_bitrate_kbps", round(st["bitrate_kbps"], 1), self.metricsSource)
+        REGISTRY.set_gauge("stream_reconnects", st["reconnects"], self.metricsSource)
+        REGISTRY.set_gauge("stream_stalls", st["stalls"], self.metricsSource)
+        # 网络流的实际帧率以到达速率为准(调节器限速时取两者较小值)
+        if self.negotiated is not None and st["fps"] > 0:
+            fps = min(st["fps"], self.fps) if self.governor is not None else st["fps"]
+            if abs(fps - self.negotiated[2]) >= 1.0:
+                self._publish_format(self.negotiated[0], self.negotiated[1], round(fps, 1))
+        return st["state"]
+
+    def run(self):
+        """ 线程主体：打开摄像头，循环采集帧并检测 """
+        # 网络摄像头使用独立读取线程，断线自动重连，不中断采集线程
+        reader = None
+        if is_network_source(self.cameraIndex):
+            reader = NetworkStreamReader(self.cameraIndex).start()
+        elif not self._open_local():
             self.cameraError.emit(f"无法打开摄像头(Index: {self.cameraIndex})")
             return
+        if self.dualStream is not None:
+            self.dualStream.start()  # 配置了子码流时开始读取
 
+        streamState = None
+        lastStatsTime = 0.0
+        lastEmit = 0.0
+        frameShape = None  # 上一帧的形状，下一帧按此从帧池取缓冲区
+        seq = 0  # 进入流水线的每一帧都编号，界面据序号统计丢帧
+        # 负载统计窗口：每帧处理耗时、帧数、丢帧数
+        windowStart = time.perf_counter()
+        windowBusy = 0.0
+        windowFrames = 0
+        windowDropped = 0
         while self._running:
-            ret, frame = self.cap.read()
-            if not ret or frame is None:
-                self.cameraError.emit("摄像头读取失败！")
-                break
+            start = time.perf_counter()
+            if start - windowStart >= 1.0:
+                elapsed = start - windowStart
+                REGISTRY.set_gauge("capture_fps", round(windowFrames / elapsed, 2), self.metricsSource)
+                if self.governor is not None:
+                    busyRatio = (windowBusy / windowFrames) * self.fps if windowFrames else 0.0
+                    self._govern(reader, busyRatio, windowDropped)
+                windowStart, windowBusy, windowFrames, windowDropped = start, 0.0, 0, 0
+
+            if reader is not None:
+                ret, frame = reader.read(timeout=0.5)
+                if start - lastStatsTime >= 1.0:
+                    streamState = self._report_stream_stats(reader, streamState)
+                    lastStatsTime = start
+                if not ret:
+                    continue  # 暂无新帧(可能正在重连)，继续等待
+                # 调节器降低帧率后，到达过快的帧直接跳过
+                if self.governor is not None and start - lastEmit < 0.9 / self.fps:
+                    FRAME_POOL.release(frame)
+                    continue
+                captureTs = reader.frame_ts
+            else:
+                ret, frame = pooled_read(self.cap, frameShape)
+                if not ret or frame is None:
+                    self.cameraError.emit("摄像头读取失败！")
+                    break
+                frameShape = frame.shape
+                captureTs = time.monotonic()
+            workStart = time.perf_counter()
+            seq += 1
+            env = FrameEnvelope(frame, seq, self.metricsSource, captureTs)
+            env.mark("capture", workStart - start)
+
+            # 以实际收到的帧尺寸为准(部分后端 get() 返回的值不可靠，网络流只能这样获取)
+            h, w = frame.shape[:2]
+            if self.negotiated is None or self.negotiated[:2] != (w, h):
+                fps = self.negotiated[2] if self.negotiated is not None else float(self.fps)
+                if self.negotiated is not None and reader is None:
+                    logger.warning(f"摄像头 {self.cameraIndex} 实际输出 {w}x{h}，"
+                                   f"与报告的 {self.negotiated[0]}x{self.negotiated[1]} 不一致")
+                self._publish_format(w, h, fps)
+
+            # 界面处理不过来时直接丢弃本帧，不再检测
+            if self._pending >= self.maxPending:
+                REGISTRY.inc("dropped_frames", source=self.metricsSource)
+                windowDropped += 1
+                FRAME_POOL.release(frame)
+                if reader is None:
+                    time.sleep(max(0.0, 1 / (self.fps + 1e-6) - (time.perf_counter() - start)))
+                continue
+
+            # 双码流：生成一次低分辨率分析流帧，推理、运动门控、预览共用
+            if self.dualStream is not None:
+                env.analysis = self.dualStream.analysis(frame)
 
             # YOLO检测
             if self.detector:
                 try:
-                    frame = self.detector.detect_and_plot(frame)
+                    self.detector.process(env)
                 except Exception as e:
                     # 如果检测出错了，不中断摄像头读取
-                    print(f"[ERROR] YOLO检测过程中出错: {e}")
-                    traceback.print_exc()
+                    logger.error(f"YOLO检测过程中出错: {e}\n{traceback.format_exc()}")
 
-            self.frameCaptured.emit(frame)
+            with self._pendingLock:
+                self._pending += 1
+            REGISTRY.set_gauge("queue_depth", self._pending, self.metricsSource)
+            if self.detector:
+                self.detector.report_queue_depth(self._pending)
+            env.emitted()
+            self.frameCaptured.emit(env)
+            lastEmit = time.perf_counter()
+            windowBusy += lastEmit - workStart
+            windowFrames += 1
 
-            # 控制帧率
-            time.sleep(1 / (self.fps + 1e-6))
+            # 控制帧率：只等待本帧周期的剩余时间(网络流由读取器按到达节奏提供最新帧，无需额外等待)
+            if reader is None:
+                time.sleep(max(0.0, 1 / (self.fps + 1e-6) - (lastEmit - start)))
 
+        if reader is not None:
+            reader.stop()
+        if self.dualStream is not None:
+            self.dualStream.stop()
         if self.cap is not None:
             self.cap.release()
 
@@ -69,4 +257,141 @@ class VideoCaptureThread(QThread):
         """ 停止线程 """
         self._running = False
         self.quit()
-        self.wait()
\ No newline at end of file
+        self.wait()
+
+
+class ProcessCaptureThread(QThread):
+    """
+    多进程模式：采集与检测在独立的工作进程中进行，帧经共享内存环形槽位传回，
+    本线程只接收描述信息、取出帧并归还槽位。信号与 VideoCaptureThread 保持一致。
+    """
+    frameCaptured = pyqtSignal(object)
+    cameraError = pyqtSignal(str)
+    streamStatus = pyqtSignal(str)
+    formatNegotiated = pyqtSignal(int, int, float)
+
+    def __init__(self, cameraIndex=0, width=640, height=480, fps=30, detectorConfig=None,
+                 numSlots=4, maxPending=4, governor=False, dualConfig=None):
+        super().__init__()
+        self.cameraIndex = cameraIndex
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.detectorConfig = detectorConfig  # 为 None 时工作进程不做检测
+        self.numSlots = numSlots
+        self.maxPending = maxPending
+        self.metricsSource = str(cameraIndex)
+        self.governor = governor  # 为 True 时由工作进程内的调节器调整采集格式
+        self.governorStats = None  # 工作进程定期上报的调节器状态
+        self.dualConfig = dualConfig  # 双码流配置，工作进程中推理/运动门控使用分析流
+        self.dualStreamStats = None
+        self.negotiated = None
+        self._running = True
+        self._pending = 0
+        self._pendingLock = threading.Lock()
+
+    def frame_consumed(self):
+        with self._pendingLock:
+            self._pending = max(0, self._pending - 1)
+        REGISTRY.set_gauge("queue_depth", self._pending, self.metricsSource)
+
+    @property
+    def queueDepth(self):
+        return self._pending
+
+    def run(self):
+        ctx = multiprocessing.get_context("spawn")
+        slotBytes = max(self.width * self.height * 3, MAX_FRAME_BYTES)
+        ring = SharedFrameRing(self.numSlots, slotBytes)
+        descQueue = ctx.Queue()
+        freeQueue = ctx.Queue()
+        for slot in range(self.numSlots):
+            freeQueue.put(slot)
+        stopEvent = ctx.Event()
+        proc = ctx.Process(
+            target=capture_worker,
+            args=(self.cameraIndex, self.width, self.height, self.fps, ring.name, self.numSlots,
+                  slotBytes, descQueue, freeQueue, stopEvent, self.detectorConfig, self.governor,
+                  self.dualConfig),
+            daemon=True
+        )
+        proc.start()
+        logger.info(f"采集进程已启动(pid={proc.pid})")
+
+        lastDropped = 0
+        try:
+            while self._running:
+                try:
+                    kind, payload = descQueue.get(timeout=0.5)
+                except queue.Empty:
+                    if not proc.is_alive():
+                        self.cameraError.emit("采集进程意外退出！")
+                        break
+                    continue
+
+                if kind == MSG_ERROR:
+                    self.cameraError.emit(payload)
+                    break
+                if kind == MSG_STATUS:
+                    self.streamStatus.emit(payload)
+                    continue
+                if kind == MSG_LOG:
+                    logger.error(payload)
+                    continue
+                if kind == MSG_FORMAT:
+                    self.negotiated = payload
+                    width, height, fps = payload
+                    REGISTRY.set_gauge("capture_width", width, self.metricsSource)
+                    REGISTRY.set_gauge("capture_height", height, self.metricsSource)
+                    REGISTRY.set_gauge("capture_target_fps", fps, self.metricsSource)
+                    self.formatNegotiated.emit(width, height, float(fps))
+                    continue
+                if kind == MSG_GOVERNOR:
+                    self.governorStats = payload
+                    continue
+                if kind == MSG_DUAL_STREAM:
+                    self.dualStreamStats = payload
+                    continue
+
+                slot, seq, shape, captureTs, captureTime, inferTime, dropped, dets, inferred, overlay = payload
+                if dropped > lastDropped:
+                    REGISTRY.inc("dropped_frames", dropped - lastDropped, self.metricsSource)
+                    lastDropped = dropped
+
+                if self._pending >= self.maxPending:
+                    freeQueue.put(slot)
+                    REGISTRY.inc("dropped_frames", source=self.metricsSource)
+                    continue
+                # 拷贝到帧池缓冲区后立即归还槽位，界面侧处理完再归还该缓冲区
+                frame = FRAME_POOL.acquire(shape)
+                np.copyto(frame, ring.view(slot, shape))
+                freeQueue.put(slot)
+
+                env = FrameEnvelope(frame, seq, self.metricsSource, captureTs, dets)
+                env.inferred = inferred
+                env.overlay = overlay
+                env.mark("capture", captureTime)
+                if inferTime is not None:
+                    env.mark("inference", inferTime)
+                with self._pendingLock:
+                    self._pending += 1
+                REGISTRY.set_gauge("queue_depth", self._pending, self.metricsSource)
+                env.emitted()
+                self.frameCaptured.emit(env)
+        finally:
+            stopEvent.set()
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join(timeout=2)
+            descQueue.cancel_join_thread()
+            freeQueue.cancel_join_thread()
+            ring.close()
+            logger.info("采集进程已停止")
+
+    def stop(self):
+        """ 停止线程及工作进程 """
+        self._running = False
+        self.quit()
+        self.wait()
+
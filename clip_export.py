@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 录像片段快速导出：从录像(可跨越连续的 _partN 分段)中截取 [起点, 终点] 片段。
+# 有 ffmpeg/ffprobe 时按关键帧对齐：完整的GOP直接流复制，只有起点/终点所在的
+# 不完整GOP重新编码；各部分先输出为 MPEG-TS(参数集随码流携带)再无损拼接。
+# 没有 ffmpeg 时退回 OpenCV 逐帧解码/编码，只处理片段范围内的帧。
+
+import os
+import re
+import json
+import shutil
+import logging
+import tempfile
+import subprocess
+
+import cv2
+from PyQt5.QtCore import QThread, pyqtSignal
+from video_writer import find_ffmpeg, codec_args, _subprocess_flags, DEFAULT_PRESET, DEFAULT_CRF
+
+logger = logging.getLogger("videoapp.clip")
+
+_PART_RE = re.compile(r"^(?P<base>.*)_part(?P<num>\d+)$")
+
+# 可以与流复制部分拼接的源编码 -> 重新编码边缘时使用的编码器
+_EDGE_ENCODERS = {"h264": "libx264", "hevc": "libx265", "mpeg4": "mpeg4"}
+_ANNEXB_BSF = {"h264": "h264_mp4toannexb", "hevc": "hevc_mp4toannexb"}
+
+_EPS = 1e-3
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def find_ffprobe():
+    """ 返回 ffprobe 路径，优先与 ffmpeg 同目录 """
+    path = os.environ.get("FFPROBE_BINARY") or shutil.which("ffprobe")
+    if path:
+        return path
+    ffmpeg_bin = find_ffmpeg()
+    if ffmpeg_bin:
+        name = "ffprobe.exe" if ffmpeg_bin.lower().endswith(".exe") else "ffprobe"
+        candidate = os.path.join(os.path.dirname(ffmpeg_bin), name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _run(cmd):
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          creationflags=_subprocess_flags())
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip() or f"命令执行失败: {cmd[0]}")
+    return proc.stdout.decode("utf-8", "replace")
+
+
+def probe(path):
+    """
+    读取视频信息：{"codec", "width", "height", "fps", "duration"}。
+    没有 ffprobe 时用 OpenCV 估算，codec 为 None
+    """
+    ffprobe = find_ffprobe()
+    if ffprobe:
+        try:
+            out = _run([ffprobe, "-v", "error", "-select_streams", "v:0",
+                        "-show_entries", "stream=codec_name,width,height,avg_frame_rate:format=duration",
+                        "-of", "json", path])
+            data = json.loads(out)
+            stream = data["streams"][0]
+            num, _, den = stream.get("avg_frame_rate", "0/1").partition("/")
+            fps = float(num) / float(den or 1) if float(den or 1) else 0.0
+            return {
+                "codec": stream.get("codec_name"),
+                "width": int(stream.get("width", 0)),
+                "height": int(stream.get("height", 0)),
+                "fps": fps,
+                "duration": float(data.get("format", {}).get("duration", 0.0)),
+            }
+        except (RuntimeError, ValueError, KeyError, IndexError) as e:
+            logger.warning(f"ffprobe 读取失败，改用OpenCV: {e}")
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+        return {
+            "codec": None,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": fps,
+            "duration": frames / fps if fps else 0.0,
+        }
+    finally:
+        cap.release()
+
+
+def keyframe_times(path):
+    """ 读取关键帧时间(秒)，只解析封装层的包信息，不解码 """
+    ffprobe = find_ffprobe()
+    if not ffprobe:
+        return []
+    out = _run([ffprobe, "-v", "error", "-select_streams", "v:0",
+                "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path])
+    times = []
+    for line in out.splitlines():
+        pts, _, flags = line.strip().partition(",")
+        if "K" in flags:
+            try:
+                times.append(float(pts))
+            except ValueError:
+                pass
+    return sorted(times)
+
+
+def segment_timeline(path, until=None):
+    """
+    从 path 开始的连续分段时间线：[(分段路径, 相对 path 起点的开始时间, 时长, 信息)]。
+    path 不是 _partN 分段时只包含它自己；给出 until 时到该分段为止
+    """
+    stem, ext = os.path.splitext(path)
+    m = _PART_RE.match(stem)
+    paths = [path]
+    if m:
+        num = int(m.group("num")) + 1
+        while not _same_file(paths[-1], until) and os.path.exists(f"{m.group('base')}_part{num}{ext}"):
+            paths.append(f"{m.group('base')}_part{num}{ext}")
+            num += 1
+    timeline = []
+    start = 0.0
+    for p in paths:
+        info = probe(p)
+        timeline.append((p, start, info["duration"], info))
+        start += info["duration"]
+    return timeline
+
+
+def _same_file(a, b):
+    return b is not None and os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+
+def plan_clip(timeline, t_in, t_out):
+    """ 把片段 [t_in, t_out] 拆成各分段内的 (路径, 段内起点, 段内终点, 信息) """
+    pieces = []
+    for path, start, duration, info in timeline:
+        a = max(t_in, start)
+        b = min(t_out, start + duration)
+        if b - a > _EPS:
+            pieces.append((path, a - start, b - start, info))
+    return pieces
+
+
+def _ffmpeg_cut(ffmpeg_bin, path, a, b, out, copy, codec=None, bsf=None, preset=DEFAULT_PRESET, crf=DEFAULT_CRF):
+    cmd = [ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-y", "-ss", f"{a:.3f}", "-i", path,
+           "-t", f"{b - a:.3f}", "-an"]
+    if copy:
+        cmd += ["-c:v", "copy"] + (["-bsf:v", bsf] if bsf else [])
+    else:
+        cmd += codec_args(codec, preset, crf)
+    _run(cmd + ["-f", "mpegts", out])
+
+
+def _smart_cut(ffmpeg_bin, path, a, b, info, workdir, index, stats, preset, crf):
+    """
+    一个分段内的智能剪切，返回生成的TS文件列表：
+    [a, 首个关键帧) 重新编码 + [首个关键帧, 最后关键帧) 流复制 + [最后关键帧, b] 重新编码
+    """
+    codec = info.get("codec")
+    encoder = _EDGE_ENCODERS.get(codec, "libx264")
+    keys = keyframe_times(path) if codec in _EDGE_ENCODERS else []
+    k1 = next((k for k in keys if k >= a - _EPS), None)
+    k2 = next((k for k in reversed(keys) if k <= b + _EPS), None)
+
+    parts = []
+    if k1 is None or k2 is None or k2 - k1 < _EPS:
+        # 片段内没有完整GOP，整段重新编码
+        parts.append((a, b, False))
+    else:
+        if k1 - a > _EPS:
+            parts.append((a, k1, False))
+        parts.append((k1, k2, True))
+        if b - k2 > _EPS:
+            parts.append((k2, b, False))
+
+    outputs = []
+    for j, (s, e, copy) in enumerate(parts):
+        out = os.path.join(workdir, f"{index:03d}_{j}.ts")
+        if copy:
+            # 输入端 -ss 略过关键帧一点点，流复制会从该关键帧开始
+            _ffmpeg_cut(ffmpeg_bin, path, s + _EPS, e + _EPS, out, True, bsf=_ANNEXB_BSF.get(codec))
+            stats["copied"] += e - s
+        else:
+            _ffmpeg_cut(ffmpeg_bin, path, s, e, out, False, codec=encoder, preset=preset, crf=crf)
+            stats["encoded"] += e - s
+        outputs.append(out)
+    return outputs
+
+
+def _export_opencv(pieces, dst, progress, cancel):
+    """ 没有 ffmpeg 时的后备：逐帧解码片段范围并用 OpenCV 重新编码 """
+    info = pieces[0][3]
+    fps = info["fps"] or 30.0
+    fourcc = cv2.VideoWriter_fourcc(*"XVID") if dst.lower().endswith(".avi") else cv2.VideoWriter_fourcc(*"mp4v")
+    writer = cv2.VideoWriter(dst, fourcc, fps, (info["width"], info["height"]))
+    encoded = 0.0
+    try:
+        for i, (path, a, b, _) in enumerate(pieces):
+            cap = cv2.VideoCapture(path)
+            cap.set(cv2.CAP_PROP_POS_MSEC, a * 1000.0)
+            while True:
+                if cancel is not None and cancel():
+                    raise ExportCancelled()
+                pos = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                if pos > b:
+                    break
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+            cap.release()
+            encoded += b - a
+            if progress is not None:
+                progress(int((i + 1) * 100 / len(pieces)))
+    finally:
+        writer.release()
+    return {"copied": 0.0, "encoded": encoded}
+
+
+def export_clip(src, t_in, t_out, dst, out_path=None, preset=DEFAULT_PRESET, crf=DEFAULT_CRF,
+                progress=None, cancel=None):
+    """
+    导出片段。t_in 为相对 src 起点的秒数；t_out 为相对 out_path(默认即 src)起点的秒数，
+    out_path 必须是 src 之后连续的 _partN 分段，片段会跨越中间的所有分段。
+    返回统计 {"copied": 流复制秒数, "encoded": 重新编码秒数}，失败时抛出异常
+    """
+    timeline = segment_timeline(src, until=out_path)
+    if out_path is not None and not _same_file(src, out_path):
+        starts = [start for path, start, _, _ in timeline if _same_file(path, out_path)]
+        if not starts:
+            raise ValueError("终点所在文件不是起点文件之后的连续分段")
+        t_out += starts[0]
+    if t_out - t_in <= _EPS:
+        raise ValueError("片段终点必须晚于起点")
+    pieces = plan_clip(timeline, t_in, t_out)
+    if not pieces:
+        raise ValueError("片段范围超出录像时长")
+
+    ffmpeg_bin = find_ffmpeg()
+    if not ffmpeg_bin or not find_ffprobe():
+        return _export_opencv(pieces, dst, progress, cancel)
+
+    stats = {"copied": 0.0, "encoded": 0.0}
+    workdir = tempfile.mkdtemp(prefix="clip_")
+    try:
+        outputs = []
+        for i, (path, a, b, info) in enumerate(pieces):
+            if cancel is not None and cancel():
+                raise ExportCancelled()
+            outputs += _smart_cut(ffmpeg_bin, path, a, b, info, workdir, i, stats, preset, crf)
+            if progress is not None:
+                progress(int((i + 1) * 90 / len(pieces)))
+
+        listFile = os.path.join(workdir, "list.txt")
+        with open(listFile, "w", encoding="utf-8") as f:
+            for out in outputs:
+                f.write(f"file '{out}'\n")
+        _run([ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0",
+              "-i", listFile, "-c", "copy", dst])
+        if progress is not None:
+            progress(100)
+        return stats
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class ClipExportThread(QThread):
+    """ 在后台线程中导出片段，不阻塞界面 """
+    progress = pyqtSignal(int)
+    exportFinished = pyqtSignal(bool, str)
+
+    def __init__(self, src, t_in, t_out, dst, out_path=None, preset=DEFAULT_PRESET, crf=DEFAULT_CRF):
+        super().__init__()
+        self.src = src
+        self.t_in = t_in
+        self.t_out = t_out
+        self.dst = dst
+        self.out_path = out_path
+        self.preset = preset
+        self.crf = crf
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            stats = export_clip(self.src, self.t_in, self.t_out, self.dst, self.out_path, self.preset, self.crf,
+                                progress=self.progress.emit, cancel=lambda: self._cancelled)
+            self.exportFinished.emit(
+                True, f"流复制 {stats['copied']:.1f} 秒，重新编码 {stats['encoded']:.1f} 秒"
+            )
+        except ExportCancelled:
+            self.exportFinished.emit(False, "已取消")
+        except Exception as e:
+            self.exportFinished.emit(False, str(e))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 基于跟踪结果的计数：计数线统计双向穿越次数，计数区域统计进入次数与当前数量。
+# 每个摄像头的计数线/区域单独保存，格式与检测区域(roi.py)相同。
+
+import os
+import json
+import cv2
+import numpy as np
+from roi import camera_key, points_in_polygon
+
+COUNTING_CONFIG_DIR = "./config/counting"
+
+
+class CountingLine:
+    """
+    计数线 p1->p2。目标中心从线的一侧移到另一侧、且移动轨迹与线段相交时计数：
+    从左侧(沿 p1->p2 方向看)到右侧记为 "in"，反之记为 "out"
+    """
+    kind = "line"
+
+    def __init__(self, name, points):
+        self.name = name
+        self.points = [(int(x), int(y)) for x, y in points[:2]]
+        self.count_in = 0
+        self.count_out = 0
+        self._last = {}  # track_id -> 上一帧中心点
+
+    def reset(self):
+        self.count_in = 0
+        self.count_out = 0
+        self._last = {}
+
+    def update(self, ids, centers):
+        if len(ids) == 0:
+            self._last = {}
+            return
+        (ax, ay), (bx, by) = self.points
+        prev = np.array([self._last.get(i, c) for i, c in zip(ids, centers)], np.float32)
+        cur = np.asarray(centers, np.float32)
+        # 叉积判断点在线的哪一侧
+        side_prev = (bx - ax) * (prev[:, 1] - ay) - (by - ay) * (prev[:, 0] - ax)
+        side_cur = (bx - ax) * (cur[:, 1] - ay) - (by - ay) * (cur[:, 0] - ax)
+        # 线段端点相对移动轨迹的位置，排除从线段延长线外侧经过的情况
+        dx, dy = cur[:, 0] - prev[:, 0], cur[:, 1] - prev[:, 1]
+        side_a = dx * (ay - prev[:, 1]) - dy * (ax - prev[:, 0])
+        side_b = dx * (by - prev[:, 1]) - dy * (bx - prev[:, 0])
+        crossed = (np.sign(side_prev) != np.sign(side_cur)) & (side_prev != 0) & (side_a * side_b <= 0)
+        self.count_in += int(np.count_nonzero(crossed & (side_prev < 0)))
+        self.count_out += int(np.count_nonzero(crossed & (side_prev > 0)))
+        self._last = {i: (float(c[0]), float(c[1])) for i, c in zip(ids, cur)}
+
+    def counts(self):
+        return {"in": self.count_in, "out": self.count_out}
+
+    def label(self):
+        return f"{self.name} 入:{self.count_in} 出:{self.count_out}"
+
+    def to_dict(self):
+        return {"kind": self.kind, "name": self.name, "points": self.points}
+
+
+class CountingZone:
+    """ 计数区域：统计进入次数与当前区域内的目标数 """
+    kind = "zone"
+
+    def __init__(self, name, points):
+        self.name = name
+        self.points = [(int(x), int(y)) for x, y in points]
+        self.entered = 0
+        self.occupancy = 0
+        self._inside = set()
+
+    def reset(self):
+        self.entered = 0
+        self.occupancy = 0
+        self._inside = set()
+
+    def update(self, ids, centers):
+        inside = points_in_polygon(centers, self.points) if len(ids) else np.zeros(0, bool)
+        now_inside = {i for i, flag in zip(ids, inside) if flag}
+        self.entered += len(now_inside - self._inside)
+        self._inside = now_inside
+        self.occupancy = len(now_inside)
+
+    def counts(self):
+        return {"entered": self.entered, "occupancy": self.occupancy}
+
+    def label(self):
+        return f"{self.name} 进入:{self.entered} 当前:{self.occupancy}"
+
+    def to_dict(self):
+        return {"kind": self.kind, "name": self.name, "points": self.points}
+
+
+def counter_from_dict(d):
+    cls = CountingLine if d.get("kind") == "line" else CountingZone
+    return cls(d.get("name", ""), d["points"])
+
+
+class LineZoneCounter:
+    """ 一个摄像头的全部计数线/区域 """
+    def __init__(self, items=None):
+        self.items = list(items or [])
+
+    def __len__(self):
+        return len(self.items)
+
+    def reset(self):
+        for item in self.items:
+            item.reset()
+
+    def update(self, tracks):
+        """ 每帧(含跳帧外推)调用一次 """
+        if not self.items:
+            return
+        ids = [t.track_id for t in tracks]
+        centers = np.array([t.center() for t in tracks], np.float32).reshape(-1, 2)
+        for item in self.items:
+            item.update(ids, centers)
+
+    def counts(self):
+        """ {名称: 计数字典} """
+        return {item.name: item.counts() for item in self.items}
+
+    def summary(self):
+        return "  ".join(item.label() for item in self.items)
+
+    def next_name(self, kind):
+        prefix = "线" if kind == "line" else "区域"
+        return f"{prefix}{sum(1 for item in self.items if item.kind == kind) + 1}"
+
+    def draw(self, frame, scale=1.0):
+        """ 在画面上绘制计数线/区域及其计数，scale 为画面相对原图的缩放比例 """
+        for item in self.items:
+            pts = (np.array(item.points, np.float32) * scale).astype(np.int32).reshape(-1, 1, 2)
+            if item.kind == "line":
+                cv2.line(frame, tuple(int(v) for v in pts[0, 0]), tuple(int(v) for v in pts[1, 0]),
+                         (0, 255, 255), 2)
+            else:
+                cv2.polylines(frame, [pts], True, (255, 200, 0), 2)
+            x, y = (int(v) for v in pts[0, 0])
+            cv2.putText(frame, item.label(), (x + 4, max(y - 6, 14)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 2, cv2.LINE_AA)
+        return frame
+
+    def to_list(self):
+        return [item.to_dict() for item in self.items]
+
+
+def load_counters(camera, directory=COUNTING_CONFIG_DIR):
+    path = os.path.join(directory, f"{camera_key(camera)}.json")
+    if not os.path.exists(path):
+        return LineZoneCounter()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return LineZoneCounter(counter_from_dict(d) for d in json.load(f))
+    except (OSError, ValueError, KeyError):
+        return LineZoneCounter()
+
+
+def save_counters(camera, counter, directory=COUNTING_CONFIG_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{camera_key(camera)}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(counter.to_list(), f, ensure_ascii=False, indent=2)
+    return path
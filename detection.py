@@ -6,6 +6,13 @@
 import cv2
 import numpy as np
 import time
+import logging
+import traceback
+from roi import crop_rects, filter_in_regions
+from tiling import make_tiles, nms
+from tracker import draw_tracks, track_color
+
+logger = logging.getLogger("videoapp.detection")
 
 # 如果安装了ultralytics，可直接使用 YOLO类
 try:
@@ -15,36 +22,170 @@ except ImportError:
     YOLO_AVAILABLE = False
     print("[警告] 未安装ultralytics库，YOLO功能将无法使用！")
 
+class Detections:
+    """
+    一帧的检测结果：xyxy (N,4) 像素坐标、conf (N,) 置信度、cls (N,) 类别编号；
+    ids (N,) 为轨迹ID，只有由跟踪轨迹生成的结果才有，否则为 None
+    """
+    __slots__ = ("xyxy", "conf", "cls", "ids")
+
+    def __init__(self, xyxy=None, conf=None, cls=None, ids=None):
+        self.xyxy = np.zeros((0, 4), np.float32) if xyxy is None else np.asarray(xyxy, np.float32).reshape(-1, 4)
+        self.conf = np.zeros((0,), np.float32) if conf is None else np.asarray(conf, np.float32).reshape(-1)
+        self.cls = np.zeros((0,), np.int32) if cls is None else np.asarray(cls, np.int32).reshape(-1)
+        self.ids = None if ids is None else np.asarray(ids, np.int32).reshape(-1)
+
+    def __len__(self):
+        return len(self.conf)
+
+    @classmethod
+    def from_result(cls, r, offset=(0, 0)):
+        """ 由 ultralytics 的单张结果构造，可附加坐标偏移(用于裁剪区域) """
+        boxes = r.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls()
+        xyxy = boxes.xyxy.cpu().numpy().astype(np.float32)
+        xyxy[:, [0, 2]] += offset[0]
+        xyxy[:, [1, 3]] += offset[1]
+        return cls(xyxy, boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy())
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        """ 由当前可见的轨迹生成快照(复制坐标，之后轨迹外推不影响快照) """
+        if not tracks:
+            return cls(ids=np.zeros((0,), np.int32))
+        return cls(np.stack([t.xyxy for t in tracks]), [t.conf for t in tracks],
+                   [t.cls for t in tracks], [t.track_id for t in tracks])
+
+    @classmethod
+    def concat(cls, items):
+        items = [d for d in items if len(d) > 0]
+        if not items:
+            return cls()
+        return cls(
+            np.concatenate([d.xyxy for d in items]),
+            np.concatenate([d.conf for d in items]),
+            np.concatenate([d.cls for d in items]),
+        )
+
+    def select(self, mask):
+        return Detections(self.xyxy[mask], self.conf[mask], self.cls[mask],
+                          None if self.ids is None else self.ids[mask])
+
+    def scaled(self, sx, sy):
+        """ 坐标按 (sx, sy) 缩放后的副本，用于把分析流上的结果映射回主码流 """
+        if sx == 1.0 and sy == 1.0:
+            return self
+        xyxy = self.xyxy * np.array([sx, sy, sx, sy], np.float32)
+        return Detections(xyxy, self.conf, self.cls, self.ids)
+
+    def centers(self):
+        return np.stack([(self.xyxy[:, 0] + self.xyxy[:, 2]) * 0.5,
+                         (self.xyxy[:, 1] + self.xyxy[:, 3]) * 0.5], axis=1)
+
+
+def _class_color(cls_id):
+    """ 根据类别编号生成固定颜色(BGR) """
+    return (int(cls_id * 67 % 256), int(cls_id * 131 % 256), int(255 - cls_id * 47 % 256))
+
+
+def draw_detections(frame, dets, names=None, copy=True, scale=1.0):
+    """
+    在画面上绘制检测框与标签，copy=False 时直接在原图上绘制。
+    带轨迹ID的结果按ID着色、标注 "#ID 类别"；
+    scale 为画面相对原图的缩放比例(在缩放后的显示图上绘制时使用)
+    """
+    out = frame.copy() if copy else frame
+    ids = dets.ids if dets.ids is not None else [None] * len(dets)
+    boxes = (dets.xyxy * scale).astype(int)
+    for (x1, y1, x2, y2), conf, cls_id, track_id in zip(boxes, dets.conf, dets.cls, ids):
+        name = names.get(int(cls_id), str(cls_id)) if isinstance(names, dict) else str(cls_id)
+        if track_id is None:
+            color, label = _class_color(int(cls_id)), f"{name} {conf:.2f}"
+        else:
+            color, label = track_color(int(track_id)), f"#{track_id} {name}"
+        cv2.rectangle(out, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(out, label, (x1, max(y1 - 5, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+    return out
+
+
+def _round_up_32(v):
+    return int((v + 31) // 32 * 32)
+
+
 class YoloDetector:
     """
     封装用于加载YOLO模型并进行推断的类
     """
-    def __init__(self, model_path="./models/yolov5s.pt", skip_frames=2):
+    def __init__(self, model_path="./models/yolov5s.pt", skip_frames=2, input_size=640,
+                 latency_controller=None, motion_gate=None):
         if not YOLO_AVAILABLE:
             raise RuntimeError("ultralytics库不可用，无法创建YoloDetector.")
 
         self.model = YOLO(model_path)  # 加载预训练模型
+        self.model_path = model_path
         self.frame_count = 0
         self.skip_frames = skip_frames  # 跳帧数量，每处理1帧将跳过2帧
-        self.last_result = None  # 存储上一次的推理结果
+        self.input_size = input_size  # 推理输入尺寸(imgsz)
+        self.latency_controller = latency_controller  # 可选，自适应调整 input_size / skip_frames
+        self.motion_gate = motion_gate  # 可选，画面静止时跳过推理
+        self.last_has_detections = False  # 上一次推理是否检测到目标
+        self.last_detections = Detections()  # 上一次推理的检测结果(原图坐标)
+        self.rois = []  # 检测区域(RoiRegion列表)，为空时检测整幅画面
+        self.tiled = False  # 高分辨率分块检测模式
+        self.tile_size = 640
+        self.tile_overlap = 0.2
+        self.max_tiles = 6  # 每帧最大分块数，保证吞吐可预期
+        self.tracker = None  # 可选，MultiObjectTracker，为检测结果分配稳定ID
+        self.counter = None  # 可选，LineZoneCounter，基于跟踪结果计数(需开启跟踪)
+        self.inferred = False  # 最近一次 detect_and_plot 是否真正执行了推理
+        self._scale = (1.0, 1.0)  # 本帧推理画面到输出画面的坐标比例(双码流模式下大于1)
+        # False 时不在帧上绘制标注(录制原始画面模式)，结果经 overlay_snapshot() 随帧另行传递
+        self.annotate = True
+
+    def report_queue_depth(self, depth):
+        """ 由采集线程上报待显示的帧数，供自适应控制器参考 """
+        if self.latency_controller is not None:
+            self.latency_controller.record_queue_depth(depth)
 
-    def detect_and_plot(self, frame, conf_thres=0.25, classes=None):
+    def detect_and_plot(self, frame, conf_thres=0.25, classes=None, force=False, infer_frame=None,
+                        motion_frame=None):
         """
         使用YOLO模型对输入图像进行检测，并在画面上绘制检测框。
-        实现跳帧处理，仅在特定帧上执行检测
+        实现跳帧处理，仅在特定帧上执行检测；
+        force=True 时不跳帧、不经运动门控(如快进回放，相邻两帧相隔很远，沿用上次结果没有意义)。
+        infer_frame / motion_frame 为双码流模式下推理、运动门控使用的低分辨率画面，
+        检测框映射回 frame 的坐标，标注仍画在 frame 上
         """
         if frame is None or not isinstance(frame, np.ndarray):
             return None
+        self.inferred = False
+        src = frame if infer_frame is None else infer_frame
+        # 推理画面到输出画面的坐标比例
+        self._scale = (frame.shape[1] / src.shape[1], frame.shape[0] / src.shape[0])
         
+        # 由自适应控制器决定本帧的推理档位
+        if self.latency_controller is not None:
+            self.skip_frames = self.latency_controller.skip_frames
+            self.input_size = self.latency_controller.input_size
+
         # 计数器增加
         self.frame_count += 1
         
-        # 如果不是需要处理的帧，返回上一次的结果(如果有的话)或原始帧
-        if self.frame_count % (self.skip_frames + 1) != 1:
-            if self.last_result is not None:
-                # 如果有上一次的结果，可以选择将上次检测的边界框应用到当前帧
-                return self.last_result
-            return frame
+        # 如果不是需要处理的帧，把上一次的检测框画在当前帧上
+        if not force and (self.frame_count - 1) % (self.skip_frames + 1) != 0:
+            if self.tracker is not None:
+                # 跟踪模式下按速度外推轨迹，画在当前帧上
+                return self._plot_tracks(frame, self.tracker.predict())
+            return self._plot_last(frame)
+
+        # 运动门控：画面无明显变化时沿用上一次结果，不执行推理
+        if not force and self.motion_gate is not None and \
+                not self.motion_gate.update(frame if motion_frame is None else motion_frame):
+            if self.tracker is not None:
+                return self._plot_tracks(frame, self.tracker.tracks)  # 画面静止，轨迹原地保持
+            return self._plot_last(frame)
         
         # 确保 classes 是正确的格式（None 或整数列表）
         if classes is not None:
@@ -53,27 +194,158 @@ class YoloDetector:
             elif not all(isinstance(item, int) for item in classes):
                 classes = None
         
-        # 调整分辨率以提高检测速度
-        original_size = frame.shape[:2]
-        resized_frame = cv2.resize(frame, (640, 480))  # 调整为较低分辨率
-        
+        # 设置了检测区域时，只对区域裁剪图做推理
+        if self.rois:
+            return self._detect_rois_and_plot(frame, src, conf_thres, classes)
+        # 分块模式：画面明显大于推理尺寸时才切块，避免小画面白白多算
+        if self.tiled and max(src.shape[:2]) > self.tile_size:
+            return self._detect_tiles_and_plot(frame, src, conf_thres, classes)
+
         try:
-            # 注意这里修改了调用方式，确保 classes 参数格式正确
-            start_time = time.time()
-            results = self.model(resized_frame, conf=conf_thres, classes=classes, verbose=False)
-            inference_time = time.time() - start_time
-            # 可选：打印推理时间
-            # print(f"推理时间: {inference_time:.4f}秒")
+            # 通过 imgsz 降低推理分辨率以提高检测速度，检测框仍映射回原始画面，
+            # 因此输出帧尺寸与输入一致，录像不会因尺寸变化而失败
+            start_time = time.perf_counter()
+            results = self.model(src, imgsz=self.input_size, conf=conf_thres, classes=classes, verbose=False)
+            inference_time = time.perf_counter() - start_time
+            if self.latency_controller is not None:
+                self.latency_controller.record_inference(inference_time)
         except Exception as e:
+            logger.error(f"检测推理异常: {e}\n{traceback.format_exc()}")
             return frame
 
         # 取第一个结果
         if len(results) > 0:
             r = results[0]
             # 如果想自行处理 boxes，可以用 r.boxes.xyxy, r.boxes.conf 等
-            annotated = r.plot()  # ultralytics自带方法，可绘制检测框
-            self.last_result = annotated  # 保存当前结果
-            return annotated
+            return self._publish(frame, Detections.from_result(r).scaled(*self._scale))
         else:
-            self.last_result = frame
-            return frame
\ No newline at end of file
+            return self._publish(frame, Detections())
+
+    def process(self, env, conf_thres=0.25, classes=None, force=False):
+        """
+        检测帧信封(frame_envelope.FrameEnvelope)中的帧：标注后的画面写回 env.frame，
+        检测结果、是否推理与推理耗时记入信封
+        """
+        start = time.perf_counter()
+        analysis = env.analysis
+        env.frame = self.detect_and_plot(
+            env.frame, conf_thres, classes, force,
+            infer_frame=analysis.get("inference") if analysis is not None else None,
+            motion_frame=analysis.get("motion") if analysis is not None else None,
+        )
+        env.detections = self.last_detections
+        env.inferred = self.inferred
+        # 帧上没有标注，或预览改用分析流(看不到主码流上的标注)时，结果交给显示端叠加
+        if not self.annotate or (analysis is not None and analysis.get("preview") is not None):
+            env.overlay = self.overlay_snapshot()
+        env.mark("inference", time.perf_counter() - start)
+        return env
+
+    def overlay_snapshot(self):
+        """ 本帧应叠加显示的结果：开启跟踪时为轨迹快照(带ID)，否则为最近一次的检测框 """
+        if self.tracker is not None:
+            return Detections.from_tracks(self.tracker.tracks)
+        return self.last_detections if self.last_has_detections else Detections()
+
+    def replay(self, frame, dets, exact=True):
+        """
+        用已有的检测结果(如回放缓存)标注画面，不执行推理。
+        exact=False 表示该结果来自之前的帧(对应跳帧)，跟踪模式下只做外推
+        """
+        if self.tracker is not None and not exact:
+            return self._plot_tracks(frame, self.tracker.predict())
+        if not exact:
+            if not self.annotate:
+                return frame
+            return draw_detections(frame, dets, getattr(self.model, "names", None), copy=False)
+        annotated = self._publish(frame, dets)
+        self.inferred = False
+        return annotated
+
+    def _publish(self, frame, dets):
+        """
+        保存本次推理结果并返回标注后的画面；开启跟踪时画轨迹而不是检测框。
+        标注直接画在输入帧上(不复制整幅图像)，检测器不持有任何帧的引用，
+        输入帧可以是帧缓冲池中的缓冲区，由调用方负责归还
+        """
+        self.inferred = True
+        self.last_detections = dets
+        self.last_has_detections = len(dets) > 0
+        if self.tracker is not None:
+            return self._plot_tracks(frame, self.tracker.update(dets))
+        if not self.annotate:
+            return frame
+        return draw_detections(frame, dets, getattr(self.model, "names", None), copy=False)
+
+    def _plot_last(self, frame):
+        """ 未推理的帧沿用上一次的检测框 """
+        if not self.last_has_detections or not self.annotate:
+            return frame
+        return draw_detections(frame, self.last_detections, getattr(self.model, "names", None), copy=False)
+
+    def _plot_tracks(self, frame, tracks):
+        """ 绘制轨迹并更新计数线/区域；不绘制标注时只更新计数 """
+        if self.counter is not None and len(self.counter) > 0:
+            self.counter.update(tracks)
+        if not self.annotate:
+            return frame
+        out = draw_tracks(frame, tracks, getattr(self.model, "names", None), copy=False)
+        if self.counter is not None and len(self.counter) > 0:
+            self.counter.draw(out)
+        return out
+
+    def _detect_rois_and_plot(self, frame, src, conf_thres, classes):
+        """
+        仅对检测区域的外接矩形裁剪图做批量推理，再把检测框映射回原图坐标，
+        并丢弃中心点不在区域内的检测框。区域以 frame 坐标定义，在推理画面 src 上按比例裁剪
+        """
+        sx, sy = self._scale
+        rects = [(int(x0 / sx), int(y0 / sy), int(np.ceil(x1 / sx)), int(np.ceil(y1 / sy)))
+                 for (x0, y0, x1, y1) in crop_rects(self.rois, frame.shape)]
+        if not rects:
+            return frame
+        crops = [src[y0:y1, x0:x1] for (x0, y0, x1, y1) in rects]
+        # 裁剪图比整幅画面小，推理尺寸随之缩小(不超过当前档位)
+        imgsz = min(self.input_size, _round_up_32(max(max(c.shape[:2]) for c in crops)))
+
+        try:
+            start_time = time.perf_counter()
+            results = self.model(crops, imgsz=imgsz, conf=conf_thres, classes=classes, verbose=False)
+            inference_time = time.perf_counter() - start_time
+            if self.latency_controller is not None:
+                self.latency_controller.record_inference(inference_time)
+        except Exception as e:
+            logger.error(f"检测区域推理异常: {e}\n{traceback.format_exc()}")
+            return frame
+
+        dets = Detections.concat([
+            Detections.from_result(r, offset=(x0, y0)) for r, (x0, y0, _, _) in zip(results, rects)
+        ]).scaled(sx, sy)
+        dets = filter_in_regions(dets, self.rois)
+        return self._publish(frame, dets)
+
+    def _detect_tiles_and_plot(self, frame, src, conf_thres, classes):
+        """
+        把推理画面切成重叠分块按原始分辨率批量推理，
+        再用NMS合并跨分块边界的重复检测框，结果映射回 frame 坐标
+        """
+        h, w = src.shape[:2]
+        tiles = make_tiles(w, h, self.tile_size, self.tile_overlap, self.max_tiles)
+        crops = [src[y0:y1, x0:x1] for (x0, y0, x1, y1) in tiles]
+
+        try:
+            start_time = time.perf_counter()
+            results = self.model(crops, imgsz=self.tile_size, conf=conf_thres, classes=classes, verbose=False)
+            inference_time = time.perf_counter() - start_time
+            if self.latency_controller is not None:
+                self.latency_controller.record_inference(inference_time)
+        except Exception as e:
+            logger.error(f"分块推理异常: {e}\n{traceback.format_exc()}")
+            return frame
+
+        dets = Detections.concat([
+            Detections.from_result(r, offset=(x0, y0)) for r, (x0, y0, _, _) in zip(results, tiles)
+        ])
+        if len(dets) > 0:
+            dets = dets.select(nms(dets.xyxy, dets.conf, dets.cls, iou_threshold=0.5, ios_threshold=0.8))
+        return self._publish(frame, dets.scaled(*self._scale))
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 回放检测结果的磁盘缓存：同一视频文件在相同模型与检测参数下再次回放(或拖动进度条回看)时，
+# 直接读取缓存的检测框，不再重复推理。
+#
+# 缓存键：文件身份(绝对路径+大小+修改时间) + 检测参数(模型、置信度、类别等)，
+# 每个键对应一个只追加的二进制文件，每帧一条记录：
+#   帧号 uint32 | 检测框数 uint16 | 标志 uint8 | N × (xyxy float32×4, conf float32, cls int16)
+# 标志为 1 表示该帧执行了推理；为 0 表示该帧被跳过(跳帧/运动门控)，记录的是沿用的上次结果，
+# 这样跳过的帧回放时也能直接命中缓存。
+# 目录总大小超过上限时按最近使用时间删除最旧的缓存文件；总大小在内存中累计，
+# 只在启动后第一次查询和淘汰时扫描目录，每次写出后检查是否超限。
+
+import os
+import json
+import struct
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from detection import Detections
+
+logger = logging.getLogger("videoapp.cache")
+
+DEFAULT_CACHE_DIR = "./cache/detections"
+DEFAULT_MAX_MB = 256
+
+_MAGIC = b"DETCACH1"
+_RECORD_HEADER = struct.Struct("<IHB")
+_BOX_DTYPE = np.dtype([("xyxy", "<f4", (4,)), ("conf", "<f4"), ("cls", "<i2")])
+
+
+def file_identity(path):
+    """ 由绝对路径、文件大小、修改时间生成文件身份，文件被改写后自动失效 """
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def params_key(params):
+    """ 检测参数字典 -> 短哈希 """
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+class CachedVideo:
+    """
+    一个视频文件在一组检测参数下的缓存。打开时整体读入内存，新结果批量追加写入
+    """
+    def __init__(self, path, params, flush_every=120, on_write=None):
+        self.path = path
+        self.params = params
+        self.flush_every = flush_every
+        self.on_write = on_write  # 每次追加写出后以写入的字节数回调
+        self.hits = 0
+        self.misses = 0
+        self._frames = {}
+        self._pending = []
+        self._load()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            os.utime(self.path)  # 记录最近使用时间，供淘汰使用
+        except OSError as e:
+            logger.warning(f"读取检测缓存失败: {e}")
+            return
+        if not data.startswith(_MAGIC):
+            return
+        pos = len(_MAGIC)
+        # 逐条解析；程序异常退出可能留下不完整的末尾记录，直接忽略
+        while pos + _RECORD_HEADER.size <= len(data):
+            index, n, flags = _RECORD_HEADER.unpack_from(data, pos)
+            pos += _RECORD_HEADER.size
+            end = pos + n * _BOX_DTYPE.itemsize
+            if end > len(data):
+                break
+            boxes = np.frombuffer(data, _BOX_DTYPE, count=n, offset=pos)
+            self._frames[index] = (Detections(boxes["xyxy"], boxes["conf"], boxes["cls"]), bool(flags & 1))
+            pos = end
+
+    def get(self, index):
+        """ 返回该帧缓存的 (检测结果, 是否为该帧推理所得)，没有时返回 None """
+        entry = self._frames.get(index)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, index, dets, inferred=True):
+        old = self._frames.get(index)
+        # 已有推理结果的帧不再覆盖；沿用结果的帧可以被后来的真实推理替换
+        if old is not None and (old[1] or not inferred):
+            return
+        self._frames[index] = (dets, inferred)
+        self._pending.append((index, dets, inferred))
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        chunks = []
+        for index, dets, inferred in self._pending:
+            boxes = np.empty(len(dets), _BOX_DTYPE)
+            boxes["xyxy"] = dets.xyxy
+            boxes["conf"] = dets.conf
+            boxes["cls"] = dets.cls
+            chunks.append(_RECORD_HEADER.pack(index, len(dets), 1 if inferred else 0))
+            chunks.append(boxes.tobytes())
+        self._pending = []
+        data = b"".join(chunks)
+        try:
+            if not os.path.exists(self.path):
+                data = _MAGIC + data
+            with open(self.path, "ab") as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning(f"写入检测缓存失败: {e}")
+            return
+        if self.on_write is not None:
+            self.on_write(len(data))
+
+    def hit_ranges(self, max_gap=30):
+        """
+        有检测结果的帧段 [(起始帧, 结束帧)]，间隔不超过 max_gap 帧的命中合并为一段
+        """
+        hits = sorted(i for i, (dets, _) in self._frames.items() if len(dets) > 0)
+        ranges = []
+        for i in hits:
+            if ranges and i - ranges[-1][1] <= max_gap:
+                ranges[-1][1] = i
+            else:
+                ranges.append([i, i])
+        return [tuple(r) for r in ranges]
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class DetectionCache:
+    """
+    缓存目录管理：打开指定视频/参数的缓存，并把目录总大小限制在 max_mb 以内
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB):
+        self.directory = directory
+        self.max_mb = max_mb
+        self._usage = None  # 缓存文件总字节数，None 表示尚未扫描目录
+        self._lock = threading.Lock()
+
+    def open(self, video_path, params):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{file_identity(video_path)}_{params_key(params)}.det"
+        return CachedVideo(os.path.join(self.directory, name), params, on_write=self._on_write)
+
+    def close(self, cached):
+        """ 写出剩余结果并执行淘汰 """
+        if cached is not None:
+            cached.flush()
+        self.evict()
+
+    def _scan(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [e for e in os.scandir(self.directory) if e.is_file() and e.name.endswith(".det")]
+
+    def _on_write(self, nbytes):
+        """ 累计写入的字节数，超过上限时立即淘汰 """
+        with self._lock:
+            if self._usage is None:
+                return  # 尚未扫描，下次查询时扫描已包含本次写入
+            self._usage += nbytes
+            over = self._usage > self.max_mb * 1024 * 1024
+        if over:
+            self.evict()
+
+    def usage_bytes(self):
+        """ 缓存总大小(内存中的累计值，只在第一次查询时扫描目录) """
+        with self._lock:
+            if self._usage is None:
+                self._usage = sum(e.stat().st_size for e in self._scan())
+            return self._usage
+
+    def evict(self):
+        """ 超过容量上限时按最近使用时间从旧到新删除 """
+        with self._lock:
+            entries = self._scan()
+            total = sum(e.stat().st_size for e in entries)
+            limit = self.max_mb * 1024 * 1024
+            for e in sorted(entries, key=lambda e: e.stat().st_mtime):
+                if total <= limit:
+                    break
+                try:
+                    size = e.stat().st_size
+                    os.remove(e.path)
+                    total -= size
+                    logger.info(f"检测缓存超出上限，已删除: {e.name}")
+                except OSError:
+                    pass
+            self._usage = total
+
+    def clear(self):
+        with self._lock:
+            for e in self._scan():
+                try:
+                    os.remove(e.path)
+                except OSError:
+                    pass
+            self._usage = None
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 检测结果旁路文件：开启"录制原始画面"时，录像只保存未标注的原始帧，
+# 每帧的检测框(开启跟踪时为带ID的轨迹)写入与录像分段同名的 .dets 文件。
+# 采集时不再为录像在整幅画面上绘制标注，预览与回放时在缩放后的显示图上叠加，
+# 回放时可以随时开关叠加、按类别筛选。
+#
+# 文件格式：
+#   魔数 "DETSIDE1" | 头部长度 uint32 | 头部JSON(类别名称、帧率、画面尺寸)
+#   之后每帧一条记录：帧号 uint32 | 检测框数 uint16 | 标志 uint8 | N × (xyxy float32×4, conf float32, cls int16, id int32)
+# 帧号为录像文件中的帧序号；标志 bit0 表示该帧执行了推理，bit1 表示记录的是跟踪轨迹(id 有效)。
+# 为补齐时间轴而重复写入的帧没有单独的记录，回放时沿用之前最近一条记录。
+
+import os
+import json
+import struct
+import bisect
+import logging
+
+import numpy as np
+from detection import Detections
+
+logger = logging.getLogger("videoapp.sidecar")
+
+SIDECAR_EXTENSION = ".dets"
+
+_MAGIC = b"DETSIDE1"
+_HEADER_LEN = struct.Struct("<I")
+_RECORD_HEADER = struct.Struct("<IHB")
+_BOX_DTYPE = np.dtype([("xyxy", "<f4", (4,)), ("conf", "<f4"), ("cls", "<i2"), ("id", "<i4")])
+
+FLAG_INFERRED = 1
+FLAG_TRACKS = 2
+
+
+def sidecar_path(video_path):
+    """ 录像分段对应的旁路文件路径 """
+    return os.path.splitext(video_path)[0] + SIDECAR_EXTENSION
+
+
+def class_ids(names, wanted):
+    """ 类别名称(或编号)列表 -> 类别编号集合；wanted 为空时返回 None(不筛选) """
+    if not wanted:
+        return None
+    wanted = {str(w).strip().lower() for w in wanted}
+    return {int(i) for i, name in (names or {}).items() if str(name).lower() in wanted or str(i) in wanted}
+
+
+def select_classes(dets, class_ids):
+    """ 只保留指定类别的结果，class_ids 为 None 时不筛选 """
+    if class_ids is None or len(dets) == 0:
+        return dets
+    return dets.select(np.isin(dets.cls, list(class_ids)))
+
+
+class SidecarWriter:
+    """ 随录像分段写入，结果缓存在内存中批量追加 """
+    def __init__(self, video_path, names=None, fps=0.0, size=None, flush_every=30):
+        self.path = sidecar_path(video_path)
+        self.flush_every = flush_every
+        self.records = 0
+        self._pending = []
+        header = json.dumps({
+            "names": {int(k): str(v) for k, v in (names or {}).items()},
+            "fps": float(fps),
+            "size": list(size) if size else None,
+        }, ensure_ascii=False).encode("utf-8")
+        self._file = open(self.path, "wb")
+        self._file.write(_MAGIC + _HEADER_LEN.pack(len(header)) + header)
+
+    def write(self, index, dets, inferred=False):
+        """ 记录录像第 index 帧的结果，dets 为 None 时记为没有目标 """
+        dets = dets if dets is not None else Detections()
+        boxes = np.empty(len(dets), _BOX_DTYPE)
+        boxes["xyxy"] = dets.xyxy
+        boxes["conf"] = dets.conf
+        boxes["cls"] = dets.cls
+        boxes["id"] = dets.ids if dets.ids is not None else -1
+        flags = (FLAG_INFERRED if inferred else 0) | (FLAG_TRACKS if dets.ids is not None else 0)
+        self._pending.append(_RECORD_HEADER.pack(index, len(dets), flags))
+        self._pending.append(boxes.tobytes())
+        self.records += 1
+        if len(self._pending) >= self.flush_every * 2:
+            self.flush()
+
+    def flush(self):
+        if not self._pending or self._file is None:
+            return
+        try:
+            self._file.write(b"".join(self._pending))
+            self._file.flush()
+        except OSError as e:
+            logger.warning(f"写入检测旁路文件失败: {e}")
+        self._pending = []
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+
+
+class SidecarReader:
+    """ 回放时整体读入内存，按录像帧号查询 """
+    def __init__(self, path):
+        self.path = path
+        self.names = {}
+        self.fps = 0.0
+        self.size = None
+        self._indices = []
+        self._frames = []
+        self._load()
+
+    def __len__(self):
+        return len(self._indices)
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            logger.warning(f"读取检测旁路文件失败: {e}")
+            return
+        if not data.startswith(_MAGIC) or len(data) < len(_MAGIC) + _HEADER_LEN.size:
+            return
+        pos = len(_MAGIC)
+        (header_len,) = _HEADER_LEN.unpack_from(data, pos)
+        pos += _HEADER_LEN.size
+        try:
+            header = json.loads(data[pos:pos + header_len].decode("utf-8"))
+        except ValueError:
+            return
+        pos += header_len
+        self.names = {int(k): v for k, v in header.get("names", {}).items()}
+        self.fps = header.get("fps", 0.0)
+        self.size = header.get("size")
+
+        frames = {}
+        # 录像仍在写入或程序异常退出时末尾记录可能不完整，直接忽略
+        while pos + _RECORD_HEADER.size <= len(data):
+            index, n, flags = _RECORD_HEADER.unpack_from(data, pos)
+            pos += _RECORD_HEADER.size
+            end = pos + n * _BOX_DTYPE.itemsize
+            if end > len(data):
+                break
+            boxes = np.frombuffer(data, _BOX_DTYPE, count=n, offset=pos)
+            ids = boxes["id"] if flags & FLAG_TRACKS else None
+            frames[index] = Detections(boxes["xyxy"], boxes["conf"], boxes["cls"], ids)
+            pos = end
+        self._indices = sorted(frames)
+        self._frames = [frames[i] for i in self._indices]
+
+    def get(self, index):
+        """ 录像第 index 帧的结果；该帧是重复写入的补帧时返回之前最近一条记录，之前没有记录时返回 None """
+        pos = bisect.bisect_right(self._indices, index) - 1
+        if pos < 0:
+            return None
+        return self._frames[pos]
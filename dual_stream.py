@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 双码流：全分辨率主码流只交给录像，推理、运动门控、预览使用低分辨率分析流，
+# 昂贵的处理环节不再接触全分辨率像素。
+# 分析流优先取摄像头的子码流(网络摄像头通常提供低分辨率的第二路流)，
+# 没有子码流或子码流中断时，由主码流帧做一次共享的 INTER_AREA 缩小，各环节共用这一份。
+# 分析流上得到的检测框按两路画面的比例映射回主码流坐标，录像、ROI、计数线都仍以主码流坐标为准。
+
+import time
+import logging
+
+import cv2
+
+from frame_pool import FRAME_POOL
+
+logger = logging.getLogger("videoapp.dual_stream")
+
+CONSUMERS = ("inference", "motion", "preview")  # 可改用分析流的环节
+DEFAULT_ANALYSIS_WIDTH = 640
+SUB_STREAM_STALE_SECONDS = 1.0  # 子码流超过该时间没有新帧时改用缩小的主码流
+
+
+class AnalysisFrame:
+    """
+    随帧信封传递的分析流帧。scale 为 (主码流宽/分析流宽, 主码流高/分析流高)，
+    consumers 为使用分析流的环节，其余环节仍使用主码流帧
+    """
+    __slots__ = ("frame", "scale", "consumers", "from_sub")
+
+    def __init__(self, frame, scale, consumers, from_sub=False):
+        self.frame = frame
+        self.scale = scale
+        self.consumers = consumers
+        self.from_sub = from_sub
+
+    def get(self, consumer):
+        """ 该环节使用分析流时返回分析流帧，否则返回 None(使用主码流) """
+        return self.frame if consumer in self.consumers else None
+
+    def release(self):
+        FRAME_POOL.release(self.frame)
+        self.frame = None
+
+
+def analysis_size(width, height, max_width):
+    """ 等比缩小到不超过 max_width 的尺寸(宽高取偶数，便于编码/缩放) """
+    if width <= max_width:
+        return width, height
+    w = max(2, int(max_width) // 2 * 2)
+    h = max(2, int(round(height * w / width)) // 2 * 2)
+    return w, h
+
+
+class DualStream:
+    """
+    为每个主码流帧生成分析流帧。sub_source 为子码流地址(如 RTSP 子码流)，为空时缩小主码流；
+    width 为缩小主码流时分析流的宽度；consumers 为使用分析流的环节
+    """
+    def __init__(self, width=DEFAULT_ANALYSIS_WIDTH, sub_source=None, consumers=CONSUMERS, pool=FRAME_POOL):
+        self.width = int(width)
+        self.sub_source = sub_source or None
+        self.consumers = frozenset(c for c in consumers if c in CONSUMERS)
+        self.pool = pool
+        self.reader = None
+        self._sub = None      # 最近一帧子码流画面(由本对象持有一个引用)
+        self._sub_ts = 0.0
+        self.sub_frames = 0   # 使用子码流的帧数
+        self.scaled_frames = 0  # 缩小主码流的帧数
+
+    def start(self):
+        if self.sub_source:
+            from network_stream import NetworkStreamReader, is_network_source
+            if is_network_source(self.sub_source):
+                self.reader = NetworkStreamReader(self.sub_source).start()
+            else:
+                logger.warning(f"子码流只支持网络地址，改为缩小主码流: {self.sub_source}")
+        return self
+
+    def stop(self):
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+        self.pool.release(self._sub)
+        self._sub = None
+
+    def _latest_sub(self, now):
+        """ 取子码流的最新帧(不等待)；没有帧或已过时返回 None """
+        if self.reader is None:
+            return None
+        ok, frame = self.reader.read(timeout=0.0)
+        if ok and frame is not None:
+            self.pool.release(self._sub)
+            self._sub = frame
+            self._sub_ts = now
+        if self._sub is None or now - self._sub_ts > SUB_STREAM_STALE_SECONDS:
+            return None
+        return self._sub
+
+    def analysis(self, frame, now=None):
+        """ 由主码流帧得到分析流帧(AnalysisFrame)，分析流帧由信封 release() 归还 """
+        if not self.consumers:
+            return None
+        now = time.monotonic() if now is None else now
+        h, w = frame.shape[:2]
+        sub = self._latest_sub(now)
+        if sub is not None:
+            self.pool.retain(sub)  # 同一子码流帧可能被相邻的多个主码流帧共用
+            self.sub_frames += 1
+            sh, sw = sub.shape[:2]
+            return AnalysisFrame(sub, (w / sw, h / sh), self.consumers, from_sub=True)
+        aw, ah = analysis_size(w, h, self.width)
+        if (aw, ah) == (w, h):
+            return None  # 主码流本身不大于分析尺寸，直接使用主码流
+        small = self.pool.acquire((ah, aw) + frame.shape[2:], frame.dtype)
+        cv2.resize(frame, (aw, ah), dst=small, interpolation=cv2.INTER_AREA)
+        self.scaled_frames += 1
+        return AnalysisFrame(small, (w / aw, h / ah), self.consumers)
+
+    def stats(self):
+        return {
+            "width": self.width,
+            "sub_source": self.sub_source,
+            "sub_connected": self.reader is not None and self.reader.connected,
+            "sub_frames": self.sub_frames,
+            "scaled_frames": self.scaled_frames,
+            "consumers": sorted(self.consumers),
+        }
+
+    def config(self):
+        """ 传给多进程工作进程的配置(只含可序列化的基本类型) """
+        return {"width": self.width, "sub_source": self.sub_source, "consumers": sorted(self.consumers)}
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(cfg.get("width", DEFAULT_ANALYSIS_WIDTH), cfg.get("sub_source"),
+                   cfg.get("consumers", CONSUMERS))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 帧信封：图像帧在流水线中始终与其元数据一起传递——
+# 采集时刻(单调时钟)、序号、来源、检测结果与各阶段耗时。
+# 显示时据此得到"采集到上屏"(glass-to-glass)延迟，按序号发现丢帧/断档，
+# 录像时按采集时刻把帧放到恒定帧率时间轴的正确位置。
+
+import time
+
+from metrics import REGISTRY
+from frame_pool import FRAME_POOL
+
+
+class FrameEnvelope:
+    """
+    一帧及其元数据。capture_ts 为 time.monotonic() 时刻(多进程模式下各进程共用同一系统单调时钟)；
+    seq 由采集端对每个读到的帧递增(包括随后被丢弃的帧)，接收端据此统计丢帧
+    """
+    __slots__ = ("frame", "seq", "source", "capture_ts", "emit_ts", "detections", "inferred", "overlay",
+                 "analysis", "timings")
+
+    def __init__(self, frame, seq, source, capture_ts=None, detections=None):
+        self.frame = frame
+        self.seq = seq
+        self.source = str(source)
+        self.capture_ts = time.monotonic() if capture_ts is None else capture_ts
+        self.emit_ts = None            # 交给界面线程的时刻，用于统计界面排队耗时
+        self.detections = detections   # detection.Detections，未检测时为 None
+        self.inferred = False          # 检测结果是否为本帧推理所得(否则沿用之前的结果)
+        self.overlay = None            # 帧上未绘制标注时，显示时需叠加的结果(Detections)
+        self.analysis = None           # 双码流模式下的低分辨率分析流帧(dual_stream.AnalysisFrame)
+        self.timings = {}              # 阶段名 -> 耗时(秒)
+
+    def mark(self, stage, seconds):
+        """ 记录一个阶段的耗时，并计入该阶段的指标 """
+        self.timings[stage] = seconds
+        REGISTRY.observe(stage, seconds, self.source)
+
+    def emitted(self):
+        self.emit_ts = time.monotonic()
+
+    def age(self, now=None):
+        """ 距采集时刻经过的秒数 """
+        return (time.monotonic() if now is None else now) - self.capture_ts
+
+    def release(self):
+        """ 归还帧缓冲区(帧来自帧缓冲池时)，包括分析流帧 """
+        FRAME_POOL.release(self.frame)
+        if self.analysis is not None:
+            self.analysis.release()
+            self.analysis = None
+
+    def __repr__(self):
+        return f"FrameEnvelope(source={self.source!r}, seq={self.seq}, age={self.age() * 1000:.1f}ms)"
+
+
+class SequenceMonitor:
+    """
+    接收端按来源检查序号连续性：序号跳跃计为丢帧，序号变小视为采集端重启(重新计数)
+    """
+    def __init__(self):
+        self._last = {}
+        self.lost = {}
+        self.gaps = {}
+
+    def reset(self, source=None):
+        if source is None:
+            self._last.clear()
+        else:
+            self._last.pop(str(source), None)
+
+    def observe(self, env):
+        """ 返回本帧之前丢失的帧数 """
+        last = self._last.get(env.source)
+        self._last[env.source] = env.seq
+        if last is None or env.seq <= last:
+            return 0
+        missing = env.seq - last - 1
+        if missing > 0:
+            self.lost[env.source] = self.lost.get(env.source, 0) + missing
+            self.gaps[env.source] = self.gaps.get(env.source, 0) + 1
+            REGISTRY.inc("frames_lost", missing, env.source)
+            REGISTRY.inc("sequence_gaps", source=env.source)
+        return missing
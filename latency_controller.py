@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 自适应延迟控制器：持续测量推理耗时与待处理帧队列深度，
+# 在每路视频流的延迟预算内自动调整YOLO推理输入尺寸与跳帧数。
+
+import threading
+import time
+
+# 推理档位：(输入尺寸imgsz, 跳帧数)，按画质从高到低、开销从大到小排列
+DEFAULT_LEVELS = [
+    (640, 0),
+    (640, 1),
+    (640, 2),
+    (480, 2),
+    (320, 2),
+    (320, 4),
+]
+DEFAULT_START_LEVEL = 2  # 对应原来固定的 640 输入 + 跳2帧
+
+
+class HysteresisLadder:
+    """
+    带迟滞的档位阶梯：连续多次过载才降档、连续多次空闲才升档，
+    且每次换档后有冷却时间，避免在两个档位之间来回振荡。
+    索引0为最高档(开销最大)，索引越大开销越小。
+    """
+    def __init__(self, num_levels, start_level=0, down_after=3, up_after=20, cooldown=2.0):
+        self.num_levels = num_levels
+        self.level = max(0, min(start_level, num_levels - 1))
+        self.down_after = down_after
+        self.up_after = up_after
+        self.cooldown = cooldown
+        self._overload_count = 0
+        self._idle_count = 0
+        self._last_change = 0.0
+        self.changes = 0
+
+    def update(self, overloaded, idle, now=None):
+        """
+        输入一次采样的判断结果，返回档位是否发生变化
+        """
+        now = time.monotonic() if now is None else now
+        if overloaded:
+            self._overload_count += 1
+            self._idle_count = 0
+        elif idle:
+            self._idle_count += 1
+            self._overload_count = 0
+        else:
+            # 处于迟滞区间内，计数清零，保持当前档位
+            self._overload_count = 0
+            self._idle_count = 0
+
+        if now - self._last_change < self.cooldown:
+            return False
+
+        if self._overload_count >= self.down_after and self.level < self.num_levels - 1:
+            self.level += 1
+        elif self._idle_count >= self.up_after and self.level > 0:
+            self.level -= 1
+        else:
+            return False
+
+        self._overload_count = 0
+        self._idle_count = 0
+        self._last_change = now
+        self.changes += 1
+        return True
+
+
+class AdaptiveLatencyController:
+    """
+    根据推理耗时(指数滑动平均)与队列深度，在延迟预算内选择推理档位。
+    检测线程调用 record_inference / record_queue_depth 上报测量值，
+    YoloDetector 每帧读取 input_size / skip_frames。
+    """
+    def __init__(self, budget_ms=100.0, levels=None, start_level=DEFAULT_START_LEVEL,
+                 ema_alpha=0.2, high_ratio=1.0, low_ratio=0.5, max_queue=2):
+        self.levels = list(levels or DEFAULT_LEVELS)
+        self.budget_ms = float(budget_ms)
+        self.ema_alpha = ema_alpha
+        self.high_ratio = high_ratio  # 超过 预算*high_ratio 视为过载
+        self.low_ratio = low_ratio    # 低于 预算*low_ratio 视为有余量
+        self.max_queue = max_queue
+        self.ladder = HysteresisLadder(len(self.levels), start_level=start_level)
+        self.latency_ms = None  # 推理耗时的滑动平均
+        self.queue_depth = 0
+        self._lock = threading.Lock()
+
+    @property
+    def input_size(self):
+        return self.levels[self.ladder.level][0]
+
+    @property
+    def skip_frames(self):
+        return self.levels[self.ladder.level][1]
+
+    def set_budget(self, budget_ms):
+        with self._lock:
+            self.budget_ms = float(budget_ms)
+
+    def record_queue_depth(self, depth):
+        """ 上报当前等待界面处理的帧数 """
+        self.queue_depth = depth
+
+    def record_inference(self, seconds):
+        """
+        上报一次推理耗时(秒)，并据此评估是否需要换档。
+        返回档位是否发生变化。
+        """
+        ms = seconds * 1000.0
+        with self._lock:
+            if self.latency_ms is None:
+                self.latency_ms = ms
+            else:
+                self.latency_ms += self.ema_alpha * (ms - self.latency_ms)
+
+            overloaded = (self.latency_ms > self.budget_ms * self.high_ratio
+                          or self.queue_depth > self.max_queue)
+            idle = (self.latency_ms < self.budget_ms * self.low_ratio
+                    and self.queue_depth == 0)
+            return self.ladder.update(overloaded, idle)
+
+    def stats(self):
+        """ 返回当前状态，供界面显示 """
+        return {
+            "budget_ms": self.budget_ms,
+            "latency_ms": self.latency_ms or 0.0,
+            "queue_depth": self.queue_depth,
+            "level": self.ladder.level,
+            "input_size": self.input_size,
+            "skip_frames": self.skip_frames,
+            "changes": self.ladder.changes,
+        }
@@ -10,6 +10,7 @@ YOLO检测 (由 detection.py 提供)
 
 import sys
 import time
+import logging
 from datetime import datetime
 import os
 from ultralytics import YOLO
@@ -19,13 +20,36 @@ from PyQt5.QtGui import QPixmap, QImage
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QTabWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QComboBox, QSpinBox, QSlider, QFileDialog,
-    QMessageBox, QCheckBox, QLineEdit, QTextEdit, QSizePolicy, QFrame, QApplication
+    QMessageBox, QCheckBox, QLineEdit, QSizePolicy, QFrame, QApplication,
+    QPlainTextEdit, QScrollArea
 )
 from PyQt5.QtCore import QFile, QTextStream
 import numpy as np
-from capture_thread import VideoCaptureThread
-from video_player import VideoPlayer
-from detection import YoloDetector
+from capture_thread import VideoCaptureThread, ProcessCaptureThread
+from video_player import VideoPlayer, PLAYBACK_SPEEDS
+from detection import YoloDetector, draw_detections
+from latency_controller import AdaptiveLatencyController
+from capture_governor import CaptureGovernor
+from dual_stream import DualStream, DEFAULT_ANALYSIS_WIDTH
+from motion_gate import MotionGate
+from roi import load_regions, save_regions, draw_regions
+from roi_editor import RoiEditor
+from tracker import MultiObjectTracker
+from counting import LineZoneCounter, CountingLine, CountingZone, load_counters, save_counters
+from app_logging import LogViewer, setup_logging, shutdown_logging
+from mjpeg_server import MjpegServer
+from detection_cache import DetectionCache, DEFAULT_MAX_MB
+from detection_sidecar import SidecarWriter, SidecarReader, sidecar_path, class_ids, select_classes
+from clip_export import ClipExportThread
+from storage_manager import StorageManager, GB
+from video_writer import (
+    create_video_writer, release_async, transcode_file, find_ffmpeg,
+    FfmpegWriter, FFMPEG_CODECS, FFMPEG_PRESETS, DEFAULT_CODEC, DEFAULT_PRESET, DEFAULT_CRF,
+    BACKEND_AUTO, BACKEND_FFMPEG, BACKEND_OPENCV
+)
+from metrics import REGISTRY, STAGES, PrometheusFileExporter, MetricsHttpServer
+from frame_pool import FRAME_POOL, scale_to_fit
+from frame_envelope import SequenceMonitor
 from utils import (
     SUPPORTED_RESOLUTIONS,
     SUPPORTED_FPS,
@@ -38,7 +62,12 @@ DEFAULT_CAMERA_INDEX = 0
 DEFAULT_WIDTH = 640
 DEFAULT_HEIGHT = 480
 DEFAULT_FPS = 30
+QIMAGE_BGR888 = getattr(QImage, "Format_BGR888", None)  # Qt 5.14+ 可直接显示BGR数据，无需转换
 DEFAULT_INTERVAL_MINUTES = 1  # 默认存储间隔(分钟)
+DEFAULT_LATENCY_BUDGET_MS = 100  # 默认每路推理延迟预算(毫秒)
+DEFAULT_METRICS_FILE = "./metrics/pipeline.prom"  # Prometheus 文本文件导出路径
+DEFAULT_METRICS_PORT = 9108  # 本地HTTP指标端口
+DEFAULT_RESTREAM_PORT = 8090  # MJPEG转发端口
 
 class MainWindow(QMainWindow):
     """
@@ -56,6 +85,9 @@ class MainWindow(QMainWindow):
         self.lastRecordTime = time.time()
         self.saveFormat = "mp4"   # 默认存储格式
         self.recordOut = None
+        self.recordPath = None  # 当前正在写入的分段
+        self.recordSidecar = None  # 当前分段的检测旁路文件(录制原始画面时)
+        self.lastWriterRestart = 0.0
         self.recordFourcc = cv2.VideoWriter_fourcc(*'mp4v')
         self.currentWidth = DEFAULT_WIDTH
         self.currentHeight = DEFAULT_HEIGHT
@@ -69,15 +101,42 @@ class MainWindow(QMainWindow):
         self.useDetector = False  # 是否启用检测
         self.detectionClasses = ["person", "car"]  # 默认检测行人和车辆
         self.confThreshold = 0.3  # 默认置信度阈值
+        self.latencyController = AdaptiveLatencyController(budget_ms=DEFAULT_LATENCY_BUDGET_MS)
+        self.motionGate = MotionGate()
+        self.roiRegions = []  # 当前摄像头的检测区域
+        self.tracker = MultiObjectTracker()
+        self.counter = LineZoneCounter()  # 当前摄像头的计数线/区域
+        self.drawingTarget = "roi"  # 画面上正在绘制的是检测区域("roi")还是计数线/区域("counting")
+        self.detectionCache = DetectionCache()
+        self.playbackCache = None  # 当前回放文件的检测缓存
+        self.playbackOverlay = None  # 当前回放文件的检测旁路文件，回放时叠加
+        self.overlayClasses = []  # 叠加显示的类别，为空时显示全部
+        self.clipIn = None   # 片段起点 (文件路径, 秒)
+        self.clipOut = None  # 片段终点 (文件路径, 秒)，可以位于起点之后的连续分段中
+        self.clipExportThread = None
+        self.storageManager = StorageManager()
+        self.storageManager.start()
 
         # 捕获线程
         self.captureThread = None
+        self.captureFormat = None  # 摄像头实际生效的 (宽, 高, 帧率)
+        self.sequenceMonitor = SequenceMonitor()  # 按帧序号统计采集到显示之间丢失的帧
+
+        # 指标导出
+        self.metricsFileExporter = None
+        self.metricsHttpServer = None
+
+        # MJPEG转发
+        self.restreamServer = None
 
         # 回放控制
         self.videoPlayer = None  # VideoPlayer实例
         self.isPlaying = False
         self.isPaused = False
 
+        # 初始化日志(后台线程写滚动日志文件)
+        setup_logging()
+
         # 加载应用样式
         self.load_app_style()
 
@@ -86,12 +145,24 @@ class MainWindow(QMainWindow):
 
         # 加载检测器(若需要)
         try:
-            self.detector = YoloDetector(model_path="./models/yolov5su.pt")
+            self.detector = YoloDetector(
+                model_path="./models/yolov5su.pt",
+                latency_controller=self.latencyController,
+                motion_gate=self.motionGate
+            )
             self.logViewer.append("[INFO] YOLO模型加载成功。")
         except Exception as e:
             self.logViewer.append(f"[警告] 加载YOLO模型失败: {e}")
             self.detector = None
 
+        self.load_roi_regions()
+        self.load_counting()
+
+        # 定时刷新状态显示
+        self.statusTimer = QTimer(self)
+        self.statusTimer.timeout.connect(self.refresh_status)
+        self.statusTimer.start(1000)
+
     def load_app_style(self):
         """加载应用样式表"""
         try:
@@ -173,6 +244,10 @@ class MainWindow(QMainWindow):
         self.videoLabel.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         
         videoContainerLayout.addWidget(self.videoLabel)
+
+        # 在预览画面上绘制检测区域
+        self.roiEditor = RoiEditor(self.videoLabel, self)
+        self.roiEditor.regionAdded.connect(self.on_roi_added)
         
         # 右侧 - 控制区域 (30%的空间)
         controlPanel = QWidget()
@@ -214,6 +289,11 @@ class MainWindow(QMainWindow):
         self.formatComboBox = QComboBox()
         self.formatComboBox.addItem("mp4")
         self.formatComboBox.addItem("avi")
+        self.chkRecordRaw = QCheckBox("录制原始画面(检测结果另存，显示时叠加)")
+        self.chkRecordRaw.setToolTip(
+            "录像不含检测框，检测结果写入与录像同名的 .dets 文件，预览与回放时叠加显示；"
+            "采集时不再在整幅画面上绘制标注"
+        )
 
         # 创建按钮并添加objectName
         self.btnStartCamera = QPushButton("启动摄像头")
@@ -244,6 +324,31 @@ class MainWindow(QMainWindow):
         self.playSlider.setValue(0)
         self.playSlider.setEnabled(False)
 
+        self.speedComboBox = QComboBox()
+        for speed in PLAYBACK_SPEEDS:
+            self.speedComboBox.addItem(f"{speed:g}×", speed)
+        self.speedComboBox.setCurrentIndex(PLAYBACK_SPEEDS.index(1.0))
+        self.chkDetectFastForward = QCheckBox("快进时检测显示帧")
+        self.chkDetectFastForward.setChecked(True)
+        self.lblPlaybackStats = QLabel("")
+        self.chkShowOverlay = QCheckBox("叠加检测结果")
+        self.chkShowOverlay.setChecked(True)
+        self.chkShowOverlay.setToolTip("原始画面录像回放时叠加录制时的检测结果(需有同名 .dets 文件)")
+        self.lineOverlayClasses = QLineEdit()
+        self.lineOverlayClasses.setPlaceholderText("叠加类别，逗号分隔，留空为全部")
+
+        # 片段导出
+        self.btnMarkIn = QPushButton("设为起点")
+        self.btnMarkIn.setObjectName("btnMarkIn")
+        self.btnMarkOut = QPushButton("设为终点")
+        self.btnMarkOut.setObjectName("btnMarkOut")
+        self.btnClipFromHit = QPushButton("按检测命中")
+        self.btnClipFromHit.setObjectName("btnClipFromHit")
+        self.btnExportClip = QPushButton("导出片段")
+        self.btnExportClip.setObjectName("btnExportClip")
+        self.lblClipRange = QLabel("片段: 未设置")
+        self.lblClipRange.setWordWrap(True)
+
         self.btnPlay = QPushButton("播放")
         self.btnPlay.setObjectName("btnPlay")
         self.btnPlay.setEnabled(False)
@@ -296,6 +401,52 @@ class MainWindow(QMainWindow):
         cameraGroupLayout.addLayout(cameraLayout)
         cameraGroupLayout.addLayout(cameraControlLayout)
         cameraGroupLayout.addLayout(detectControlLayout)
+        # 检测区域分组
+        roiGroupFrame, roiGroupLayout = create_group_frame("检测区域(ROI)")
+
+        self.btnRoiRect = QPushButton("绘制矩形")
+        self.btnRoiRect.setObjectName("btnRoiRect")
+        self.btnRoiPolygon = QPushButton("绘制多边形")
+        self.btnRoiPolygon.setObjectName("btnRoiPolygon")
+        self.btnRoiClear = QPushButton("清除区域")
+        self.btnRoiClear.setObjectName("btnRoiClear")
+        self.chkRoiOnly = QCheckBox("仅检测区域内目标")
+
+        roiBtnLayout = QHBoxLayout()
+        roiBtnLayout.addWidget(self.btnRoiRect)
+        roiBtnLayout.addWidget(self.btnRoiPolygon)
+        roiGroupLayout.addLayout(roiBtnLayout)
+        roiOptLayout = QHBoxLayout()
+        roiOptLayout.addWidget(self.chkRoiOnly)
+        roiOptLayout.addWidget(self.btnRoiClear)
+        roiGroupLayout.addLayout(roiOptLayout)
+
+        # 跟踪与计数分组
+        countGroupFrame, countGroupLayout = create_group_frame("跟踪与计数")
+
+        self.chkTracking = QCheckBox("目标跟踪(稳定ID)")
+        self.btnCountLine = QPushButton("绘制计数线")
+        self.btnCountLine.setObjectName("btnCountLine")
+        self.btnCountZone = QPushButton("绘制计数区域")
+        self.btnCountZone.setObjectName("btnCountZone")
+        self.btnCountReset = QPushButton("计数清零")
+        self.btnCountReset.setObjectName("btnCountReset")
+        self.btnCountClear = QPushButton("删除计数线/区域")
+        self.btnCountClear.setObjectName("btnCountClear")
+        self.lblCounts = QLabel("计数: -")
+        self.lblCounts.setWordWrap(True)
+
+        countGroupLayout.addWidget(self.chkTracking)
+        countBtnLayout = QHBoxLayout()
+        countBtnLayout.addWidget(self.btnCountLine)
+        countBtnLayout.addWidget(self.btnCountZone)
+        countGroupLayout.addLayout(countBtnLayout)
+        countOptLayout = QHBoxLayout()
+        countOptLayout.addWidget(self.btnCountReset)
+        countOptLayout.addWidget(self.btnCountClear)
+        countGroupLayout.addLayout(countOptLayout)
+        countGroupLayout.addWidget(self.lblCounts)
+
         # 视频存储分组
         recordGroupFrame, recordGroupLayout = create_group_frame("视频存储")
         
@@ -312,6 +463,7 @@ class MainWindow(QMainWindow):
         recordBtnLayout.addWidget(self.btnStopRecord)
         
         recordLayout.addLayout(recordSettingsLayout)
+        recordLayout.addWidget(self.chkRecordRaw)
         recordLayout.addLayout(recordBtnLayout)
         
         recordGroupLayout.addLayout(recordLayout)
@@ -330,9 +482,29 @@ class MainWindow(QMainWindow):
         
         playbackSliderLayout = QVBoxLayout()
         playbackSliderLayout.addWidget(self.playSlider)
+        playbackSpeedLayout = QHBoxLayout()
+        playbackSpeedLayout.addWidget(QLabel("倍速:"))
+        playbackSpeedLayout.addWidget(self.speedComboBox)
+        playbackSpeedLayout.addWidget(self.chkDetectFastForward)
+        playbackSliderLayout.addLayout(playbackSpeedLayout)
+        playbackOverlayLayout = QHBoxLayout()
+        playbackOverlayLayout.addWidget(self.chkShowOverlay)
+        playbackOverlayLayout.addWidget(self.lineOverlayClasses)
+        playbackSliderLayout.addLayout(playbackOverlayLayout)
+        playbackSliderLayout.addWidget(self.lblPlaybackStats)
         
+        clipBtnLayout = QHBoxLayout()
+        clipBtnLayout.addWidget(self.btnMarkIn)
+        clipBtnLayout.addWidget(self.btnMarkOut)
+        clipBtnLayout2 = QHBoxLayout()
+        clipBtnLayout2.addWidget(self.btnClipFromHit)
+        clipBtnLayout2.addWidget(self.btnExportClip)
+
         playbackGroupLayout.addLayout(playbackControlLayout)
         playbackGroupLayout.addLayout(playbackSliderLayout)
+        playbackGroupLayout.addLayout(clipBtnLayout)
+        playbackGroupLayout.addLayout(clipBtnLayout2)
+        playbackGroupLayout.addWidget(self.lblClipRange)
 
         # 格式转换分组
         convertGroupFrame, convertGroupLayout = create_group_frame("格式转换")
@@ -346,6 +518,8 @@ class MainWindow(QMainWindow):
 
         # 添加所有控制组件到控制面板
         controlPanelLayout.addWidget(cameraGroupFrame)
+        controlPanelLayout.addWidget(roiGroupFrame)
+        controlPanelLayout.addWidget(countGroupFrame)
         controlPanelLayout.addWidget(recordGroupFrame)
         controlPanelLayout.addWidget(playbackGroupFrame)
         controlPanelLayout.addWidget(convertGroupFrame)
@@ -367,12 +541,31 @@ class MainWindow(QMainWindow):
         self.btnPause.clicked.connect(self.pause_video)
         self.btnStop.clicked.connect(self.stop_video)
         self.btnToggleDetect.clicked.connect(self.toggle_detection)
+        self.playSlider.sliderReleased.connect(self.on_seek)
+        self.speedComboBox.currentIndexChanged.connect(self.on_playback_speed_change)
+        self.chkRecordRaw.toggled.connect(self.on_record_raw_toggle)
+        self.lineOverlayClasses.textChanged.connect(self.on_overlay_classes_change)
+        self.btnMarkIn.clicked.connect(self.mark_clip_in)
+        self.btnMarkOut.clicked.connect(self.mark_clip_out)
+        self.btnClipFromHit.clicked.connect(self.clip_from_detection)
+        self.btnExportClip.clicked.connect(self.export_clip)
 
         self.resolutionComboBox.currentIndexChanged.connect(self.on_resolution_change)
         self.fpsComboBox.currentIndexChanged.connect(self.on_fps_change)
         self.intervalSpinBox.valueChanged.connect(self.on_interval_change)
         self.formatComboBox.currentIndexChanged.connect(self.on_format_change)
         self.btnConvertFormat.clicked.connect(self.convert_format)
+        self.btnRoiRect.clicked.connect(lambda: self.start_roi_drawing("rect"))
+        self.btnRoiPolygon.clicked.connect(lambda: self.start_roi_drawing("polygon"))
+        self.btnRoiClear.clicked.connect(self.clear_roi_regions)
+        self.chkRoiOnly.toggled.connect(self.apply_roi_regions)
+        self.cameraComboBox.currentIndexChanged.connect(self.load_roi_regions)
+        self.chkTracking.toggled.connect(self.apply_tracking)
+        self.btnCountLine.clicked.connect(lambda: self.start_counting_drawing("line"))
+        self.btnCountZone.clicked.connect(lambda: self.start_counting_drawing("polygon"))
+        self.btnCountReset.clicked.connect(self.reset_counts)
+        self.btnCountClear.clicked.connect(self.clear_counting)
+        self.cameraComboBox.currentIndexChanged.connect(self.load_counting)
 
         return tabWidget
 
@@ -421,6 +614,13 @@ class MainWindow(QMainWindow):
         self.spinConfThreshold.setRange(1, 100)
         self.spinConfThreshold.setValue(50)
         
+        # 高分辨率分块检测
+        self.chkTiledDetect = QCheckBox("高分辨率分块检测(小目标)")
+        maxTilesLabel = QLabel("每帧最大分块数:")
+        self.spinMaxTiles = QSpinBox()
+        self.spinMaxTiles.setRange(1, 16)
+        self.spinMaxTiles.setValue(6)
+
         # 添加保存设置按钮
         self.btnSaveSettings = QPushButton("保存检测设置")
         self.btnSaveSettings.setObjectName("btnSaveSettings")
@@ -429,29 +629,288 @@ class MainWindow(QMainWindow):
         detectionGroupLayout.addWidget(self.lineDetectClasses)
         detectionGroupLayout.addWidget(confidenceLabel)
         detectionGroupLayout.addWidget(self.spinConfThreshold)
+        detectionGroupLayout.addWidget(self.chkTiledDetect)
+        detectionGroupLayout.addWidget(maxTilesLabel)
+        detectionGroupLayout.addWidget(self.spinMaxTiles)
         detectionGroupLayout.addWidget(self.btnSaveSettings)
         
+        # 性能设置分组
+        performanceGroupFrame, performanceGroupLayout = create_group_frame("性能设置")
+
+        self.chkAdaptiveInference = QCheckBox("自适应推理分辨率/跳帧")
+        self.chkAdaptiveInference.setChecked(True)
+
+        budgetLabel = QLabel("推理延迟预算(毫秒):")
+        self.spinLatencyBudget = QSpinBox()
+        self.spinLatencyBudget.setRange(10, 2000)
+        self.spinLatencyBudget.setValue(DEFAULT_LATENCY_BUDGET_MS)
+
+        self.lblAdaptiveStatus = QLabel("推理档位: -")
+
+        self.chkMotionGate = QCheckBox("运动门控(静止画面跳过检测)")
+        self.chkMotionGate.setChecked(True)
+
+        motionAreaLabel = QLabel("变化面积阈值(‰):")
+        self.spinMotionArea = QSpinBox()
+        self.spinMotionArea.setRange(1, 200)
+        self.spinMotionArea.setValue(int(self.motionGate.area_threshold * 1000))
+
+        motionRefreshLabel = QLabel("强制刷新间隔(秒):")
+        self.spinMotionRefresh = QSpinBox()
+        self.spinMotionRefresh.setRange(1, 600)
+        self.spinMotionRefresh.setValue(int(self.motionGate.refresh_interval))
+
+        self.lblMotionStatus = QLabel("运动门控: -")
+
+        self.chkMultiProcess = QCheckBox("多进程采集/检测(共享内存传帧)")
+        self.chkMultiProcess.setToolTip("采集与检测在独立进程中运行，下次启动摄像头时生效")
+
+        self.chkCaptureGovernor = QCheckBox("按负载自动调节采集分辨率/帧率")
+        self.chkCaptureGovernor.setToolTip(
+            "CPU占用或处理延迟持续超限时逐级降低采集分辨率/帧率，有余量时恢复，下次启动摄像头时生效"
+        )
+        self.lblCaptureStatus = QLabel("采集格式: -")
+
+        self.chkDualStream = QCheckBox("双码流(低分辨率分析/预览，全分辨率录像)")
+        self.chkDualStream.setToolTip(
+            "录像使用全分辨率主码流；勾选的环节改用低分辨率分析流(子码流或缩小一次的主码流)，"
+            "下次启动摄像头时生效"
+        )
+        analysisWidthLabel = QLabel("分析流宽度:")
+        self.spinAnalysisWidth = QSpinBox()
+        self.spinAnalysisWidth.setRange(160, 1920)
+        self.spinAnalysisWidth.setSingleStep(32)
+        self.spinAnalysisWidth.setValue(DEFAULT_ANALYSIS_WIDTH)
+        self.spinAnalysisWidth.setSuffix(" px")
+        self.lineSubStream = QLineEdit()
+        self.lineSubStream.setPlaceholderText("子码流地址(可选，如摄像头的 RTSP/HTTP 子码流)")
+        self.chkAnalysisInference = QCheckBox("推理")
+        self.chkAnalysisInference.setChecked(True)
+        self.chkAnalysisMotion = QCheckBox("运动门控")
+        self.chkAnalysisMotion.setChecked(True)
+        self.chkAnalysisPreview = QCheckBox("预览")
+        self.chkAnalysisPreview.setChecked(True)
+
+        self.chkDetectionCache = QCheckBox("回放检测结果缓存(重复回放不再推理)")
+        self.chkDetectionCache.setChecked(True)
+        cacheSizeLabel = QLabel("缓存上限(MB):")
+        self.spinCacheSize = QSpinBox()
+        self.spinCacheSize.setRange(16, 102400)
+        self.spinCacheSize.setValue(DEFAULT_MAX_MB)
+        self.btnClearCache = QPushButton("清空缓存")
+        self.btnClearCache.setObjectName("btnClearCache")
+        self.lblCacheStatus = QLabel("检测缓存: -")
+
+        performanceGroupLayout.addWidget(self.chkAdaptiveInference)
+        performanceGroupLayout.addWidget(budgetLabel)
+        performanceGroupLayout.addWidget(self.spinLatencyBudget)
+        performanceGroupLayout.addWidget(self.lblAdaptiveStatus)
+        performanceGroupLayout.addWidget(self.chkMotionGate)
+        performanceGroupLayout.addWidget(motionAreaLabel)
+        performanceGroupLayout.addWidget(self.spinMotionArea)
+        performanceGroupLayout.addWidget(motionRefreshLabel)
+        performanceGroupLayout.addWidget(self.spinMotionRefresh)
+        performanceGroupLayout.addWidget(self.lblMotionStatus)
+        performanceGroupLayout.addWidget(self.chkMultiProcess)
+        performanceGroupLayout.addWidget(self.chkCaptureGovernor)
+        performanceGroupLayout.addWidget(self.lblCaptureStatus)
+        performanceGroupLayout.addWidget(self.chkDualStream)
+        dualStreamLayout = QHBoxLayout()
+        dualStreamLayout.addWidget(analysisWidthLabel)
+        dualStreamLayout.addWidget(self.spinAnalysisWidth)
+        performanceGroupLayout.addLayout(dualStreamLayout)
+        performanceGroupLayout.addWidget(self.lineSubStream)
+        analysisConsumerLayout = QHBoxLayout()
+        analysisConsumerLayout.addWidget(QLabel("使用分析流:"))
+        analysisConsumerLayout.addWidget(self.chkAnalysisInference)
+        analysisConsumerLayout.addWidget(self.chkAnalysisMotion)
+        analysisConsumerLayout.addWidget(self.chkAnalysisPreview)
+        performanceGroupLayout.addLayout(analysisConsumerLayout)
+        performanceGroupLayout.addWidget(self.chkDetectionCache)
+        cacheLayout = QHBoxLayout()
+        cacheLayout.addWidget(cacheSizeLabel)
+        cacheLayout.addWidget(self.spinCacheSize)
+        cacheLayout.addWidget(self.btnClearCache)
+        performanceGroupLayout.addLayout(cacheLayout)
+        performanceGroupLayout.addWidget(self.lblCacheStatus)
+
+        # 存储管理分组
+        storageGroupFrame, storageGroupLayout = create_group_frame("存储管理")
+
+        self.spinStorageQuota = QSpinBox()
+        self.spinStorageQuota.setRange(0, 100000)
+        self.spinStorageQuota.setSuffix(" GB")
+        self.spinStorageQuota.setSpecialValueText("不限")
+        self.spinRetentionDays = QSpinBox()
+        self.spinRetentionDays.setRange(0, 3650)
+        self.spinRetentionDays.setSuffix(" 天")
+        self.spinRetentionDays.setSpecialValueText("不限")
+        self.spinMinFree = QSpinBox()
+        self.spinMinFree.setRange(1, 1000)
+        self.spinMinFree.setSuffix(" GB")
+        self.spinMinFree.setValue(int(self.storageManager.min_free_gb))
+        self.lblStorageStatus = QLabel("存储: -")
+        self.lblStorageStatus.setWordWrap(True)
+
+        storageGroupLayout.addWidget(QLabel("录像容量上限:"))
+        storageGroupLayout.addWidget(self.spinStorageQuota)
+        storageGroupLayout.addWidget(QLabel("录像保存天数:"))
+        storageGroupLayout.addWidget(self.spinRetentionDays)
+        storageGroupLayout.addWidget(QLabel("磁盘最少剩余空间:"))
+        storageGroupLayout.addWidget(self.spinMinFree)
+        storageGroupLayout.addWidget(self.lblStorageStatus)
+
+        # 网络转发分组
+        restreamGroupFrame, restreamGroupLayout = create_group_frame("网络转发(MJPEG)")
+
+        self.chkRestream = QCheckBox("开启转发 端口:")
+        self.spinRestreamPort = QSpinBox()
+        self.spinRestreamPort.setRange(1024, 65535)
+        self.spinRestreamPort.setValue(DEFAULT_RESTREAM_PORT)
+        self.lblRestreamStatus = QLabel("转发: 关闭")
+        self.lblRestreamStatus.setTextInteractionFlags(Qt.TextSelectableByMouse)
+
+        restreamLayout = QHBoxLayout()
+        restreamLayout.addWidget(self.chkRestream)
+        restreamLayout.addWidget(self.spinRestreamPort)
+        restreamGroupLayout.addLayout(restreamLayout)
+        restreamGroupLayout.addWidget(self.lblRestreamStatus)
+
+        # 编码设置分组
+        encoderGroupFrame, encoderGroupLayout = create_group_frame("编码设置")
+
+        self.encoderBackendComboBox = QComboBox()
+        self.encoderBackendComboBox.addItem("自动(优先ffmpeg)", BACKEND_AUTO)
+        self.encoderBackendComboBox.addItem("ffmpeg", BACKEND_FFMPEG)
+        self.encoderBackendComboBox.addItem("OpenCV", BACKEND_OPENCV)
+
+        self.encoderCodecComboBox = QComboBox()
+        for codec in FFMPEG_CODECS:
+            self.encoderCodecComboBox.addItem(codec)
+        self.encoderCodecComboBox.setCurrentText(DEFAULT_CODEC)
+
+        self.encoderPresetComboBox = QComboBox()
+        for preset in FFMPEG_PRESETS:
+            self.encoderPresetComboBox.addItem(preset)
+        self.encoderPresetComboBox.setCurrentText(DEFAULT_PRESET)
+
+        self.spinEncoderCrf = QSpinBox()
+        self.spinEncoderCrf.setRange(0, 51)
+        self.spinEncoderCrf.setValue(DEFAULT_CRF)
+
+        self.spinEncoderThreads = QSpinBox()
+        self.spinEncoderThreads.setRange(0, 64)
+        self.spinEncoderThreads.setSpecialValueText("自动")
+
+        encoderBackendLayout = QHBoxLayout()
+        encoderBackendLayout.addWidget(QLabel("后端:"))
+        encoderBackendLayout.addWidget(self.encoderBackendComboBox, 1)
+        encoderCodecLayout = QHBoxLayout()
+        encoderCodecLayout.addWidget(QLabel("编码器:"))
+        encoderCodecLayout.addWidget(self.encoderCodecComboBox, 1)
+        encoderCodecLayout.addWidget(QLabel("预设:"))
+        encoderCodecLayout.addWidget(self.encoderPresetComboBox, 1)
+        encoderQualityLayout = QHBoxLayout()
+        encoderQualityLayout.addWidget(QLabel("CRF:"))
+        encoderQualityLayout.addWidget(self.spinEncoderCrf)
+        encoderQualityLayout.addWidget(QLabel("线程:"))
+        encoderQualityLayout.addWidget(self.spinEncoderThreads)
+
+        encoderGroupLayout.addLayout(encoderBackendLayout)
+        encoderGroupLayout.addLayout(encoderCodecLayout)
+        encoderGroupLayout.addLayout(encoderQualityLayout)
+        if not find_ffmpeg():
+            encoderGroupLayout.addWidget(QLabel("未检测到ffmpeg，将使用OpenCV编码"))
+
         settingsPanelLayout.addWidget(detectionGroupFrame)
+        settingsPanelLayout.addWidget(performanceGroupFrame)
+        settingsPanelLayout.addWidget(encoderGroupFrame)
+        settingsPanelLayout.addWidget(storageGroupFrame)
+        settingsPanelLayout.addWidget(restreamGroupFrame)
         settingsPanelLayout.addStretch(1)
 
-        # 右侧 - 日志区域
+        # 设置项较多时可滚动
+        settingsScroll = QScrollArea()
+        settingsScroll.setWidgetResizable(True)
+        settingsScroll.setFrameShape(QFrame.NoFrame)
+        settingsScroll.setWidget(settingsPanel)
+
+        # 右侧 - 指标与日志区域
+        rightPanel = QWidget()
+        rightPanelLayout = QVBoxLayout(rightPanel)
+        rightPanelLayout.setContentsMargins(0, 0, 0, 0)
+
+        metricsGroupFrame, metricsGroupLayout = create_group_frame("运行指标")
+
+        self.metricsViewer = QPlainTextEdit()
+        self.metricsViewer.setObjectName("metricsViewer")
+        self.metricsViewer.setReadOnly(True)
+        self.metricsViewer.setMaximumHeight(170)
+        self.metricsViewer.setPlaceholderText("暂无指标数据")
+
+        self.chkMetricsFile = QCheckBox(f"定时写入Prometheus文件({DEFAULT_METRICS_FILE})")
+        self.chkMetricsHttp = QCheckBox("HTTP指标端点 端口:")
+        self.spinMetricsPort = QSpinBox()
+        self.spinMetricsPort.setRange(1024, 65535)
+        self.spinMetricsPort.setValue(DEFAULT_METRICS_PORT)
+
+        metricsExportLayout = QHBoxLayout()
+        metricsExportLayout.addWidget(self.chkMetricsHttp)
+        metricsExportLayout.addWidget(self.spinMetricsPort)
+        metricsExportLayout.addStretch(1)
+
+        metricsGroupLayout.addWidget(self.metricsViewer)
+        metricsGroupLayout.addWidget(self.chkMetricsFile)
+        metricsGroupLayout.addLayout(metricsExportLayout)
+
         logGroupFrame, logGroupLayout = create_group_frame("系统日志")
         
-        self.logViewer = QTextEdit()
+        self.logViewer = LogViewer(max_lines=2000)
         self.logViewer.setObjectName("logViewer")
-        self.logViewer.setReadOnly(True)
         self.logViewer.setPlaceholderText("日志输出...")
-        
+
+        # 日志显示级别
+        self.logLevelComboBox = QComboBox()
+        for levelName in ("DEBUG", "INFO", "WARNING", "ERROR"):
+            self.logLevelComboBox.addItem(levelName)
+        self.logLevelComboBox.setCurrentText("INFO")
+
+        logLevelLayout = QHBoxLayout()
+        logLevelLayout.addWidget(QLabel("显示级别:"))
+        logLevelLayout.addWidget(self.logLevelComboBox)
+        logLevelLayout.addStretch(1)
+
+        logGroupLayout.addLayout(logLevelLayout)
         logGroupLayout.addWidget(self.logViewer)
 
+        rightPanelLayout.addWidget(metricsGroupFrame)
+        rightPanelLayout.addWidget(logGroupFrame, 1)
+
         # 添加到主布局
-        mainLayout.addWidget(settingsPanel, 3)  # 30% 的空间
-        mainLayout.addWidget(logGroupFrame, 7)  # 70% 的空间
+        mainLayout.addWidget(settingsScroll, 3)  # 30% 的空间
+        mainLayout.addWidget(rightPanel, 7)  # 70% 的空间
 
         # 连接信号
         self.btnSaveSettings.clicked.connect(self.save_detection_settings)
         self.spinConfThreshold.valueChanged.connect(self.on_conf_threshold_change)
         self.lineDetectClasses.textChanged.connect(self.on_detect_classes_change)
+        self.chkTiledDetect.toggled.connect(self.on_tiled_detect_change)
+        self.spinMaxTiles.valueChanged.connect(self.on_tiled_detect_change)
+        self.chkAdaptiveInference.toggled.connect(self.on_adaptive_inference_toggle)
+        self.spinLatencyBudget.valueChanged.connect(self.on_latency_budget_change)
+        self.chkMotionGate.toggled.connect(self.on_motion_gate_toggle)
+        self.chkDetectionCache.toggled.connect(self.on_detection_cache_toggle)
+        self.spinStorageQuota.valueChanged.connect(self.on_storage_policy_change)
+        self.spinRetentionDays.valueChanged.connect(self.on_storage_policy_change)
+        self.spinMinFree.valueChanged.connect(self.on_storage_policy_change)
+        self.spinCacheSize.valueChanged.connect(self.on_cache_size_change)
+        self.btnClearCache.clicked.connect(self.clear_detection_cache)
+        self.chkMetricsFile.toggled.connect(self.on_metrics_file_toggle)
+        self.logLevelComboBox.currentTextChanged.connect(self.on_log_level_change)
+        self.chkMetricsHttp.toggled.connect(self.on_metrics_http_toggle)
+        self.chkRestream.toggled.connect(self.on_restream_toggle)
+        self.spinMotionArea.valueChanged.connect(self.on_motion_gate_params_change)
+        self.spinMotionRefresh.valueChanged.connect(self.on_motion_gate_params_change)
 
         widget.setLayout(mainLayout)
         return widget
@@ -495,6 +954,394 @@ class MainWindow(QMainWindow):
         """当检测类别改变时"""
         self.logViewer.append(f"[INFO] 检测类别已修改为: {text}")
 
+    def on_tiled_detect_change(self):
+        """分块检测开关或最大分块数改变时"""
+        if self.detector:
+            self.detector.tiled = self.chkTiledDetect.isChecked()
+            self.detector.max_tiles = self.spinMaxTiles.value()
+        self.logViewer.append(
+            f"[INFO] 分块检测: {'开启' if self.chkTiledDetect.isChecked() else '关闭'}, "
+            f"每帧最多 {self.spinMaxTiles.value()} 块"
+        )
+
+    def on_adaptive_inference_toggle(self, checked):
+        """开启/关闭自适应推理档位"""
+        if self.detector:
+            self.detector.latency_controller = self.latencyController if checked else None
+            if not checked:
+                # 恢复默认的固定档位
+                self.detector.input_size = 640
+                self.detector.skip_frames = 2
+        self.logViewer.append(f"[INFO] 自适应推理已{'开启' if checked else '关闭'}")
+
+    def on_latency_budget_change(self, value):
+        """当推理延迟预算改变时"""
+        self.latencyController.set_budget(value)
+        self.logViewer.append(f"[INFO] 推理延迟预算已修改为: {value}ms")
+
+    def on_motion_gate_toggle(self, checked):
+        """开启/关闭运动门控"""
+        if self.detector:
+            self.detector.motion_gate = self.motionGate if checked else None
+        self.motionGate.reset()
+        self.logViewer.append(f"[INFO] 运动门控已{'开启' if checked else '关闭'}")
+
+    def on_motion_gate_params_change(self):
+        """当运动门控参数改变时"""
+        self.motionGate.area_threshold = self.spinMotionArea.value() / 1000.0
+        self.motionGate.refresh_interval = float(self.spinMotionRefresh.value())
+
+    def on_detection_cache_toggle(self, checked):
+        """开启/关闭回放检测缓存"""
+        if not checked:
+            self.close_playback_cache()
+        self.logViewer.append(f"[INFO] 回放检测缓存已{'开启' if checked else '关闭'}")
+
+    def on_storage_policy_change(self):
+        """ 存储保留策略变化时立即生效(由后台线程在下一轮执行) """
+        self.storageManager.max_gb = self.spinStorageQuota.value()
+        self.storageManager.max_age_days = self.spinRetentionDays.value()
+        self.storageManager.min_free_gb = self.spinMinFree.value()
+
+    def on_cache_size_change(self, value):
+        self.detectionCache.max_mb = value
+
+    def clear_detection_cache(self):
+        self.close_playback_cache()
+        self.detectionCache.clear()
+        self.logViewer.append("[INFO] 检测缓存已清空")
+
+    def refresh_status(self):
+        """定时刷新设置页中的运行状态"""
+        if self.detector and self.detector.latency_controller is not None:
+            st = self.latencyController.stats()
+            self.lblAdaptiveStatus.setText(
+                f"推理档位: {st['input_size']}px / 跳{st['skip_frames']}帧\n"
+                f"推理耗时: {st['latency_ms']:.1f}ms  队列: {st['queue_depth']}  换档: {st['changes']}次"
+            )
+        else:
+            self.lblAdaptiveStatus.setText("推理档位: 固定")
+
+        if self.detector and self.detector.motion_gate is not None:
+            st = self.motionGate.stats()
+            self.lblMotionStatus.setText(
+                f"运动门控: {'放行' if st['open'] else '拦截'}  变化面积: {st['motion_ratio'] * 100:.2f}%\n"
+                f"跳过率: {st['skip_ratio'] * 100:.1f}% ({st['gated']}/{st['checked']})"
+            )
+        else:
+            self.lblMotionStatus.setText("运动门控: 关闭")
+
+        if self.captureThread is not None and self.captureFormat is not None:
+            w, h, fps = self.captureFormat
+            text = f"采集格式: {w}x{h}@{fps:g}"
+            gst = self.captureThread.governorStats
+            if gst is not None:
+                cpu = f"{gst['cpu']:.0f}%" if gst["cpu"] is not None else "-"
+                text += (f"  档位 {gst['level'] + 1}/{gst['levels']}{'(仅帧率)' if gst['fps_only'] else ''}\n"
+                         f"CPU: {cpu}  处理占比: {gst['busy_ratio'] * 100:.0f}%  换档: {gst['changes']}次")
+            dst = self.captureThread.dualStreamStats
+            if dst is not None:
+                origin = "子码流" if dst["sub_connected"] else f"主码流缩小至宽 {dst['width']}"
+                text += f"\n分析流: {origin}  子码流帧 {dst['sub_frames']}  缩小帧 {dst['scaled_frames']}"
+            source = str(self.captureThread.metricsSource)
+            lost = self.sequenceMonitor.lost.get(source, 0)
+            if lost:
+                text += f"\n序号断档 {self.sequenceMonitor.gaps.get(source, 0)} 次，共丢失 {lost} 帧"
+            self.lblCaptureStatus.setText(text)
+        else:
+            self.lblCaptureStatus.setText("采集格式: -")
+
+        if len(self.counter) > 0:
+            self.lblCounts.setText(self.counter.summary().replace("  ", "\n"))
+        else:
+            self.lblCounts.setText("计数: 未设置计数线/区域")
+
+        if self.videoPlayer is not None and self.videoPlayer.isPlaying:
+            vp = self.videoPlayer
+            self.lblPlaybackStats.setText(
+                f"实际 {vp.effectiveSpeed:.2f}×  读取 {vp.decodeFps:.0f} 帧/秒  显示 {vp.presentFps:.0f} 帧/秒"
+            )
+        else:
+            self.lblPlaybackStats.setText("")
+
+        st = self.storageManager.stats()
+        lines = [
+            f"录像占用 {st['total_bytes'] / GB:.2f}GB  剩余空间 {st['free_bytes'] / GB:.1f}GB",
+            f"写入速度 {st['write_bps'] / (1024 * 1024):.2f}MB/s  已清理 {st['deleted_segments']} 个分段",
+        ]
+        for cam, (size, count) in sorted(st["cameras"].items()):
+            lines.append(f"摄像头 {cam}: {size / GB:.2f}GB / {count} 个分段")
+        self.lblStorageStatus.setText("\n".join(lines))
+
+        cache = self.playbackCache
+        usage = self.detectionCache.usage_bytes() / (1024 * 1024)
+        if cache is not None:
+            self.lblCacheStatus.setText(
+                f"检测缓存: 命中率 {cache.hit_ratio() * 100:.1f}% ({cache.hits}/{cache.hits + cache.misses})\n"
+                f"本视频已缓存 {len(cache)} 帧  占用 {usage:.1f}MB"
+            )
+        else:
+            self.lblCacheStatus.setText(f"检测缓存: 占用 {usage:.1f}MB")
+
+        FRAME_POOL.publish_metrics()
+        self.refresh_metrics_view()
+
+        if self.restreamServer is not None:
+            port = self.restreamServer.port
+            lines = [f"地址: http://<本机IP>:{port}/"]
+            for name, st in sorted(self.restreamServer.stats().items()):
+                lines.append(f"{name}: /stream/{name}.mjpg  观看 {st['clients']} 人  已编码 {st['frames_encoded']} 帧")
+            self.lblRestreamStatus.setText("\n".join(lines))
+
+    def on_restream_toggle(self, checked):
+        """ 开启/关闭MJPEG转发服务 """
+        if checked:
+            port = self.spinRestreamPort.value()
+            try:
+                self.restreamServer = MjpegServer(port=port)
+                self.restreamServer.start()
+                self.spinRestreamPort.setEnabled(False)
+                self.logViewer.append(f"[INFO] MJPEG转发已开启: http://<本机IP>:{port}/")
+            except OSError as e:
+                self.restreamServer = None
+                self.logViewer.append(f"[ERROR] 启动MJPEG转发失败: {e}")
+                self.chkRestream.setChecked(False)
+        elif self.restreamServer is not None:
+            self.restreamServer.stop()
+            self.restreamServer = None
+            self.spinRestreamPort.setEnabled(True)
+            self.lblRestreamStatus.setText("转发: 关闭")
+            self.logViewer.append("[INFO] MJPEG转发已关闭")
+
+    def refresh_metrics_view(self):
+        """ 把指标快照格式化显示在设置页 """
+        snap = REGISTRY.snapshot()
+        lines = []
+        for (stage, source), st in sorted(snap["stages"].items(),
+                                          key=lambda kv: (kv[0][1], STAGES.index(kv[0][0]) if kv[0][0] in STAGES else 99)):
+            lines.append(
+                f"[{source}] {stage:<9} {st['fps']:6.1f} fps  p50 {st['p50_ms']:7.1f}ms  p99 {st['p99_ms']:7.1f}ms"
+            )
+        for (name, source), value in sorted(snap["gauges"].items()):
+            lines.append(f"[{source}] {name}: {value}")
+        for (name, source), value in sorted(snap["counters"].items()):
+            lines.append(f"[{source}] {name}: {value}")
+        self.metricsViewer.setPlainText("\n".join(lines))
+
+    def on_log_level_change(self, levelName):
+        """ 修改日志查看器显示的最低级别 """
+        self.logViewer.set_level(getattr(logging, levelName, logging.INFO))
+
+    def on_metrics_file_toggle(self, checked):
+        """ 开启/关闭定时写入Prometheus文本文件 """
+        if checked:
+            self.metricsFileExporter = PrometheusFileExporter(DEFAULT_METRICS_FILE)
+            self.metricsFileExporter.start()
+            self.logViewer.append(f"[INFO] 指标将定时写入: {DEFAULT_METRICS_FILE}")
+        elif self.metricsFileExporter is not None:
+            self.metricsFileExporter.stop()
+            self.metricsFileExporter = None
+            self.logViewer.append("[INFO] 已停止写入指标文件")
+
+    def on_metrics_http_toggle(self, checked):
+        """ 开启/关闭本地HTTP指标端点 """
+        if checked:
+            port = self.spinMetricsPort.value()
+            try:
+                self.metricsHttpServer = MetricsHttpServer(port=port)
+                self.metricsHttpServer.start()
+                self.spinMetricsPort.setEnabled(False)
+                self.logViewer.append(f"[INFO] 指标HTTP端点已启动: http://127.0.0.1:{port}/metrics")
+            except OSError as e:
+                self.metricsHttpServer = None
+                self.logViewer.append(f"[ERROR] 启动指标HTTP端点失败: {e}")
+                self.chkMetricsHttp.setChecked(False)
+        elif self.metricsHttpServer is not None:
+            self.metricsHttpServer.stop()
+            self.metricsHttpServer = None
+            self.spinMetricsPort.setEnabled(True)
+            self.logViewer.append("[INFO] 指标HTTP端点已停止")
+
+    # -------------------- 检测区域(ROI) --------------------
+    def load_roi_regions(self):
+        """ 加载当前摄像头保存的检测区域 """
+        self.roiRegions = load_regions(self.cameraComboBox.currentData())
+        self.apply_roi_regions()
+        if self.roiRegions:
+            self.logViewer.append(f"[INFO] 已加载 {len(self.roiRegions)} 个检测区域")
+
+    def apply_roi_regions(self):
+        """ 把检测区域应用到检测器 """
+        if self.detector:
+            self.detector.rois = list(self.roiRegions) if self.chkRoiOnly.isChecked() else []
+        self.sync_governor_mode()
+
+    def regions_need_fixed_resolution(self):
+        """ 检测区域、计数线/区域按原图像素坐标保存，存在或正在绘制时采集分辨率不能被调节器降低 """
+        return bool(self.roiRegions) or len(self.counter) > 0 or self.roiEditor.mode is not None
+
+    def sync_governor_mode(self):
+        """ 区域变化后通知采集线程内的调节器只降帧率/恢复全部档位(下一次采样时生效) """
+        governor = getattr(self.captureThread, "governor", None)
+        if isinstance(governor, CaptureGovernor):
+            governor.fps_only = self.regions_need_fixed_resolution()
+
+    def start_roi_drawing(self, mode):
+        if self.videoLabel.pixmap() is None:
+            QMessageBox.warning(self, "警告", "请先启动摄像头或播放视频，再在画面上绘制区域！")
+            return
+        self.drawingTarget = "roi"
+        self.roiEditor.start(mode)
+        self.sync_governor_mode()  # 在用户选择的分辨率下绘制
+        if mode == "rect":
+            self.logViewer.append("[INFO] 请在画面上按住鼠标拖动绘制矩形区域")
+        else:
+            self.logViewer.append("[INFO] 请在画面上逐点单击绘制多边形，双击或右键结束")
+
+    def on_roi_added(self, region):
+        if self.drawingTarget == "counting":
+            self.on_counting_added(region)
+            return
+        self.roiRegions.append(region)
+        try:
+            path = save_regions(self.cameraComboBox.currentData(), self.roiRegions)
+            self.logViewer.append(f"[INFO] 检测区域已保存: {path}")
+        except OSError as e:
+            self.logViewer.append(f"[ERROR] 保存检测区域失败: {e}")
+        self.apply_roi_regions()
+
+    def clear_roi_regions(self):
+        self.roiEditor.cancel()
+        self.roiRegions = []
+        try:
+            save_regions(self.cameraComboBox.currentData(), self.roiRegions)
+        except OSError as e:
+            self.logViewer.append(f"[ERROR] 保存检测区域失败: {e}")
+        self.apply_roi_regions()
+        self.logViewer.append("[INFO] 检测区域已清除")
+
+    # -------------------- 跟踪与计数 --------------------
+    def load_counting(self):
+        """ 加载当前摄像头保存的计数线/区域 """
+        self.counter = load_counters(self.cameraComboBox.currentData())
+        self.apply_tracking()
+        self.sync_governor_mode()
+        if len(self.counter) > 0:
+            self.logViewer.append(f"[INFO] 已加载 {len(self.counter)} 条计数线/区域")
+
+    def apply_tracking(self):
+        """ 把跟踪器与计数器挂到检测器上，计数依赖跟踪 """
+        if not self.detector:
+            return
+        if self.chkTracking.isChecked():
+            self.detector.tracker = self.tracker
+            self.detector.counter = self.counter
+        else:
+            self.detector.tracker = None
+            self.detector.counter = None
+            self.tracker.reset()
+
+    def start_counting_drawing(self, mode):
+        if self.videoLabel.pixmap() is None:
+            QMessageBox.warning(self, "警告", "请先启动摄像头或播放视频，再在画面上绘制计数线/区域！")
+            return
+        if not self.chkTracking.isChecked():
+            self.chkTracking.setChecked(True)
+            self.logViewer.append("[INFO] 计数需要目标跟踪，已自动开启跟踪")
+        self.drawingTarget = "counting"
+        self.roiEditor.start(mode)
+        self.sync_governor_mode()
+        if mode == "line":
+            self.logViewer.append("[INFO] 请在画面上按住鼠标拖动绘制计数线")
+        else:
+            self.logViewer.append("[INFO] 请在画面上逐点单击绘制计数区域，双击或右键结束")
+
+    def on_counting_added(self, region):
+        self.drawingTarget = "roi"
+        if region.kind == "line":
+            item = CountingLine(self.counter.next_name("line"), region.points)
+        else:
+            item = CountingZone(self.counter.next_name("zone"), region.points)
+        self.counter.items.append(item)
+        self.sync_governor_mode()
+        try:
+            path = save_counters(self.cameraComboBox.currentData(), self.counter)
+            self.logViewer.append(f"[INFO] 计数线/区域已保存: {path}")
+        except OSError as e:
+            self.logViewer.append(f"[ERROR] 保存计数线/区域失败: {e}")
+
+    def reset_counts(self):
+        self.counter.reset()
+        self.logViewer.append("[INFO] 计数已清零")
+
+    def clear_counting(self):
+        self.roiEditor.cancel()
+        self.counter.items.clear()
+        self.sync_governor_mode()
+        try:
+            save_counters(self.cameraComboBox.currentData(), self.counter)
+        except OSError as e:
+            self.logViewer.append(f"[ERROR] 保存计数线/区域失败: {e}")
+        self.logViewer.append("[INFO] 计数线/区域已删除")
+
+    def encoder_options(self):
+        """ 当前编码设置 """
+        return {
+            "backend": self.encoderBackendComboBox.currentData(),
+            "codec": self.encoderCodecComboBox.currentText(),
+            "preset": self.encoderPresetComboBox.currentText(),
+            "crf": self.spinEncoderCrf.value(),
+            "threads": self.spinEncoderThreads.value(),
+        }
+
+    def detector_config(self):
+        """ 多进程模式下传给工作进程的检测配置(只含可序列化的基本类型) """
+        return {
+            "model_path": "./models/yolov5su.pt",
+            "adaptive": self.chkAdaptiveInference.isChecked(),
+            "budget_ms": self.spinLatencyBudget.value(),
+            "motion_gate": self.chkMotionGate.isChecked(),
+            "tiled": self.chkTiledDetect.isChecked(),
+            "max_tiles": self.spinMaxTiles.value(),
+            "rois": [r.to_dict() for r in self.roiRegions] if self.chkRoiOnly.isChecked() else [],
+            "tracking": self.chkTracking.isChecked(),
+            "counters": self.counter.to_list(),
+            "annotate": not self.chkRecordRaw.isChecked(),
+        }
+
+    def overlay_names(self, source=None):
+        """ 叠加显示使用的类别名称：回放原始画面录像时取旁路文件中记录的，否则取当前模型的 """
+        if source == "playback" and self.playbackOverlay is not None:
+            return self.playbackOverlay.names
+        return getattr(self.detector.model, "names", None) if self.detector else None
+
+    def on_record_raw_toggle(self, checked):
+        """ 录制原始画面：检测器不在帧上绘制，结果随帧传递、写入旁路文件，显示时再叠加 """
+        if self.detector:
+            self.detector.annotate = not checked
+        if checked:
+            self.logViewer.append("[INFO] 录像将保存原始画面，检测结果写入同名 .dets 文件，显示时叠加")
+        else:
+            self.logViewer.append("[INFO] 录像将保存带检测框的画面")
+        if isinstance(self.captureThread, ProcessCaptureThread):
+            self.logViewer.append("[INFO] 多进程模式下需重启摄像头后生效")
+        # 同一分段内画面与旁路文件要保持一致，正在录像时立即换新分段
+        if self.isRecording:
+            self.start_new_save_file()
+            self.lastRecordTime = time.time()
+
+    def on_overlay_classes_change(self, text):
+        self.overlayClasses = [s.strip() for s in text.split(",") if s.strip()]
+
+    def dual_stream(self):
+        """ 按设置创建双码流，未开启时返回 None """
+        if not self.chkDualStream.isChecked():
+            return None
+        consumers = [name for name, chk in (("inference", self.chkAnalysisInference),
+                                            ("motion", self.chkAnalysisMotion),
+                                            ("preview", self.chkAnalysisPreview)) if chk.isChecked()]
+        return DualStream(self.spinAnalysisWidth.value(), self.lineSubStream.text().strip(), consumers)
+
     # -------------------- 摄像头及录像逻辑 --------------------
     def start_camera(self):
         """ 打开摄像头，启动采集线程 """
@@ -503,30 +1350,51 @@ class MainWindow(QMainWindow):
             return
         try:
             cameraIndex = self.cameraComboBox.currentData()
-            # 检查是否为手机摄像头 URL
-            if isinstance(cameraIndex, str) and cameraIndex.startswith("http"):
-                self.captureThread = VideoCaptureThread(
-                    cameraIndex=cameraIndex,  # 直接传入URL
+            useGovernor = self.chkCaptureGovernor.isChecked()
+            dualStream = self.dual_stream()
+            if self.chkMultiProcess.isChecked():
+                # 检测器在工作进程中按配置重新创建
+                self.captureThread = ProcessCaptureThread(
+                    cameraIndex=cameraIndex,
                     width=self.currentWidth,
                     height=self.currentHeight,
                     fps=self.currentFps,
-                    detector=self.detector if self.useDetector else None
+                    detectorConfig=self.detector_config() if self.useDetector and self.detector else None,
+                    governor=useGovernor,
+                    dualConfig=dualStream.config() if dualStream is not None else None
                 )
             else:
+                # 手机摄像头 URL 直接作为 cameraIndex 传入
                 self.captureThread = VideoCaptureThread(
                     cameraIndex=cameraIndex,
                     width=self.currentWidth,
                     height=self.currentHeight,
                     fps=self.currentFps,
-                    detector=self.detector if self.useDetector else None
+                    detector=self.detector if self.useDetector else None,
+                    governor=CaptureGovernor(self.currentWidth, self.currentHeight, self.currentFps,
+                                             fps_only=self.regions_need_fixed_resolution())
+                    if useGovernor else None,
+                    dualStream=dualStream
                 )
 
             if isinstance(cameraIndex, str) and cameraIndex.startswith("http"):
                 self.logViewer.append(f"[INFO] 正在连接手机摄像头: {cameraIndex}")
             else:
                 self.logViewer.append(f"[INFO] 正在启动本地摄像头: {cameraIndex}")
-            self.captureThread.frameCaptured.connect(self.update_frame)
+            if dualStream is not None:
+                origin = (f"子码流 {dualStream.sub_source}" if dualStream.sub_source
+                          else f"主码流缩小至宽 {dualStream.width}")
+                self.logViewer.append(f"[INFO] 双码流已开启，分析流: {origin}，"
+                                      f"用于 {', '.join(sorted(dualStream.consumers)) or '-'}")
+            self.motionGate.reset()
+            self.tracker.reset()
+            self.counter.reset()
+            self.sequenceMonitor.reset()
+            self.captureThread.frameCaptured.connect(self.on_capture_frame)
             self.captureThread.cameraError.connect(self.on_camera_error)
+            self.captureThread.streamStatus.connect(self.on_stream_status)
+            self.captureThread.formatNegotiated.connect(self.on_format_negotiated)
+            self.captureFormat = None
             self.captureThread.start()
             self.logViewer.append("[INFO] 成功启动摄像头采集线程.")
         except Exception as e:
@@ -538,6 +1406,7 @@ class MainWindow(QMainWindow):
         if self.captureThread:
             self.captureThread.stop()
             self.captureThread = None
+            self.captureFormat = None
             self.videoLabel.clear()
             self.videoLabel.setText("视频显示区")
             self.logViewer.append("[INFO] 摄像头已停止.")
@@ -547,10 +1416,52 @@ class MainWindow(QMainWindow):
         self.logViewer.append(f"[ERROR] 摄像头错误：{errMsg}")
         self.stop_camera()
 
-    def update_frame(self, frame):
+    def on_capture_frame(self, env):
+        """ 接收采集线程的帧信封，处理完成后通知线程以统计队列深度 """
+        thread = self.sender()
+        try:
+            if env.emit_ts is not None:
+                env.mark("queue", time.monotonic() - env.emit_ts)
+            self.sequenceMonitor.observe(env)
+            self.update_frame(env)
+        finally:
+            # 帧来自帧缓冲池，录像/转发需要保留时已各自 retain，这里归还界面持有的引用
+            env.release()
+            if thread is not None:
+                thread.frame_consumed()
+
+    def on_format_negotiated(self, width, height, fps):
+        """ 采集线程报告摄像头实际生效的分辨率/帧率(打开时、负载调节换档时) """
+        first = self.captureFormat is None
+        self.captureFormat = (width, height, fps)
+        if first and (width, height) != (self.currentWidth, self.currentHeight):
+            self.logViewer.append(
+                f"[WARN] 摄像头不支持 {self.currentWidth}x{self.currentHeight}，"
+                f"实际采集 {width}x{height}@{fps:g}"
+            )
+        else:
+            self.logViewer.append(f"[INFO] 实际采集格式: {width}x{height}@{fps:g}")
+
+    def record_format(self):
+        """ 新录像分段使用的 (宽, 高, 帧率)：优先使用摄像头实际生效的格式 """
+        if self.captureThread is not None and self.captureFormat is not None:
+            w, h, fps = self.captureFormat
+            return w, h, fps if fps > 0 else self.currentFps
+        return self.currentWidth, self.currentHeight, self.currentFps
+
+    def on_stream_status(self, state):
+        """ 网络视频流状态变化 """
+        if state == "streaming":
+            self.logViewer.append("[INFO] 网络视频流已连接")
+        elif state == "reconnecting":
+            self.logViewer.append("[WARN] 网络视频流中断，正在自动重连...")
+
+    def update_frame(self, env):
         """
-        从采集线程接收图像帧，用于显示 + 录像
+        显示 + 录像一个帧信封(来自采集线程或本地回放)。
+        录像按信封的采集时刻对齐到恒定帧率时间轴，上屏后记录采集到显示的总延迟
         """
+        frame, source = env.frame, env.source
         # 定时存储判断
         if self.isRecording and frame is not None:
             now = time.time()
@@ -559,27 +1470,82 @@ class MainWindow(QMainWindow):
                 self.start_new_save_file()
                 self.lastRecordTime = now
 
+            # ffmpeg 进程异常退出(如磁盘写满)时先腾出空间再换新分段，保证录像不中断
+            if (self.recordOut is not None and not self.recordOut.isOpened()
+                    and now - self.lastWriterRestart > 5.0):
+                self.lastWriterRestart = now
+                self.logViewer.append("[ERROR] 录像写入器已停止，尝试清理空间并新建分段")
+                self.start_new_save_file()
+
             if self.recordOut is not None:
                 try:
-                    self.recordOut.write(frame)
+                    recordStart = time.perf_counter()
+                    written = self.recordOut.write(frame, timestamp=env.capture_ts)
+                    if written and self.recordSidecar is not None:
+                        # 按录像中的帧号记录；补帧没有单独记录，回放时沿用前一条
+                        self.recordSidecar.write(self.recordOut.frames - 1, env.overlay, env.inferred)
+                    env.mark("record", time.perf_counter() - recordStart)
+                    REGISTRY.set_gauge("encoder_backlog", getattr(self.recordOut, "backlog", 0), source)
+                    REGISTRY.set_gauge("encoder_dropped", getattr(self.recordOut, "dropped", 0), source)
+                    REGISTRY.set_gauge("record_duplicated_frames", self.recordOut.duplicated, source)
+                    REGISTRY.set_gauge("record_skipped_frames", self.recordOut.skipped, source)
                 except Exception as e:
                     self.logViewer.append(f"[ERROR] 保存视频帧异常: {e}")
 
+        # 转发给网络观看者(只保存引用，编码在转发服务线程中进行)
+        if self.restreamServer is not None and frame is not None:
+            if env.overlay is not None:
+                # 录制原始画面时帧上没有标注，在帧池副本上叠加后再转发，录像仍保存原始帧
+                annotated = FRAME_POOL.acquire(frame.shape, frame.dtype)
+                try:
+                    np.copyto(annotated, frame)
+                    names = self.overlay_names(source)
+                    dets = select_classes(env.overlay, class_ids(names, self.overlayClasses))
+                    draw_detections(annotated, dets, names, copy=False)
+                    if env.overlay.ids is not None and len(self.counter) > 0:
+                        self.counter.draw(annotated)
+                    self.restreamServer.publish(source, annotated)
+                finally:
+                    FRAME_POOL.release(annotated)
+            else:
+                self.restreamServer.publish(source, frame)
+
         # 显示到GUI
         if frame is not None:
-            rgbImage = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgbImage.shape
-            bytesPerLine = ch * w
-            convertToQtFormat = QImage(rgbImage.data, w, h, bytesPerLine, QImage.Format_RGB888)
-            
-            # 使用KeepAspectRatio使视频保持比例但尽可能填满区域
-            p = convertToQtFormat.scaled(
-                self.videoLabel.width(),
-                self.videoLabel.height(),
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
-            self.videoLabel.setPixmap(QPixmap.fromImage(p))
+            renderStart = time.perf_counter()
+            h, w = frame.shape[:2]
+            # 先等比缩放到显示区域大小(写入帧池缓冲区)，之后的绘制与格式转换都只处理小图；
+            # 双码流模式下预览由分析流缩放，不再读取全分辨率画面
+            preview = env.analysis.get("preview") if env.analysis is not None else None
+            if preview is None:
+                preview = frame
+            display, scale = scale_to_fit(preview, self.videoLabel.width(), self.videoLabel.height())
+            scale *= preview.shape[1] / w  # 统一为显示图相对主码流的比例，区域/检测框均为主码流坐标
+            try:
+                # 检测区域只画在显示图上，不影响录像
+                if self.roiRegions or self.roiEditor.mode:
+                    draw_regions(display, self.roiRegions, pending=self.roiEditor.pending_points(),
+                                 scale=scale)
+                # 帧上未绘制标注(录制原始画面)时，检测结果叠加在缩放后的显示图上
+                if env.overlay is not None and self.chkShowOverlay.isChecked():
+                    names = self.overlay_names(source)
+                    dets = select_classes(env.overlay, class_ids(names, self.overlayClasses))
+                    draw_detections(display, dets, names, copy=False, scale=scale)
+                    if env.overlay.ids is not None and len(self.counter) > 0:
+                        self.counter.draw(display, scale)
+                dh, dw = display.shape[:2]
+                if QIMAGE_BGR888 is not None:
+                    image = QImage(display.data, dw, dh, display.strides[0], QIMAGE_BGR888)
+                else:
+                    cv2.cvtColor(display, cv2.COLOR_BGR2RGB, dst=display)
+                    image = QImage(display.data, dw, dh, display.strides[0], QImage.Format_RGB888)
+                # fromImage 会复制像素，之后缓冲区即可归还
+                self.videoLabel.setPixmap(QPixmap.fromImage(image))
+            finally:
+                FRAME_POOL.release(display)
+            self.roiEditor.set_display_geometry(w, h, dw, dh)
+            env.mark("render", time.perf_counter() - renderStart)
+            env.mark("glass_to_glass", env.age())
 
     def start_recording(self):
         """ 开始定时存储 """
@@ -627,25 +1593,61 @@ class MainWindow(QMainWindow):
         new_file_path = f"{base_name}_part{self.recordSegmentCounter}{ext}"
         self.recordSegmentCounter += 1
         
-        safe_release(self.recordOut)
+        # 旧分段在后台收尾，避免 ffmpeg 封装文件时卡住界面
+        release_async(self.recordOut)
+        self.recordOut = None
+        self.close_record_sidecar()
+        if self.recordPath is not None:
+            self.storageManager.segment_closed(self.recordPath)
+            self.recordPath = None
+
+        # 预检剩余空间，不足时由存储管理线程在后台删除最旧的录像；按约0.2比特/像素估算码率
+        recWidth, recHeight, recFps = self.record_format()
+        fallbackBps = recWidth * recHeight * recFps * 0.2 / 8
+        expected = self.storageManager.estimate_segment_bytes(self.timerInterval * 60, fallbackBps)
+        if not self.storageManager.preflight(os.path.dirname(os.path.abspath(new_file_path)), expected):
+            self.logViewer.append(
+                f"[WARN] 磁盘剩余空间不足(预计需要 {expected / GB:.2f}GB)，正在后台清理最旧的录像，继续录制"
+            )
 
         try:
-            self.recordOut = cv2.VideoWriter(
+            self.recordOut = create_video_writer(
                 new_file_path,
-                self.recordFourcc,
-                float(self.currentFps),
-                (self.currentWidth, self.currentHeight)
+                float(recFps),
+                (recWidth, recHeight),
+                fourcc=self.recordFourcc,
+                **self.encoder_options()
             )
-            self.logViewer.append(f"[INFO] 新建视频存储文件: {new_file_path}")
+            self.recordPath = new_file_path
+            self.storageManager.segment_opened(self.cameraComboBox.currentData(), new_file_path)
+            backendName = "ffmpeg" if isinstance(self.recordOut, FfmpegWriter) else "OpenCV"
+            self.logViewer.append(f"[INFO] 新建视频存储文件({backendName}): {new_file_path}")
         except Exception as e:
             self.logViewer.append(f"[ERROR] 创建VideoWriter失败: {e}")
+            return
+
+        if self.chkRecordRaw.isChecked():
+            try:
+                self.recordSidecar = SidecarWriter(new_file_path, names=self.overlay_names(),
+                                                   fps=recFps, size=(recWidth, recHeight))
+            except OSError as e:
+                self.logViewer.append(f"[ERROR] 创建检测旁路文件失败: {e}")
+
+    def close_record_sidecar(self):
+        if self.recordSidecar is not None:
+            self.recordSidecar.close()
+            self.recordSidecar = None
 
     def stop_recording(self):
         """ 停止定时存储 """
         if self.isRecording:
             self.isRecording = False
-            safe_release(self.recordOut)
+            release_async(self.recordOut)
             self.recordOut = None
+            self.close_record_sidecar()
+            if self.recordPath is not None:
+                self.storageManager.segment_closed(self.recordPath)
+                self.recordPath = None
             self.baseFilePath = None  # 重置基本文件路径
             self.logViewer.append("[INFO] 停止存储视频。")
 
@@ -664,8 +1666,23 @@ class MainWindow(QMainWindow):
         if not outputFilePath:
             return
 
+        options = self.encoder_options()
+        if options["backend"] != BACKEND_OPENCV and find_ffmpeg():
+            # 解码与编码都交给 ffmpeg 子进程完成
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                ok, err = transcode_file(filePath, outputFilePath, options["codec"], options["preset"],
+                                         options["crf"], options["threads"])
+            finally:
+                QApplication.restoreOverrideCursor()
+            if ok:
+                self.logViewer.append(f"[INFO] 文件转换成功(ffmpeg): {outputFilePath}")
+                QMessageBox.information(self, "成功", f"文件转换成功: {outputFilePath}")
+                return
+            self.logViewer.append(f"[WARN] ffmpeg 转换失败，改用OpenCV: {err}")
+
         try:
-            # 使用 ffmpeg 或 OpenCV 转换视频格式
+            # 使用 OpenCV 转换视频格式
             cap = cv2.VideoCapture(filePath)
             fourcc = cv2.VideoWriter_fourcc(*'XVID') if targetFormat == "avi" else cv2.VideoWriter_fourcc(*'mp4v')
             fps = cap.get(cv2.CAP_PROP_FPS)
@@ -689,6 +1706,95 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "错误", f"文件转换失败: {e}")
 
 
+    # -------------------- 片段导出 --------------------
+    def playback_seconds(self, frameIndex=None):
+        """ 回放帧号 -> 秒数，默认取进度条当前位置 """
+        index = self.playSlider.value() if frameIndex is None else frameIndex
+        return index / self.videoPlayer.fps if self.videoPlayer.fps else 0.0
+
+    def update_clip_label(self):
+        def fmt(point):
+            if point is None:
+                return "-"
+            path, sec = point
+            return f"{os.path.basename(path)} {int(sec // 60):02d}:{sec % 60:05.2f}"
+        self.lblClipRange.setText(f"片段: {fmt(self.clipIn)} → {fmt(self.clipOut)}")
+
+    def mark_clip_in(self):
+        if self.videoPlayer is None:
+            QMessageBox.warning(self, "警告", "请先打开本地视频！")
+            return
+        self.clipIn = (self.videoPlayer.filePath, self.playback_seconds())
+        self.update_clip_label()
+
+    def mark_clip_out(self):
+        if self.videoPlayer is None:
+            QMessageBox.warning(self, "警告", "请先打开本地视频！")
+            return
+        self.clipOut = (self.videoPlayer.filePath, self.playback_seconds())
+        self.update_clip_label()
+
+    def clip_from_detection(self, margin=3.0):
+        """ 以当前位置之后的第一段检测命中(来自回放检测缓存)设定片段，前后各留 margin 秒 """
+        if self.videoPlayer is None:
+            QMessageBox.warning(self, "警告", "请先打开本地视频！")
+            return
+        cache = self.playbackCache
+        ranges = cache.hit_ranges(max_gap=int(self.videoPlayer.fps * 2)) if cache is not None else []
+        current = self.playSlider.value()
+        hit = next((r for r in ranges if r[1] >= current), None)
+        if hit is None:
+            QMessageBox.information(self, "提示", "当前位置之后没有已检测到目标的画面，请先开启检测回放该视频。")
+            return
+        path = self.videoPlayer.filePath
+        duration = self.playSlider.maximum() / self.videoPlayer.fps if self.videoPlayer.fps else 0.0
+        self.clipIn = (path, max(0.0, self.playback_seconds(hit[0]) - margin))
+        self.clipOut = (path, min(duration, self.playback_seconds(hit[1]) + margin))
+        self.update_clip_label()
+        self.logViewer.append(f"[INFO] 已按检测命中设定片段: 第 {hit[0]}~{hit[1]} 帧")
+
+    def export_clip(self):
+        """ 在后台导出片段：关键帧对齐的流复制，只重新编码首尾不完整的GOP """
+        if self.clipExportThread is not None:
+            QMessageBox.warning(self, "警告", "已有片段正在导出！")
+            return
+        if self.clipIn is None or self.clipOut is None:
+            QMessageBox.warning(self, "警告", "请先设置片段起点和终点！")
+            return
+        src, tIn = self.clipIn
+        outPath, tOut = self.clipOut
+        if outPath == src and tOut <= tIn:
+            QMessageBox.warning(self, "警告", "片段终点必须晚于起点！")
+            return
+
+        base, ext = os.path.splitext(src)
+        dst, _ = QFileDialog.getSaveFileName(
+            self, "导出片段", f"{base}_clip_{int(tIn)}s{ext}", f"视频文件 (*{ext})"
+        )
+        if not dst:
+            return
+
+        options = self.encoder_options()
+        self.clipExportThread = ClipExportThread(src, tIn, tOut, dst, out_path=outPath,
+                                                 preset=options["preset"], crf=options["crf"])
+        self.clipExportThread.progress.connect(
+            lambda p: self.lblClipRange.setText(f"片段导出中... {p}%")
+        )
+        self.clipExportThread.exportFinished.connect(lambda ok, msg: self.on_clip_exported(ok, msg, dst))
+        self.clipExportThread.start()
+        self.btnExportClip.setEnabled(False)
+        self.logViewer.append(f"[INFO] 开始导出片段: {dst}")
+
+    def on_clip_exported(self, ok, message, dst):
+        self.clipExportThread.wait()
+        self.clipExportThread = None
+        self.btnExportClip.setEnabled(True)
+        self.update_clip_label()
+        if ok:
+            self.logViewer.append(f"[INFO] 片段导出成功({message}): {dst}")
+        else:
+            self.logViewer.append(f"[ERROR] 片段导出失败: {message}")
+
     # -------------------- 参数变更/格式处理 --------------------
     def on_resolution_change(self):
         res_name = self.resolutionComboBox.currentText()
@@ -725,16 +1831,20 @@ class MainWindow(QMainWindow):
         )
         if filePath:
             self.stop_video()
+            self.tracker.reset()
+            self.counter.reset()
             try:
                 self.videoPlayer = VideoPlayer(
                     filePath=filePath,
                     mainWindow=self,  # 传给VideoPlayer，用于回调更新UI
-                    fps=self.currentFps
+                    fps=self.currentFps,
+                    speed=self.speedComboBox.currentData()
                 )
                 if not self.videoPlayer.open():
                     QMessageBox.critical(self, "错误", "无法打开该视频文件")
                     self.videoPlayer = None
                     return
+                self.open_playback_overlay(filePath)
                 # 设置进度条
                 total_frames = self.videoPlayer.get_total_frames()
                 self.playSlider.setEnabled(True)
@@ -771,6 +1881,8 @@ class MainWindow(QMainWindow):
         """ 停止视频 """
         self.isPlaying = False
         self.isPaused = False
+        self.close_playback_cache()
+        self.playbackOverlay = None
         if self.videoPlayer:
             self.videoPlayer.stop()
             self.videoPlayer = None
@@ -786,8 +1898,74 @@ class MainWindow(QMainWindow):
     def update_playback_position(self, pos):
         self.playSlider.setValue(pos)
 
+    def on_playback_speed_change(self):
+        speed = self.speedComboBox.currentData()
+        if self.videoPlayer is not None:
+            self.videoPlayer.set_speed(speed)
+        self.logViewer.append(f"[INFO] 回放倍速: {speed:g}×")
+
+    def on_seek(self):
+        """ 拖动进度条后跳转 """
+        if self.videoPlayer is not None:
+            self.videoPlayer.seek(self.playSlider.value())
+            self.tracker.reset()
+
+    def detection_params(self):
+        """ 影响检测结果的参数，作为回放缓存键的一部分 """
+        d = self.detector
+        return {
+            "model": d.model_path,
+            "conf": self.confThreshold,
+            "classes": self.detectionClasses,
+            "input_size": "auto" if d.latency_controller is not None else d.input_size,
+            "rois": [r.to_dict() for r in d.rois],
+            "tiled": [d.tile_size, d.max_tiles] if d.tiled else False,
+            # 运动门控跳过的帧记录的是沿用结果，门控设置不同时缓存内容也不同
+            "motion_gate": ([d.motion_gate.area_threshold, d.motion_gate.refresh_interval]
+                            if d.motion_gate is not None else False),
+        }
+
+    def playback_cache(self):
+        """ 返回当前回放文件的检测缓存，检测参数变化时切换到对应的缓存 """
+        if not self.chkDetectionCache.isChecked() or self.videoPlayer is None:
+            return None
+        params = self.detection_params()
+        if self.playbackCache is None or self.playbackCache.params != params:
+            self.close_playback_cache()
+            try:
+                self.playbackCache = self.detectionCache.open(self.videoPlayer.filePath, params)
+                if len(self.playbackCache):
+                    self.logViewer.append(f"[INFO] 已加载检测缓存: {len(self.playbackCache)} 帧")
+            except OSError as e:
+                self.logViewer.append(f"[ERROR] 打开检测缓存失败: {e}")
+                self.playbackCache = None
+        return self.playbackCache
+
+    def open_playback_overlay(self, filePath):
+        """ 录像带有检测旁路文件(录制原始画面)时加载，回放时按帧号叠加，不再推理 """
+        self.playbackOverlay = None
+        path = sidecar_path(filePath)
+        if not os.path.exists(path):
+            return
+        overlay = SidecarReader(path)
+        if len(overlay):
+            self.playbackOverlay = overlay
+            self.logViewer.append(f"[INFO] 已加载检测旁路文件: {len(overlay)} 帧，回放时叠加显示")
+
+    def close_playback_cache(self):
+        if self.playbackCache is not None:
+            self.detectionCache.close(self.playbackCache)
+            self.playbackCache = None
+
     # 在回放时，接收图像并显示
-    def update_playback_frame(self, frame):
+    def update_playback_frame(self, env):
+        """ 回放帧：信封序号为帧号，用于检测结果缓存与旁路文件查询 """
+        frame, frameIndex = env.frame, env.seq
+        if self.playbackOverlay is not None and self.chkShowOverlay.isChecked():
+            # 原始画面录像：叠加录制时的检测结果，不推理
+            env.overlay = self.playbackOverlay.get(frameIndex)
+            self.update_frame(env)
+            return
         if self.useDetector and self.detector is not None:
             try:
                 # 添加类型检查
@@ -796,18 +1974,32 @@ class MainWindow(QMainWindow):
                 if frame is None or not isinstance(frame, np.ndarray):
                     self.logViewer.append(f"[ERROR] 无效的帧格式")
                     return
-                    
-                # 使用保存的检测设置
-                frame = self.detector.detect_and_plot(
-                    frame, 
-                    conf_thres=self.confThreshold, 
-                    classes=self.detectionClasses
-                )
+
+                fastForward = self.videoPlayer is not None and self.videoPlayer.speed > 1.0
+                cache = self.playback_cache() if frameIndex is not None else None
+                cached = cache.get(frameIndex) if cache is not None else None
+                if cached is not None:
+                    # 命中缓存：直接用缓存的检测框标注，不推理
+                    env.frame = self.detector.replay(frame, cached[0], exact=cached[1])
+                    env.detections, env.inferred = cached
+                elif fastForward and not self.chkDetectFastForward.isChecked():
+                    pass  # 快进浏览时不检测
+                else:
+                    # 使用保存的检测设置；快进时相邻显示帧相隔较远，每个显示帧都检测
+                    self.detector.process(
+                        env,
+                        conf_thres=self.confThreshold,
+                        classes=self.detectionClasses,
+                        force=fastForward
+                    )
+                    if cache is not None:
+                        # 跳过的帧也记录沿用的结果，回放时同样命中
+                        cache.put(frameIndex, env.detections, env.inferred)
             except Exception as e:
                 self.logViewer.append(f"[ERROR] 离线检测异常: {e}")
         
         # 添加此行将帧显示到界面上
-        self.update_frame(frame)
+        self.update_frame(env)
 
     # -------------------- YOLO检测开关 --------------------
     def toggle_detection(self):
@@ -851,9 +2043,23 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         if self.captureThread:
             self.captureThread.stop()
+        if self.clipExportThread is not None:
+            self.clipExportThread.cancel()
+            self.clipExportThread.wait()
+        self.storageManager.stop()
+        if self.metricsFileExporter is not None:
+            self.metricsFileExporter.stop()
+        if self.metricsHttpServer is not None:
+            self.metricsHttpServer.stop()
+        if self.restreamServer is not None:
+            self.restreamServer.stop()
         safe_release(self.recordOut)
+        self.close_record_sidecar()
         if self.videoPlayer:
             self.videoPlayer.stop()
+        self.close_playback_cache()
+        self.logViewer.close_handler()
+        shutdown_logging()
         event.accept()
 
 # if __name__ == "__main__":
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 流水线运行指标：采集/推理/渲染/录像各阶段的滚动延迟直方图、实际FPS、
+# 队列深度、丢帧数与编码积压，可导出为 Prometheus 文本格式
+# (定时写文件或本地HTTP端点)。
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("videoapp.metrics")
+
+# queue 为帧在界面线程排队的时间，glass_to_glass 为从采集到上屏的总延迟
+STAGES = ("capture", "inference", "queue", "render", "record", "glass_to_glass")
+
+# Prometheus 直方图桶上界(秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _label_value(value):
+    """ 转义 Prometheus 标签值中的反斜杠、双引号与换行(来源可能是URL) """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _group_by_name(samples):
+    """ {(名称, 来源): 值} -> [(名称, [(来源, 值)])]，按名称排序，每个指标的 HELP/TYPE 只写一次 """
+    grouped = {}
+    for (name, source), value in samples.items():
+        grouped.setdefault(name, []).append((source, value))
+    return [(name, sorted(grouped[name])) for name in sorted(grouped)]
+
+
+class RollingHistogram:
+    """
+    延迟直方图：累计桶计数用于导出，最近 window 个样本用于计算分位数
+    """
+    def __init__(self, window=512, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        data = sorted(self.recent)
+        idx = min(len(data) - 1, int(round(q * (len(data) - 1))))
+        return data[idx]
+
+
+class FpsMeter:
+    """ 统计最近 window 秒内的实际帧率 """
+    def __init__(self, window=2.0):
+        self.window = window
+        self.stamps = deque()
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.stamps.append(now)
+        while self.stamps and now - self.stamps[0] > self.window:
+            self.stamps.popleft()
+
+    def fps(self, now=None):
+        now = time.monotonic() if now is None else now
+        while self.stamps and now - self.stamps[0] > self.window:
+            self.stamps.popleft()
+        if len(self.stamps) < 2:
+            return 0.0
+        return (len(self.stamps) - 1) / max(self.stamps[-1] - self.stamps[0], 1e-6)
+
+
+class MetricsRegistry:
+    """
+    线程安全的指标注册表，各阶段按 (stage, source) 分别统计
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._fps = {}
+        self._gauges = {}
+        self._counters = {}
+
+    def observe(self, stage, seconds, source="default"):
+        """ 记录一次阶段耗时，同时计入该阶段帧率 """
+        key = (stage, str(source))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = RollingHistogram()
+                self._fps[key] = FpsMeter()
+            hist.observe(seconds)
+            self._fps[key].tick()
+
+    @contextmanager
+    def timed(self, stage, source="default"):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, source)
+
+    def set_gauge(self, name, value, source="default"):
+        with self._lock:
+            self._gauges[(name, str(source))] = value
+
+    def inc(self, name, amount=1, source="default"):
+        with self._lock:
+            key = (name, str(source))
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._fps.clear()
+            self._gauges.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """
+        返回当前指标的字典形式：
+        {"stages": {(stage, source): {...}}, "gauges": {...}, "counters": {...}}
+        """
+        with self._lock:
+            stages = {}
+            for key, hist in self._histograms.items():
+                stages[key] = {
+                    "fps": self._fps[key].fps(),
+                    "p50_ms": hist.percentile(0.5) * 1000.0,
+                    "p99_ms": hist.percentile(0.99) * 1000.0,
+                    "count": hist.count,
+                }
+            return {
+                "stages": stages,
+                "gauges": dict(self._gauges),
+                "counters": dict(self._counters),
+            }
+
+    def to_prometheus(self):
+        """ 生成 Prometheus 文本格式 """
+        lines = [
+            "# HELP pipeline_stage_latency_seconds Per-stage processing latency.",
+            "# TYPE pipeline_stage_latency_seconds histogram",
+        ]
+        with self._lock:
+            for (stage, source), hist in sorted(self._histograms.items()):
+                labels = f'stage="{_label_value(stage)}",source="{_label_value(source)}"'
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.bucket_counts):
+                    cumulative += n
+                    lines.append(f'pipeline_stage_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'pipeline_stage_latency_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"pipeline_stage_latency_seconds_sum{{{labels}}} {hist.total:.6f}")
+                lines.append(f"pipeline_stage_latency_seconds_count{{{labels}}} {hist.count}")
+
+            lines.append("# HELP pipeline_stage_fps Achieved frames per second per stage.")
+            lines.append("# TYPE pipeline_stage_fps gauge")
+            for (stage, source), meter in sorted(self._fps.items()):
+                lines.append(f'pipeline_stage_fps{{stage="{_label_value(stage)}",'
+                             f'source="{_label_value(source)}"}} {meter.fps():.3f}')
+
+            for name, samples in _group_by_name(self._gauges):
+                lines.append(f"# HELP pipeline_{name} Pipeline gauge {name}.")
+                lines.append(f"# TYPE pipeline_{name} gauge")
+                for source, value in samples:
+                    lines.append(f'pipeline_{name}{{source="{_label_value(source)}"}} {value}')
+            for name, samples in _group_by_name(self._counters):
+                lines.append(f"# HELP pipeline_{name}_total Pipeline counter {name}.")
+                lines.append(f"# TYPE pipeline_{name}_total counter")
+                for source, value in samples:
+                    lines.append(f'pipeline_{name}_total{{source="{_label_value(source)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+# 全局默认注册表
+REGISTRY = MetricsRegistry()
+
+
+class PrometheusFileExporter(threading.Thread):
+    """
+    后台线程，定时把指标写入 Prometheus 文本文件(供 node_exporter textfile 收集器读取)
+    """
+    def __init__(self, path, registry=REGISTRY, interval=5.0):
+        super().__init__(daemon=True)
+        self.path = path
+        self.registry = registry
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def write_once(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.registry.to_prometheus())
+        os.replace(tmp_path, self.path)  # 原子替换，读取方不会读到半个文件
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.write_once()
+            except OSError as e:
+                logger.error(f"写入指标文件失败: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class MetricsHttpServer:
+    """
+    本地HTTP端点，GET /metrics 返回 Prometheus 文本格式
+    """
+    def __init__(self, port=9108, host="127.0.0.1", registry=REGISTRY):
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry_ref.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不输出每次请求的访问日志
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 本地 MJPEG/HTTP 转发服务：把每路流水线标注后的画面以 MJPEG 形式发布给多个观看者。
+# 每帧只做一次JPEG编码后分发给所有客户端；慢客户端直接跳到最新帧，不做缓冲。
+#
+# 访问地址：
+#   http://<主机>:<端口>/                     所有可用视频流列表
+#   http://<主机>:<端口>/stream/<名称>.mjpg   MJPEG实时流
+#   http://<主机>:<端口>/snapshot/<名称>.jpg  当前画面快照
+
+import re
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from frame_pool import FRAME_POOL
+
+logger = logging.getLogger("videoapp.mjpeg")
+
+BOUNDARY = "frame"
+
+
+class FrameBroadcaster:
+    """
+    一路视频的发布者。publish() 只保存最新帧的引用，编码在独立线程中进行，
+    且只在有客户端观看时才编码；编码结果由所有客户端共享。
+    """
+    def __init__(self, name, quality=80, max_fps=15.0):
+        self.name = name
+        self.quality = quality
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.clients = 0
+        self.frames_encoded = 0
+
+        self._frame = None
+        self._frame_seq = 0
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._encode_loop, name=f"MJPEG-{name}", daemon=True)
+        self._thread.start()
+
+    def publish(self, frame):
+        """ 由流水线调用，开销只有一次引用赋值；池中的帧在被下一帧替换前一直由本对象持有 """
+        FRAME_POOL.retain(frame)
+        with self._cond:
+            old, self._frame = self._frame, frame
+            self._frame_seq += 1
+            self._cond.notify_all()
+        FRAME_POOL.release(old)
+
+    def _take_frame(self):
+        """ 在锁内取出当前帧并增加引用，编码期间该帧不会被归还复用 """
+        frame = self._frame
+        FRAME_POOL.retain(frame)
+        return frame, self._frame_seq
+
+    def _encode(self, frame):
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buf.tobytes() if ok else None
+
+    def _encode_loop(self):
+        last_encoded = 0
+        last_time = 0.0
+        while True:
+            with self._cond:
+                while self._running and (self.clients == 0 or self._frame_seq == last_encoded):
+                    self._cond.wait(1.0)
+                if not self._running:
+                    return
+
+            # 限制编码帧率，多余的帧直接跳过
+            wait = self.min_interval - (time.monotonic() - last_time)
+            if wait > 0:
+                time.sleep(wait)
+            with self._cond:
+                frame, seq = self._take_frame()
+            if frame is None:
+                continue  # 已停止
+            last_time = time.monotonic()
+
+            try:
+                jpeg = self._encode(frame)
+            finally:
+                FRAME_POOL.release(frame)
+            last_encoded = seq
+            if jpeg is None:
+                continue
+            self.frames_encoded += 1
+            with self._cond:
+                self._jpeg = jpeg
+                self._jpeg_seq = seq
+                self._cond.notify_all()
+
+    def wait_jpeg(self, last_seq, timeout=5.0):
+        """ 等待比 last_seq 更新的JPEG，返回 (seq, bytes)，超时返回 (last_seq, None) """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._running and self._jpeg_seq <= last_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return last_seq, None
+                self._cond.wait(remaining)
+            if self._jpeg_seq <= last_seq:
+                return last_seq, None
+            return self._jpeg_seq, self._jpeg
+
+    def snapshot(self):
+        """ 返回当前画面的JPEG；已有最新编码结果时直接复用 """
+        with self._cond:
+            if self._jpeg is not None and self._jpeg_seq == self._frame_seq:
+                return self._jpeg
+            frame, _ = self._take_frame()
+        if frame is None:
+            return None
+        try:
+            return self._encode(frame)
+        finally:
+            FRAME_POOL.release(frame)
+
+    @property
+    def running(self):
+        return self._running
+
+    def add_client(self):
+        with self._cond:
+            self.clients += 1
+            self._cond.notify_all()
+
+    def remove_client(self):
+        with self._cond:
+            self.clients = max(0, self.clients - 1)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            frame, self._frame = self._frame, None
+            self._cond.notify_all()
+        FRAME_POOL.release(frame)
+
+
+class MjpegServer:
+    """
+    多路 MJPEG 转发服务器，每路流水线对应一个 FrameBroadcaster
+    """
+    def __init__(self, port=8090, host="0.0.0.0", quality=80, max_fps=15.0):
+        self.port = port
+        self.host = host
+        self.quality = quality
+        self.max_fps = max_fps
+        self._broadcasters = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="MjpegServer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"MJPEG转发服务已启动，端口 {self.port}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self._lock:
+            for b in self._broadcasters.values():
+                b.stop()
+            self._broadcasters.clear()
+
+    def get_broadcaster(self, name):
+        """ 获取(不存在则创建)指定名称的发布者，名称只保留安全字符 """
+        name = re.sub(r"[^0-9A-Za-z_.-]+", "_", str(name)).strip("_") or "default"
+        with self._lock:
+            b = self._broadcasters.get(name)
+            if b is None:
+                b = self._broadcasters[name] = FrameBroadcaster(name, self.quality, self.max_fps)
+            return b
+
+    def publish(self, name, frame):
+        self.get_broadcaster(name).publish(frame)
+
+    def stream_names(self):
+        with self._lock:
+            return sorted(self._broadcasters)
+
+    def stats(self):
+        with self._lock:
+            return {name: {"clients": b.clients, "frames_encoded": b.frames_encoded}
+                    for name, b in self._broadcasters.items()}
+
+    def _lookup(self, name):
+        with self._lock:
+            return self._broadcasters.get(name)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                m = re.match(r"^/(stream|snapshot)/([0-9A-Za-z_.-]+?)\.(mjpg|jpg)$", path)
+                if path == "/":
+                    self._send_index()
+                elif m and m.group(1) == "stream" and m.group(3) == "mjpg":
+                    self._send_stream(m.group(2))
+                elif m and m.group(1) == "snapshot" and m.group(3) == "jpg":
+                    self._send_snapshot(m.group(2))
+                else:
+                    self.send_error(404)
+
+            def _send_index(self):
+                items = "".join(
+                    f'<li><a href="/stream/{n}.mjpg">{n}</a> (<a href="/snapshot/{n}.jpg">快照</a>)</li>'
+                    for n in server.stream_names()
+                )
+                body = f"<html><meta charset='utf-8'><body><h3>视频流</h3><ul>{items}</ul></body></html>"
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_snapshot(self, name):
+                b = server._lookup(name)
+                jpeg = b.snapshot() if b else None
+                if jpeg is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(jpeg)))
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                self.wfile.write(jpeg)
+
+            def _send_stream(self, name):
+                b = server._lookup(name)
+                if b is None:
+                    self.send_error(404)
+                    return
+                self.connection.settimeout(10.0)  # 长时间发不出去的客户端直接断开
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                b.add_client()
+                seq = 0
+                try:
+                    while True:
+                        seq, jpeg = b.wait_jpeg(seq)
+                        if jpeg is None:
+                            if not b.running:
+                                break
+                            continue
+                        # 每次都取最新一帧，慢客户端自然跳帧
+                        self.wfile.write(
+                            f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                            f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+                        )
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (OSError, ValueError):
+                    pass  # 客户端断开
+                finally:
+                    b.remove_client()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
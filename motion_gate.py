@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 运动门控：在缩小后的灰度图上做背景差分，画面静止时跳过YOLO推理，
+# 仅在变化面积超过阈值或到达定时刷新时才放行检测。
+
+import time
+import threading
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    廉价的运动预筛选器。update(frame) 返回 True 表示本帧需要执行推理。
+    """
+    def __init__(self, downscale_width=160, pixel_threshold=25, area_threshold=0.005,
+                 refresh_interval=5.0, learning_rate=0.05):
+        self.downscale_width = downscale_width    # 差分前缩放到的宽度
+        self.pixel_threshold = pixel_threshold    # 像素灰度变化超过该值视为变化
+        self.area_threshold = area_threshold      # 变化像素占比超过该值视为有运动
+        self.refresh_interval = refresh_interval  # 无运动时的强制刷新间隔(秒)
+        self.learning_rate = learning_rate        # 背景模型的更新速率
+        self._background = None
+        self._last_open = 0.0
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.is_open = True
+        self.motion_ratio = 0.0
+        self.checked = 0
+        self.gated = 0
+
+    def reset(self):
+        """ 清空背景模型与统计，例如切换摄像头后调用 """
+        with self._lock:
+            self._background = None
+            self._last_open = 0.0
+            self.is_open = True
+            self.motion_ratio = 0.0
+            self.checked = 0
+            self.gated = 0
+
+    def _preprocess(self, frame):
+        h, w = frame.shape[:2]
+        dw = min(self.downscale_width, w)
+        dh = max(1, int(h * dw / w))
+        small = cv2.resize(frame, (dw, dh), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def update(self, frame, now=None):
+        """
+        用新帧更新背景模型，返回是否放行推理
+        """
+        now = time.monotonic() if now is None else now
+        gray = self._preprocess(frame)
+
+        with self._lock:
+            self.checked += 1
+            if self._background is None or self._background.shape != gray.shape:
+                self._background = gray.astype(np.float32)
+                self.motion_ratio = 1.0
+            else:
+                diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+                self.motion_ratio = np.count_nonzero(diff > self.pixel_threshold) / float(diff.size)
+                cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+
+            refresh_due = now - self._last_open >= self.refresh_interval
+            self.is_open = self.motion_ratio >= self.area_threshold or refresh_due
+            if self.is_open:
+                self._last_open = now
+            else:
+                self.gated += 1
+            return self.is_open
+
+    @property
+    def skip_ratio(self):
+        """ 被门控拦截的帧占比 """
+        return self.gated / self.checked if self.checked else 0.0
+
+    def stats(self):
+        return {
+            "open": self.is_open,
+            "motion_ratio": self.motion_ratio,
+            "skip_ratio": self.skip_ratio,
+            "checked": self.checked,
+            "gated": self.gated,
+        }
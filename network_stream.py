@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 网络摄像头(IP摄像头/手机摄像头)的低延迟读取：独立读取线程只保留最新一帧，
+# 断线自动按退避间隔重连，并统计卡顿、码率与帧率。
+#
+# HTTP(MJPEG) 地址直接解析字节流，只解码缓冲区中最新的完整JPEG；
+# 其它地址(如 rtsp://) 使用 OpenCV FFMPEG 后端并尽量关闭内部缓冲。
+#
+# 本地自测：
+#   python network_stream.py --serve 8081                      # 启动合成画面的MJPEG替身服务器
+#   python network_stream.py http://127.0.0.1:8081/video       # 读取并打印统计信息
+
+import os
+import sys
+import time
+import random
+import socket
+import logging
+import threading
+import urllib.request
+from collections import deque
+
+import cv2
+import numpy as np
+
+from frame_pool import FRAME_POOL, pooled_read
+
+logger = logging.getLogger("videoapp.network")
+
+# 连接状态
+STATE_CONNECTING = "connecting"
+STATE_STREAMING = "streaming"
+STATE_RECONNECTING = "reconnecting"
+STATE_STOPPED = "stopped"
+
+# OpenCV FFMPEG 后端的低延迟选项(仅在用户未自行设置时生效)
+_FFMPEG_LOW_LATENCY = "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay"
+
+
+def is_network_source(source):
+    return isinstance(source, str) and "://" in source
+
+
+class NetworkStreamReader:
+    """
+    网络视频源读取器。start() 后在后台线程持续读取，
+    read() 返回比上次更新的最新一帧，不会积压旧帧。
+    帧可能来自帧缓冲池：read() 返回的帧归调用方所有，未被读走就被新帧替换的帧由读取器归还。
+    """
+    def __init__(self, url, stall_timeout=3.0, backoff_initial=0.5, backoff_max=10.0, open_timeout=5.0):
+        self.url = url
+        self.stall_timeout = stall_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.open_timeout = open_timeout
+
+        self.state = STATE_CONNECTING
+        self._frame = None
+        self._frame_ts = None
+        self.frame_ts = None  # 最近一次 read() 返回的帧的解码时刻(time.monotonic())
+        self._seq = 0
+        self._read_seq = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._resp = None
+
+        # 统计
+        self.reconnects = 0
+        self.stalls = 0
+        self.frames_decoded = 0
+        self.frames_skipped = 0  # MJPEG中未解码直接丢弃的旧帧
+        self.last_error = None
+        self._last_frame_time = 0.0
+        self._frame_times = deque(maxlen=60)
+        self._byte_log = deque(maxlen=4096)  # (时间, 字节数)，用于计算码率
+
+    # ---------------- 对外接口 ----------------
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"NetReader-{self.url}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        resp = self._resp
+        if resp is not None:
+            try:
+                resp.close()  # 打断阻塞中的读取
+            except Exception:
+                pass
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=self.open_timeout + 1)
+        self.state = STATE_STOPPED
+        with self._cond:
+            frame, self._frame = self._frame, None
+        FRAME_POOL.release(frame)
+
+    def read(self, timeout=1.0):
+        """
+        等待并返回 (ok, frame)。超时仍无新帧时返回 (False, None)，调用方可继续等待
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._running and self._seq == self._read_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False, None
+                self._cond.wait(remaining)
+            if self._seq == self._read_seq:
+                return False, None
+            self._read_seq = self._seq
+            frame, self._frame = self._frame, None
+            self.frame_ts = self._frame_ts
+            return True, frame
+
+    @property
+    def connected(self):
+        return self.state == STATE_STREAMING
+
+    def stats(self):
+        now = time.monotonic()
+        fps = 0.0
+        if len(self._frame_times) >= 2:
+            span = self._frame_times[-1] - self._frame_times[0]
+            fps = (len(self._frame_times) - 1) / span if span > 0 else 0.0
+        while self._byte_log and now - self._byte_log[0][0] > 5.0:
+            self._byte_log.popleft()
+        total_bytes = sum(n for _, n in self._byte_log)
+        return {
+            "state": self.state,
+            "fps": fps,
+            "bitrate_kbps": total_bytes * 8 / 5.0 / 1000.0 if self._byte_log else None,
+            "reconnects": self.reconnects,
+            "stalls": self.stalls,
+            "frames_decoded": self.frames_decoded,
+            "frames_skipped": self.frames_skipped,
+            "frame_age": now - self._last_frame_time if self._last_frame_time else None,
+            "last_error": self.last_error,
+        }
+
+    # ---------------- 内部实现 ----------------
+    def _publish(self, frame):
+        now = time.monotonic()
+        with self._cond:
+            old, self._frame = self._frame, frame
+            self._frame_ts = now
+            self._seq += 1
+            self._cond.notify_all()
+        FRAME_POOL.release(old)  # 未被读走的旧帧
+        self.frames_decoded += 1
+        self._last_frame_time = now
+        self._frame_times.append(now)
+        if self.state != STATE_STREAMING:
+            logger.info(f"网络视频流已连接: {self.url}")
+            self.state = STATE_STREAMING
+
+    def _run(self):
+        backoff = self.backoff_initial
+        while self._running:
+            got_frame = False
+            try:
+                if self.url.lower().startswith(("http://", "https://")):
+                    got_frame = self._run_mjpeg()
+                else:
+                    got_frame = self._run_opencv()
+            except Exception as e:
+                self.last_error = str(e)
+            if not self._running:
+                break
+
+            # 连接断开：按指数退避(带抖动)重连，曾成功出帧则退避重置
+            if got_frame:
+                backoff = self.backoff_initial
+            self.reconnects += 1
+            self.state = STATE_RECONNECTING
+            logger.warning(f"网络视频流中断({self.last_error})，{backoff:.1f}秒后重连: {self.url}")
+            end = time.monotonic() + backoff * random.uniform(0.8, 1.2)
+            while self._running and time.monotonic() < end:
+                time.sleep(0.05)
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def _run_mjpeg(self):
+        """ 解析 multipart MJPEG 字节流，只解码最新的完整JPEG """
+        got_frame = False
+        self._resp = urllib.request.urlopen(self.url, timeout=self.stall_timeout)
+        try:
+            buf = bytearray()
+            last_frame = time.monotonic()
+            while self._running:
+                try:
+                    chunk = self._resp.read1(65536)
+                except socket.timeout:
+                    self.stalls += 1
+                    self.last_error = "读取超时"
+                    return got_frame
+                if not chunk:
+                    self.last_error = "连接被关闭"
+                    return got_frame
+                self._byte_log.append((time.monotonic(), len(chunk)))
+                buf += chunk
+
+                jpeg, consumed, skipped = _extract_latest_jpeg(buf)
+                if consumed:
+                    del buf[:consumed]
+                self.frames_skipped += skipped
+                if jpeg is not None:
+                    frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                    if frame is not None:
+                        self._publish(frame)
+                        got_frame = True
+                        last_frame = time.monotonic()
+                elif time.monotonic() - last_frame > self.stall_timeout:
+                    # 有数据但一直没有完整帧，视为卡顿
+                    self.stalls += 1
+                    self.last_error = "长时间没有完整帧"
+                    return got_frame
+                if len(buf) > 16 * 1024 * 1024:
+                    buf.clear()  # 异常数据，防止无限增长
+            return got_frame
+        finally:
+            resp, self._resp = self._resp, None
+            resp.close()
+
+    def _run_opencv(self):
+        """ 其它协议交给 OpenCV FFMPEG 后端，缓冲设为1帧并持续读取 """
+        os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", _FFMPEG_LOW_LATENCY)
+        params = []
+        if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+            params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(self.open_timeout * 1000),
+                      cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(self.stall_timeout * 1000)]
+        cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG, params) if params else cv2.VideoCapture(self.url)
+        got_frame = False
+        try:
+            if not cap.isOpened():
+                self.last_error = "无法打开视频流"
+                return False
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            shape = None
+            while self._running:
+                ret, frame = pooled_read(cap, shape)
+                if not ret or frame is None:
+                    self.stalls += 1
+                    self.last_error = "读取失败或超时"
+                    return got_frame
+                shape = frame.shape
+                self._publish(frame)
+                got_frame = True
+            return got_frame
+        finally:
+            cap.release()
+
+
+def _extract_latest_jpeg(buf):
+    """
+    在缓冲区中查找完整的JPEG(SOI 0xFFD8 ... EOI 0xFFD9)。
+    返回 (最新的完整JPEG或None, 可丢弃的字节数, 被跳过的旧帧数)
+    """
+    latest = None
+    consumed = 0
+    count = 0
+    pos = 0
+    while True:
+        start = buf.find(b"\xff\xd8", pos)
+        if start < 0:
+            break
+        end = buf.find(b"\xff\xd9", start + 2)
+        if end < 0:
+            consumed = max(consumed, start)  # 保留未完成的帧
+            break
+        latest = (start, end + 2)
+        count += 1
+        pos = consumed = end + 2
+    if latest is None:
+        return None, consumed, 0
+    return bytes(buf[latest[0]:latest[1]]), consumed, count - 1
+
+
+def _serve_test_pattern(port, fps=25, width=640, height=480):
+    """ 合成画面的MJPEG替身服务器，用于在没有真实摄像头时测试读取器 """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            self.end_headers()
+            i = 0
+            try:
+                while True:
+                    frame = np.full((height, width, 3), 40, np.uint8)
+                    x = (i * 8) % (width - 60)
+                    cv2.rectangle(frame, (x, height // 2 - 30), (x + 60, height // 2 + 30), (0, 200, 0), -1)
+                    cv2.putText(frame, time.strftime("%H:%M:%S"), (10, 30),
+                                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                    ok, jpeg = cv2.imencode(".jpg", frame)
+                    self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                    self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                    self.wfile.write(jpeg.tobytes() + b"\r\n")
+                    i += 1
+                    time.sleep(1.0 / fps)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"MJPEG替身服务器: http://127.0.0.1:{port}/video")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if len(sys.argv) >= 3 and sys.argv[1] == "--serve":
+        _serve_test_pattern(int(sys.argv[2]))
+    elif len(sys.argv) >= 2:
+        reader = NetworkStreamReader(sys.argv[1]).start()
+        try:
+            while True:
+                reader.read(timeout=1.0)
+                time.sleep(1.0)
+                print(reader.stats())
+        except KeyboardInterrupt:
+            reader.stop()
+    else:
+        print("用法: python network_stream.py [--serve PORT | URL]")
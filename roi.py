@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 检测区域(ROI)：矩形/多边形区域的定义、按摄像头保存与加载，
+# 以及计算推理用的裁剪矩形、过滤区域外的检测框。
+
+import os
+import re
+import json
+import cv2
+import numpy as np
+
+ROI_CONFIG_DIR = "./config/roi"
+
+
+class RoiRegion:
+    """
+    一个检测区域，points 为原图坐标下的顶点列表。
+    kind 为 "rect" 时 points 为左上、右下两个点。
+    """
+    def __init__(self, kind, points):
+        self.kind = kind
+        if kind == "rect":
+            (x0, y0), (x1, y1) = points
+            points = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+        self.points = [(int(x), int(y)) for x, y in points]
+
+    def polygon(self):
+        return np.array(self.points, np.float32)
+
+    def bounding_rect(self):
+        pts = self.polygon()
+        x0, y0 = pts.min(axis=0)
+        x1, y1 = pts.max(axis=0)
+        return int(x0), int(y0), int(x1), int(y1)
+
+    def to_dict(self):
+        return {"kind": self.kind, "points": self.points}
+
+    @classmethod
+    def from_dict(cls, d):
+        region = cls("polygon", d["points"])
+        region.kind = d.get("kind", "polygon")
+        return region
+
+
+def points_in_polygon(points, polygon):
+    """
+    向量化的射线法判断点是否在多边形内
+    points: (N,2)  polygon: (M,2)  返回 (N,) bool
+    """
+    points = np.asarray(points, np.float32).reshape(-1, 2)
+    poly = np.asarray(polygon, np.float32).reshape(-1, 2)
+    if len(points) == 0 or len(poly) < 3:
+        return np.zeros(len(points), bool)
+    x = points[:, 0:1]
+    y = points[:, 1:2]
+    x0, y0 = poly[:, 0], poly[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    crosses = (y0 > y) != (y1 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_int = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    inside = crosses & (x < x_int)
+    return (np.count_nonzero(inside, axis=1) % 2) == 1
+
+
+def _merge_rects(rects):
+    """ 合并相互重叠的矩形，减少重复推理 """
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        while rects:
+            x0, y0, x1, y1 = rects.pop()
+            i = 0
+            while i < len(rects):
+                a0, b0, a1, b1 = rects[i]
+                if a0 < x1 and x0 < a1 and b0 < y1 and y0 < b1:
+                    x0, y0, x1, y1 = min(x0, a0), min(y0, b0), max(x1, a1), max(y1, b1)
+                    rects.pop(i)
+                    merged = True
+                else:
+                    i += 1
+            out.append((x0, y0, x1, y1))
+        rects = out
+    return rects
+
+
+def crop_rects(regions, frame_shape, padding=16):
+    """
+    计算所有区域外接矩形(加少量边距并合并重叠部分)，裁剪到画面范围内
+    """
+    h, w = frame_shape[:2]
+    rects = []
+    for region in regions:
+        x0, y0, x1, y1 = region.bounding_rect()
+        x0, y0 = max(0, x0 - padding), max(0, y0 - padding)
+        x1, y1 = min(w, x1 + padding), min(h, y1 + padding)
+        if x1 - x0 >= 8 and y1 - y0 >= 8:
+            rects.append((x0, y0, x1, y1))
+    return sorted(_merge_rects(rects))
+
+
+def filter_in_regions(dets, regions):
+    """ 仅保留中心点落在任一区域内的检测框 """
+    if len(dets) == 0 or not regions:
+        return dets
+    centers = dets.centers()
+    mask = np.zeros(len(dets), bool)
+    for region in regions:
+        mask |= points_in_polygon(centers, region.polygon())
+    return dets.select(mask)
+
+
+def draw_regions(frame, regions, color=(0, 200, 255), pending=None, scale=1.0):
+    """
+    在画面上绘制区域轮廓，pending 为正在绘制中的顶点；
+    scale 为画面相对原图的缩放比例(在缩放后的显示图上绘制时使用)
+    """
+    for region in regions:
+        pts = (np.array(region.points, np.float32) * scale).astype(np.int32).reshape(-1, 1, 2)
+        cv2.polylines(frame, [pts], True, color, 2)
+    if pending:
+        pts = (np.array(pending, np.float32) * scale).astype(np.int32).reshape(-1, 1, 2)
+        cv2.polylines(frame, [pts], False, (0, 0, 255), 1)
+    return frame
+
+
+def camera_key(camera):
+    """ 由摄像头编号或URL生成可作为文件名的键 """
+    return re.sub(r"[^0-9A-Za-z_.-]+", "_", str(camera)).strip("_") or "default"
+
+
+def load_regions(camera, directory=ROI_CONFIG_DIR):
+    path = os.path.join(directory, f"{camera_key(camera)}.json")
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [RoiRegion.from_dict(d) for d in json.load(f)]
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+def save_regions(camera, regions, directory=ROI_CONFIG_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{camera_key(camera)}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([r.to_dict() for r in regions], f, ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 在视频预览标签(videoLabel)上用鼠标绘制矩形/多边形检测区域。
+# 矩形/线段(计数线)：按下拖动后松开；多边形：左键逐点单击，双击或右键结束。
+
+from PyQt5.QtCore import QObject, QEvent, Qt, pyqtSignal
+from roi import RoiRegion
+
+
+class RoiEditor(QObject):
+    """
+    作为事件过滤器安装在 videoLabel 上，把标签坐标换算为原图坐标
+    """
+    regionAdded = pyqtSignal(object)  # 绘制完成的 RoiRegion
+
+    def __init__(self, label, parent=None):
+        super().__init__(parent)
+        self.label = label
+        self.mode = None      # None / "rect" / "line" / "polygon"
+        self.pending = []     # 正在绘制的顶点(原图坐标)
+        self.frameSize = None   # 原图尺寸 (w, h)
+        self.pixmapSize = None  # 显示尺寸 (w, h)
+        label.setMouseTracking(True)
+        label.installEventFilter(self)
+
+    def set_display_geometry(self, frame_w, frame_h, pix_w, pix_h):
+        """ 每次刷新画面时由主窗口调用，记录原图与显示图的尺寸 """
+        self.frameSize = (frame_w, frame_h)
+        self.pixmapSize = (pix_w, pix_h)
+
+    def start(self, mode):
+        self.mode = mode
+        self.pending = []
+        self.label.setCursor(Qt.CrossCursor)
+
+    def cancel(self):
+        self.mode = None
+        self.pending = []
+        self.label.unsetCursor()
+
+    def pending_points(self):
+        """ 返回用于预览的顶点列表 """
+        if self.mode == "rect" and len(self.pending) == 2:
+            return RoiRegion("rect", self.pending).points + [self.pending[0]]
+        return list(self.pending)
+
+    def label_to_frame(self, pos):
+        """ 标签坐标 -> 原图坐标，点在画面之外时返回 None """
+        if not self.frameSize or not self.pixmapSize:
+            return None
+        fw, fh = self.frameSize
+        pw, ph = self.pixmapSize
+        offx = (self.label.width() - pw) / 2.0
+        offy = (self.label.height() - ph) / 2.0
+        x = (pos.x() - offx) * fw / float(pw)
+        y = (pos.y() - offy) * fh / float(ph)
+        if x < 0 or y < 0 or x >= fw or y >= fh:
+            return None
+        return int(x), int(y)
+
+    def _finish(self, region):
+        self.cancel()
+        self.regionAdded.emit(region)
+
+    def eventFilter(self, obj, event):
+        if obj is not self.label or self.mode is None:
+            return False
+
+        etype = event.type()
+        if etype == QEvent.MouseButtonPress:
+            if event.button() == Qt.RightButton:
+                if self.mode == "polygon" and len(self.pending) >= 3:
+                    self._finish(RoiRegion("polygon", self.pending))
+                else:
+                    self.cancel()
+                return True
+            pt = self.label_to_frame(event.pos())
+            if pt is None:
+                return True
+            if self.mode in ("rect", "line"):
+                self.pending = [pt, pt]
+            elif not self.pending or self.pending[-1] != pt:
+                self.pending.append(pt)
+            return True
+
+        if etype == QEvent.MouseMove and self.mode in ("rect", "line") and self.pending:
+            pt = self.label_to_frame(event.pos())
+            if pt is not None:
+                self.pending[1] = pt
+            return True
+
+        if etype == QEvent.MouseButtonRelease and self.mode == "rect" and self.pending:
+            (x0, y0), (x1, y1) = self.pending
+            if abs(x1 - x0) >= 8 and abs(y1 - y0) >= 8:
+                self._finish(RoiRegion("rect", [(min(x0, x1), min(y0, y1)), (max(x0, x1), max(y0, y1))]))
+            else:
+                self.pending = []
+            return True
+
+        if etype == QEvent.MouseButtonRelease and self.mode == "line" and self.pending:
+            (x0, y0), (x1, y1) = self.pending
+            if abs(x1 - x0) + abs(y1 - y0) >= 8:
+                self._finish(RoiRegion("line", self.pending))
+            else:
+                self.pending = []
+            return True
+
+        if etype == QEvent.MouseButtonDblClick and self.mode == "polygon":
+            if len(self.pending) >= 3:
+                self._finish(RoiRegion("polygon", self.pending))
+            return True
+
+        return False
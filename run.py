@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 #运行入口脚本，主要完成应用程序启动逻辑。
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from main_window import MainWindow
 
@@ -12,4 +13,5 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后多进程采集模式需要
     main()
\ No newline at end of file
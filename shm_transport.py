@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 共享内存帧传输：采集与推理在独立的工作进程中运行，
+# 帧写入 multiprocessing.shared_memory 中预先分配的环形槽位，
+# 进程间只通过队列传递很小的描述信息 (槽位号, 序号, 形状, 时间戳, 各阶段耗时, 检测结果)。
+# 多路摄像头时每路一个进程，可以用满所有CPU核心而不受GIL限制。
+
+import time
+import queue
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 工作进程发给界面进程的消息类型
+MSG_FRAME = "frame"
+MSG_ERROR = "error"
+MSG_STATUS = "status"
+MSG_LOG = "log"
+MSG_FORMAT = "format"      # 实际生效的采集格式 (宽, 高, 帧率)
+MSG_GOVERNOR = "governor"  # 采集负载调节器状态
+MSG_DUAL_STREAM = "dual_stream"  # 双码流分析流状态
+
+MAX_FRAME_BYTES = 1920 * 1080 * 3  # 默认槽位至少能容纳一帧1080P图像
+
+
+class SharedFrameRing:
+    """
+    共享内存中的 num_slots 个定长帧槽位。
+    创建方(界面进程)负责 unlink；工作进程按名称 attach。
+    """
+    def __init__(self, num_slots, slot_bytes, name=None):
+        self.num_slots = num_slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def view(self, slot, shape, dtype=np.uint8):
+        """ 返回指定槽位上的 ndarray 视图(不拷贝) """
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot, frame):
+        """ 把帧拷贝进槽位，返回其形状；帧过大时返回 None """
+        if frame.nbytes > self.slot_bytes:
+            return None
+        np.copyto(self.view(slot, frame.shape, frame.dtype), frame)
+        return frame.shape
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _build_detector(cfg):
+    """ 在工作进程中按配置创建检测器(模型只在子进程中加载) """
+    from detection import YoloDetector
+    from latency_controller import AdaptiveLatencyController
+    from motion_gate import MotionGate
+    from roi import RoiRegion
+
+    detector = YoloDetector(
+        model_path=cfg["model_path"],
+        latency_controller=AdaptiveLatencyController(budget_ms=cfg["budget_ms"]) if cfg.get("adaptive") else None,
+        motion_gate=MotionGate() if cfg.get("motion_gate") else None,
+    )
+    detector.tiled = cfg.get("tiled", False)
+    detector.max_tiles = cfg.get("max_tiles", detector.max_tiles)
+    detector.rois = [RoiRegion.from_dict(d) for d in cfg.get("rois", [])]
+    detector.annotate = cfg.get("annotate", True)
+    if cfg.get("tracking"):
+        from tracker import MultiObjectTracker
+        from counting import LineZoneCounter, counter_from_dict
+        detector.tracker = MultiObjectTracker()
+        detector.counter = LineZoneCounter(counter_from_dict(d) for d in cfg.get("counters", []))
+    return detector
+
+
+def capture_worker(source, width, height, fps, ring_name, num_slots, slot_bytes,
+                   desc_queue, free_queue, stop_event, detector_cfg=None, governor=False, dual_cfg=None):
+    """
+    工作进程入口：采集 -> (可选)检测 -> 写入共享内存槽位 -> 发送描述信息。
+    没有空闲槽位(界面进程处理不过来)时直接丢弃当前帧。
+    governor 为 True 时在进程内按负载调节采集格式，换档与每秒状态通过队列上报。
+    dual_cfg 为双码流配置时，推理与运动门控使用低分辨率分析流(共享内存中仍传主码流帧)。
+    """
+    import cv2
+    from network_stream import NetworkStreamReader, is_network_source
+    from capture_governor import CaptureGovernor, negotiate_format
+    from frame_pool import FRAME_POOL, pooled_read
+    from dual_stream import DualStream
+
+    ring = SharedFrameRing(num_slots, slot_bytes, name=ring_name)
+    cap = None
+    reader = None
+    dual = None
+    try:
+        detector = _build_detector(detector_cfg) if detector_cfg else None
+        # 分析流只服务于检测，不检测时不生成
+        dual = DualStream.from_config(dual_cfg).start() if dual_cfg and detector is not None else None
+        last_dual_report = 0.0
+
+        negotiated = None
+        if is_network_source(source):
+            reader = NetworkStreamReader(source).start()
+        else:
+            cap = cv2.VideoCapture(source)
+            if not cap.isOpened():
+                desc_queue.put((MSG_ERROR, f"无法打开摄像头(Index: {source})"))
+                return
+            negotiated = negotiate_format(cap, width, height, fps)
+            if negotiated[2] > 0:
+                fps = min(fps, negotiated[2])
+            negotiated = (negotiated[0], negotiated[1], round(float(fps), 2))
+            desc_queue.put((MSG_FORMAT, negotiated))
+        # 检测区域与计数线按原图像素坐标定义，设置了它们时只降帧率
+        fps_only = bool(detector_cfg and (detector_cfg.get("rois") or detector_cfg.get("counters")))
+        gov = CaptureGovernor(width, height, fps, fps_only=fps_only) if governor else None
+
+        seq = 0
+        dropped = 0
+        last_state = None
+        last_emit = 0.0
+        frame_shape = None
+        window_start = time.perf_counter()
+        window_busy = 0.0
+        window_frames = 0
+        window_dropped = dropped
+        while not stop_event.is_set():
+            t0 = time.perf_counter()
+            if gov is not None and t0 - window_start >= 1.0:
+                busy_ratio = window_busy / window_frames * fps if window_frames else 0.0
+                if gov.update(busy_ratio, 0, dropped - window_dropped):
+                    new_w, new_h, fps = gov.target
+                    if cap is not None:
+                        actual = negotiate_format(cap, new_w, new_h, fps)
+                        negotiated = (actual[0], actual[1], float(fps))
+                    elif negotiated is not None:
+                        negotiated = (negotiated[0], negotiated[1], float(fps))
+                    if negotiated is not None:
+                        desc_queue.put((MSG_FORMAT, negotiated))
+                desc_queue.put((MSG_GOVERNOR, gov.stats()))
+                window_start, window_busy, window_frames, window_dropped = t0, 0.0, 0, dropped
+            if reader is not None:
+                ret, frame = reader.read(timeout=0.5)
+                state = reader.state
+                if state != last_state:
+                    desc_queue.put((MSG_STATUS, state))
+                    last_state = state
+                if not ret:
+                    continue
+                if gov is not None and t0 - last_emit < 0.9 / fps:
+                    FRAME_POOL.release(frame)
+                    continue
+            else:
+                ret, frame = pooled_read(cap, frame_shape)
+                if not ret or frame is None:
+                    desc_queue.put((MSG_ERROR, "摄像头读取失败！"))
+                    break
+                frame_shape = frame.shape
+            capture_ts = reader.frame_ts if reader is not None else time.monotonic()
+            t1 = time.perf_counter()
+            # 丢弃的帧也占用序号，界面进程据序号断档统计丢帧
+            seq += 1
+
+            # 以实际收到的帧尺寸为准上报采集格式
+            h, w = frame.shape[:2]
+            if negotiated is None or negotiated[:2] != (w, h):
+                negotiated = (w, h, negotiated[2] if negotiated is not None else float(fps))
+                desc_queue.put((MSG_FORMAT, negotiated))
+
+            # 先申请槽位：界面进程处理不过来时直接丢帧，不浪费推理
+            try:
+                slot = free_queue.get_nowait()
+            except queue.Empty:
+                dropped += 1
+                FRAME_POOL.release(frame)
+                continue
+
+            dets = None
+            inferred = False
+            overlay = None
+            if detector is not None:
+                analysis = dual.analysis(frame) if dual is not None else None
+                try:
+                    frame = detector.detect_and_plot(
+                        frame,
+                        infer_frame=analysis.get("inference") if analysis is not None else None,
+                        motion_frame=analysis.get("motion") if analysis is not None else None,
+                    )
+                    dets, inferred = detector.last_detections, detector.inferred
+                    if not detector.annotate:
+                        overlay = detector.overlay_snapshot()
+                except Exception as e:
+                    desc_queue.put((MSG_LOG, f"YOLO检测过程中出错: {e}"))
+                finally:
+                    if analysis is not None:
+                        analysis.release()
+                if dual is not None and t1 - last_dual_report >= 1.0:
+                    desc_queue.put((MSG_DUAL_STREAM, dual.stats()))
+                    last_dual_report = t1
+            t2 = time.perf_counter()
+
+            shape = ring.write(slot, np.ascontiguousarray(frame))
+            FRAME_POOL.release(frame)
+            if shape is None:
+                free_queue.put(slot)
+                desc_queue.put((MSG_ERROR, f"帧尺寸 {frame.shape} 超出共享内存槽位大小"))
+                break
+            desc_queue.put((MSG_FRAME, (slot, seq, shape, capture_ts, t1 - t0,
+                                        t2 - t1 if detector is not None else None, dropped,
+                                        dets, inferred, overlay)))
+            last_emit = time.perf_counter()
+            window_busy += last_emit - t1
+            window_frames += 1
+
+            if reader is None:
+                time.sleep(max(0.0, 1 / (fps + 1e-6) - (last_emit - t0)))
+    except Exception as e:
+        desc_queue.put((MSG_ERROR, f"采集进程异常: {e}\n{traceback.format_exc()}"))
+    finally:
+        if reader is not None:
+            reader.stop()
+        if dual is not None:
+            dual.stop()
+        if cap is not None:
+            cap.release()
+        ring.close()
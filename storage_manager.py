@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 录像存储管理：按摄像头维护录像分段的增量索引(不反复扫描目录)，
+# 后台按容量/保存天数删除最旧的分段，新分段开始前预检剩余空间，
+# 并统计写入吞吐。录像过程中磁盘不足时优先删除旧录像，保证录像不中断。
+# 索引只包含本程序录制的分段，录像目录中的其他文件(转码结果、导出片段、用户拷入的文件)从不删除；
+# 所有删除都在后台线程中进行。
+
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+
+from roi import camera_key
+from metrics import REGISTRY
+from detection_sidecar import sidecar_path
+
+logger = logging.getLogger("videoapp.storage")
+
+DEFAULT_VIDEO_DIR = "./videos"
+INDEX_FILE_NAME = "storage_index.json"
+
+GB = 1024 ** 3
+
+
+class StorageManager:
+    """
+    录像分段索引与保留策略。
+    索引项: {"path", "camera", "created", "size", "active"}；
+    只有正在写入的分段需要定时 stat，已关闭分段的大小在关闭后记录一次
+    """
+    def __init__(self, root=DEFAULT_VIDEO_DIR, max_gb=0.0, max_age_days=0.0, min_free_gb=2.0,
+                 sample_interval=2.0, retention_interval=30.0):
+        self.root = root
+        self.max_gb = max_gb              # 录像总容量上限，0 表示不限
+        self.max_age_days = max_age_days  # 录像保存天数，0 表示不限
+        self.min_free_gb = min_free_gb    # 磁盘至少保留的剩余空间
+        self.sample_interval = sample_interval
+        self.retention_interval = retention_interval
+        self.index_path = os.path.join(root, INDEX_FILE_NAME)
+
+        self.deleted_segments = 0
+        self.deleted_bytes = 0
+        self.write_bps = 0.0
+        self._segments = {}  # 绝对路径 -> 索引项
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()  # 预检发现空间不足时唤醒后台线程立即清理
+        self._cleanup_request = None    # (目录, 需要释放的字节数)
+        self._thread = None
+        self._last_sample = None
+        self._load_index()
+
+    # ---------------- 索引 ----------------
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for item in json.load(f):
+                        item["active"] = False  # 上次运行遗留的分段都视为已关闭
+                        self._segments[item["path"]] = item
+                return
+            except (OSError, ValueError, KeyError) as e:
+                # 不扫描录像目录补建索引：目录中可能有并非本程序录制的文件，不能纳入删除范围
+                logger.warning(f"读取存储索引失败，从空索引开始: {e}")
+
+    def _save_index(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            items = [dict(item) for item in self._segments.values()]
+            self._dirty = False
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(items, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"保存存储索引失败: {e}")
+
+    def segment_opened(self, camera, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._segments[path] = {"path": path, "camera": camera_key(camera), "created": time.time(),
+                                    "size": 0, "active": True}
+            self._dirty = True
+
+    def segment_closed(self, path):
+        """ 分段写完后调用；写入器在后台收尾，大小由后台线程在下一次采样时更新 """
+        path = os.path.abspath(path)
+        with self._lock:
+            item = self._segments.get(path)
+            if item is not None:
+                item["active"] = False
+                item["settling"] = True
+                self._dirty = True
+
+    # ---------------- 空间预检与保留策略 ----------------
+    def free_bytes(self, directory=None):
+        directory = directory or self.root
+        while directory and not os.path.isdir(directory):
+            directory = os.path.dirname(directory)
+        try:
+            return shutil.disk_usage(directory or ".").free
+        except OSError:
+            return 0
+
+    def estimate_segment_bytes(self, seconds, fallback_bps):
+        """ 按最近的实际写入速率估算一个分段的大小，尚无统计时用 fallback_bps """
+        bps = self.write_bps if self.write_bps > 0 else fallback_bps
+        return int(bps * seconds * 1.2)
+
+    def preflight(self, directory, expected_bytes):
+        """
+        新分段开始前检查空间：剩余空间不足以写完该分段并保留 min_free_gb 时，
+        请求后台线程删除最旧的分段腾出空间(不在调用线程中删除文件)。返回当前空间是否足够
+        """
+        needed = expected_bytes + self.min_free_gb * GB
+        free = self.free_bytes(directory)
+        if free >= needed:
+            return True
+        with self._lock:
+            self._cleanup_request = (directory, needed - free)
+        self._wake.set()
+        return False
+
+    @staticmethod
+    def _device(path):
+        while path and not os.path.exists(path):
+            path = os.path.dirname(path)
+        try:
+            return os.stat(path or ".").st_dev
+        except OSError:
+            return None
+
+    def _delete_oldest(self, bytes_to_free, reason, camera=None, directory=None):
+        """
+        从最旧的已关闭分段开始删除，直到释放 bytes_to_free 字节；写入器仍在收尾(settling)的分段不删除。
+        指定 directory 时只删除与该目录位于同一文件系统的分段(删除其他磁盘上的文件无助于腾出空间)
+        """
+        device = self._device(directory) if directory is not None else None
+        with self._lock:
+            candidates = sorted(
+                (item for item in self._segments.values()
+                 if not item["active"] and not item.get("settling")
+                 and (camera is None or item["camera"] == camera)),
+                key=lambda item: item["created"]
+            )
+        if device is not None:
+            candidates = [item for item in candidates if self._device(item["path"]) == device]
+        freed = 0
+        for item in candidates:
+            if freed >= bytes_to_free:
+                break
+            freed += self._delete(item, reason)
+        return freed
+
+    def _delete(self, item, reason):
+        size = item.get("size", 0)
+        try:
+            os.remove(item["path"])
+            logger.info(f"{reason}，已删除录像: {item['path']}")
+        except FileNotFoundError:
+            size = 0
+        except OSError as e:
+            logger.warning(f"删除录像失败: {item['path']} {e}")
+            return 0
+        try:
+            os.remove(sidecar_path(item["path"]))  # 随录像一起删除检测旁路文件(录制原始画面模式)
+        except OSError:
+            pass
+        with self._lock:
+            self._segments.pop(item["path"], None)
+            self.deleted_segments += 1
+            self.deleted_bytes += size
+            self._dirty = True
+        return size
+
+    def _write_dirs(self):
+        """ 正在写入的分段所在目录 """
+        with self._lock:
+            return {os.path.dirname(item["path"]) for item in self._segments.values() if item["active"]}
+
+    def enforce(self, now=None):
+        """
+        执行保存天数、总容量、最小剩余空间三项保留策略。
+        最小剩余空间只在录像进行中检查，检查的是分段实际写入的目录
+        """
+        now = time.time() if now is None else now
+        if self.max_age_days > 0:
+            deadline = now - self.max_age_days * 86400
+            with self._lock:
+                expired = [item for item in self._segments.values()
+                           if not item["active"] and item["created"] < deadline]
+            for item in expired:
+                self._delete(item, "超过保存天数")
+        if self.max_gb > 0:
+            over = self.total_bytes() - self.max_gb * GB
+            if over > 0:
+                self._delete_oldest(over, "超过录像容量上限")
+        for directory in self._write_dirs():
+            shortage = self.min_free_gb * GB - self.free_bytes(directory)
+            if shortage > 0:
+                self._delete_oldest(shortage, "磁盘剩余空间不足", directory=directory)
+
+    # ---------------- 统计 ----------------
+    def total_bytes(self):
+        with self._lock:
+            return sum(item["size"] for item in self._segments.values())
+
+    def usage_by_camera(self):
+        """ {摄像头: (字节数, 分段数)} """
+        usage = {}
+        with self._lock:
+            for item in self._segments.values():
+                size, count = usage.get(item["camera"], (0, 0))
+                usage[item["camera"]] = (size + item["size"], count + 1)
+        return usage
+
+    def stats(self):
+        return {
+            "total_bytes": self.total_bytes(),
+            "free_bytes": self.free_bytes(),
+            "write_bps": self.write_bps,
+            "cameras": self.usage_by_camera(),
+            "deleted_segments": self.deleted_segments,
+            "deleted_bytes": self.deleted_bytes,
+        }
+
+    def _sample(self):
+        """ 只 stat 正在写入或刚关闭的分段，计算写入吞吐 """
+        with self._lock:
+            items = [item for item in self._segments.values() if item["active"] or item.get("settling")]
+        now = time.monotonic()
+        grown = 0
+        for item in items:
+            try:
+                size = os.path.getsize(item["path"])
+            except OSError:
+                continue
+            grown += max(0, size - item["size"])
+            with self._lock:
+                if size != item["size"]:
+                    item["size"] = size
+                    self._dirty = True
+                elif not item["active"]:
+                    item.pop("settling", None)  # 大小不再变化，收尾完成
+        if self._last_sample is not None:
+            self.write_bps = grown / max(now - self._last_sample, 1e-6)
+        self._last_sample = now
+        REGISTRY.set_gauge("storage_write_bytes_per_second", round(self.write_bps), "storage")
+        REGISTRY.set_gauge("storage_used_bytes", self.total_bytes(), "storage")
+
+    # ---------------- 后台线程 ----------------
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="StorageManager", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        last_retention = 0.0
+        while not self._stop_event.is_set():
+            self._wake.wait(self.sample_interval)
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                with self._lock:
+                    request, self._cleanup_request = self._cleanup_request, None
+                if request is not None:
+                    self._delete_oldest(request[1], "磁盘空间不足", directory=request[0])
+                self._sample()
+                if time.monotonic() - last_retention >= self.retention_interval:
+                    last_retention = time.monotonic()
+                    self.enforce()
+                    REGISTRY.set_gauge("storage_free_bytes", self.free_bytes(), "storage")
+                self._save_index()
+            except Exception as e:
+                logger.error(f"存储管理异常: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._save_index()
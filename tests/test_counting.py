@@ -0,0 +1,47 @@
+# 计数线穿越方向、线段范围判断与计数区域进入次数的测试。
+
+import numpy as np
+
+from counting import CountingLine, CountingZone
+
+
+def _move(item, path, track_id=1):
+    """ 让一个目标的中心依次经过 path 中的各点 """
+    for x, y in path:
+        item.update([track_id], np.array([[x, y]], np.float32))
+
+
+def test_line_counts_crossing_in_both_directions():
+    line = CountingLine("线1", [(100, 0), (100, 200)])
+    _move(line, [(50, 100), (90, 100), (110, 100), (150, 100)])
+    assert line.counts() == {"in": 0, "out": 1}
+    _move(line, [(150, 100), (60, 100)])
+    assert line.counts() == {"in": 1, "out": 1}
+
+
+def test_line_ignores_crossing_outside_segment():
+    line = CountingLine("线1", [(100, 0), (100, 200)])
+    # 中心在线段延长线上越过，不计数
+    _move(line, [(50, 300), (150, 300)])
+    assert line.counts() == {"in": 0, "out": 0}
+
+
+def test_line_does_not_count_new_track_on_other_side():
+    line = CountingLine("线1", [(100, 0), (100, 200)])
+    _move(line, [(50, 100)], track_id=1)
+    # 轨迹1消失，另一侧出现的新轨迹2没有上一帧位置，不算穿越
+    _move(line, [(150, 100), (160, 100)], track_id=2)
+    assert line.counts() == {"in": 0, "out": 0}
+
+
+def test_zone_counts_entries_and_occupancy():
+    zone = CountingZone("区域1", [(0, 0), (100, 0), (100, 100), (0, 100)])
+    zone.update([1, 2], np.array([[-50, 50], [200, 200]], np.float32))
+    assert zone.counts() == {"entered": 0, "occupancy": 0}
+    zone.update([1, 2], np.array([[50, 50], [60, 60]], np.float32))
+    assert zone.counts() == {"entered": 2, "occupancy": 2}
+    # 留在区域内不重复计数；离开后再进入计为新的一次
+    zone.update([1, 2], np.array([[55, 50], [160, 60]], np.float32))
+    assert zone.counts() == {"entered": 2, "occupancy": 1}
+    zone.update([1, 2], np.array([[60, 50], [90, 60]], np.float32))
+    assert zone.counts() == {"entered": 3, "occupancy": 2}
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 高分辨率分块检测辅助函数：把画面切成相互重叠的分块，
+# 以及用向量化的NMS合并跨分块边界的重复检测框。
+
+import math
+import numpy as np
+
+
+def make_tiles(width, height, tile_size=640, overlap=0.2, max_tiles=None):
+    """
+    生成覆盖整幅画面的重叠分块 [(x0, y0, x1, y1), ...]。
+    分块数超过 max_tiles 时逐步放大分块尺寸，使每帧开销可预期。
+    """
+    tile = int(tile_size)
+    while True:
+        tw, th = min(tile, width), min(tile, height)
+        step_x = max(1, int(tw * (1 - overlap)))
+        step_y = max(1, int(th * (1 - overlap)))
+        nx = 1 if width <= tw else math.ceil((width - tw) / step_x) + 1
+        ny = 1 if height <= th else math.ceil((height - th) / step_y) + 1
+        if not max_tiles or nx * ny <= max_tiles or (tw == width and th == height):
+            break
+        tile = int(tile * 1.25)
+
+    # 均匀分布起点，使最后一块恰好贴齐画面边缘
+    xs = np.linspace(0, width - tw, nx).astype(int) if nx > 1 else [0]
+    ys = np.linspace(0, height - th, ny).astype(int) if ny > 1 else [0]
+    return [(int(x), int(y), int(x) + tw, int(y) + th) for y in ys for x in xs]
+
+
+def pairwise_overlap(boxes):
+    """
+    计算 (N,4) 检测框两两之间的 IoU 与 IoS(交集/较小框面积)，均为 (N,N)
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    area = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    iw = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+    ih = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+    inter = iw * ih
+    union = area[:, None] + area[None, :] - inter
+    smaller = np.minimum(area[:, None], area[None, :])
+    iou = inter / np.maximum(union, 1e-6)
+    ios = inter / np.maximum(smaller, 1e-6)
+    return iou, ios
+
+
+def nms(boxes, scores, classes=None, iou_threshold=0.5, ios_threshold=None):
+    """
+    按类别的非极大值抑制，返回保留框的下标。
+    ios_threshold 用于合并被分块边界截断的框：截断框与完整框的IoU偏低，
+    但交集几乎覆盖较小的那个框。
+    """
+    boxes = np.asarray(boxes, np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, np.float32).reshape(-1)
+    if len(boxes) == 0:
+        return np.zeros((0,), np.int64)
+
+    order = np.argsort(-scores)
+    b = boxes[order]
+    iou, ios = pairwise_overlap(b)
+    suppress = iou > iou_threshold
+    if ios_threshold is not None:
+        suppress |= ios > ios_threshold
+    if classes is not None:
+        c = np.asarray(classes).reshape(-1)[order]
+        suppress &= c[:, None] == c[None, :]
+    # 只允许得分更高的框抑制得分更低的框
+    suppress = np.triu(suppress, k=1)
+
+    keep = np.ones(len(b), bool)
+    for i in range(len(b)):
+        if keep[i]:
+            keep[i + 1:] &= ~suppress[i, i + 1:]
+    return order[keep]
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 多目标跟踪：在检测器之后为目标分配稳定的ID。
+# 用向量化的IoU代价矩阵做检测框与轨迹的关联(同类别才可匹配)，IoU不足时按中心距离关联
+# (允许的距离随距上次匹配经过的帧数放宽，跳帧推理时移动较快的目标不会因框不再重叠而断开)，
+# 匹配不上的检测框新建轨迹，连续多次未匹配的轨迹删除。
+# 跳帧(未推理)的帧上按估计的速度外推轨迹位置，计数不会因降低检测频率而丢失。
+
+import numpy as np
+import cv2
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None  # 没有scipy时使用贪心匹配
+
+
+def iou_matrix(a, b):
+    """
+    两组框的IoU矩阵
+    a: (N,4)  b: (M,4)  xyxy格式，返回 (N,M)
+    """
+    a = np.asarray(a, np.float32).reshape(-1, 4)
+    b = np.asarray(b, np.float32).reshape(-1, 4)
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), np.float32)
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y1 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def center_distance_matrix(a, b):
+    """ 两组框中心点之间的距离矩阵 (N,M) """
+    a = np.asarray(a, np.float32).reshape(-1, 4)
+    b = np.asarray(b, np.float32).reshape(-1, 4)
+    ca = np.stack([(a[:, 0] + a[:, 2]) * 0.5, (a[:, 1] + a[:, 3]) * 0.5], axis=1)
+    cb = np.stack([(b[:, 0] + b[:, 2]) * 0.5, (b[:, 1] + b[:, 3]) * 0.5], axis=1)
+    return np.linalg.norm(ca[:, None, :] - cb[None, :, :], axis=2)
+
+
+def _assign(score, threshold):
+    """
+    按得分矩阵(越大越好)做一对一匹配，返回 [(行, 列)]，得分低于阈值的匹配丢弃
+    """
+    if score.size == 0:
+        return []
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(-score)
+        pairs = zip(rows, cols)
+    else:
+        # 贪心：按得分从高到低依次匹配
+        order = np.argsort(-score, axis=None)
+        used_r, used_c, pairs = set(), set(), []
+        for idx in order:
+            r, c = divmod(int(idx), score.shape[1])
+            if score[r, c] < threshold:
+                break
+            if r not in used_r and c not in used_c:
+                used_r.add(r)
+                used_c.add(c)
+                pairs.append((r, c))
+    return [(int(r), int(c)) for r, c in pairs if score[r, c] >= threshold]
+
+
+class Track:
+    """
+    一条轨迹：xyxy 为当前(可能是外推的)位置，velocity 为每帧的位移估计
+    """
+    __slots__ = ("track_id", "xyxy", "velocity", "cls", "conf", "hits", "misses",
+                 "since_update", "age")
+
+    def __init__(self, track_id, xyxy, cls, conf):
+        self.track_id = track_id
+        self.xyxy = np.asarray(xyxy, np.float32).copy()
+        self.velocity = np.zeros(4, np.float32)
+        self.cls = int(cls)
+        self.conf = float(conf)
+        self.hits = 1           # 累计匹配次数
+        self.misses = 0         # 连续未匹配的推理次数
+        self.since_update = 0   # 距上次匹配经过的帧数(含跳帧)
+        self.age = 1
+
+    def center(self):
+        x0, y0, x1, y1 = self.xyxy
+        return (x0 + x1) * 0.5, (y0 + y1) * 0.5
+
+
+class MultiObjectTracker:
+    """
+    基于IoU关联的轻量多目标跟踪器。
+    推理帧调用 update(dets)，跳帧调用 predict()；两者都返回当前可见的轨迹列表。
+    """
+    def __init__(self, iou_threshold=0.3, max_missed=5, min_hits=2, max_coast_frames=60,
+                 velocity_alpha=0.5, center_gate=0.25):
+        self.iou_threshold = iou_threshold
+        # IoU不足时按中心距离关联：每经过一帧允许的中心位移(相对框的宽高几何平均)
+        self.center_gate = center_gate
+        self.max_missed = max_missed              # 连续多少次推理未匹配后删除
+        self.min_hits = min_hits                  # 匹配多少次后才显示/参与计数
+        self.max_coast_frames = max_coast_frames  # 外推的最大帧数，超过后保持不动
+        self.velocity_alpha = velocity_alpha      # 速度平滑系数
+        self._tracks = []
+        self._next_id = 1
+
+    def reset(self):
+        self._tracks = []
+        self._next_id = 1
+
+    @property
+    def tracks(self):
+        """ 当前可见(已确认且本次推理匹配到或正在外推)的轨迹 """
+        return [t for t in self._tracks if t.hits >= self.min_hits]
+
+    def predict(self):
+        """ 未推理的帧：按速度外推所有轨迹位置 """
+        for t in self._tracks:
+            t.since_update += 1
+            t.age += 1
+            if t.since_update <= self.max_coast_frames:
+                t.xyxy += t.velocity
+        return self.tracks
+
+    def update(self, dets):
+        """
+        推理帧：先外推一帧，再把检测框与轨迹按IoU关联
+        dets: detection.Detections
+        """
+        self.predict()
+
+        boxes = dets.xyxy
+        if self._tracks and len(dets) > 0:
+            pairs = _assign(self._association_score(boxes, dets.cls), 1e-6)
+        else:
+            pairs = []
+
+        matched_tracks = set()
+        matched_dets = set()
+        for ti, di in pairs:
+            t = self._tracks[ti]
+            new_box = boxes[di]
+            # 基准位置是上次匹配时的框(外推前)，位移按经过的帧数平均
+            last_box = t.xyxy - t.velocity * min(t.since_update, self.max_coast_frames)
+            v = (new_box - last_box) / max(t.since_update, 1)
+            t.velocity = self.velocity_alpha * v + (1.0 - self.velocity_alpha) * t.velocity
+            t.xyxy = new_box.astype(np.float32).copy()
+            t.conf = float(dets.conf[di])
+            t.hits += 1
+            t.misses = 0
+            t.since_update = 0
+            matched_tracks.add(ti)
+            matched_dets.add(di)
+
+        # 未匹配的轨迹累计丢失次数，超过阈值删除；尚未确认的轨迹丢失一次即删除
+        alive = []
+        for i, t in enumerate(self._tracks):
+            if i not in matched_tracks:
+                t.misses += 1
+                if t.misses > self.max_missed or t.hits < self.min_hits:
+                    continue
+            alive.append(t)
+
+        # 未匹配的检测框新建轨迹
+        for di in range(len(dets)):
+            if di not in matched_dets:
+                alive.append(Track(self._next_id, boxes[di], dets.cls[di], dets.conf[di]))
+                self._next_id += 1
+
+        self._tracks = alive
+        return self.tracks
+
+    def _association_score(self, boxes, cls):
+        """
+        关联得分(越大越好，0 表示不可匹配)：IoU达到阈值的为 1+IoU，优先匹配；
+        其余按中心距离在门限内的程度给出 (0,1] 的得分。门限 = center_gate × 框尺寸 × 距上次匹配的帧数，
+        新建轨迹还没有速度估计，跳帧推理时只能靠距离门限接上
+        """
+        track_boxes = np.stack([t.xyxy for t in self._tracks])
+        iou = iou_matrix(track_boxes, boxes)
+        dist = center_distance_matrix(track_boxes, boxes)
+        size = np.sqrt(np.clip(track_boxes[:, 2] - track_boxes[:, 0], 1, None) *
+                       np.clip(track_boxes[:, 3] - track_boxes[:, 1], 1, None))
+        frames = np.array([min(max(t.since_update, 1), self.max_coast_frames) for t in self._tracks],
+                          np.float32)
+        gate = self.center_gate * size * frames
+        near = np.clip(1.0 - dist / gate[:, None], 0.0, 1.0)
+        score = np.where(iou >= self.iou_threshold, 1.0 + iou, near).astype(np.float32)
+        # 类别不同的不允许匹配
+        track_cls = np.array([t.cls for t in self._tracks], np.int32)
+        score[track_cls[:, None] != cls[None, :]] = 0.0
+        return score
+
+
+def track_color(track_id):
+    return (int(track_id * 53 % 256), int(track_id * 97 % 256), int(255 - track_id * 29 % 256))
+
+
+def draw_tracks(frame, tracks, names=None, copy=True):
+    """ 绘制轨迹框与 "#ID 类别" 标签，外推中的轨迹用细线 """
+    out = frame.copy() if copy else frame
+    for t in tracks:
+        x0, y0, x1, y1 = (int(v) for v in t.xyxy)
+        color = track_color(t.track_id)
+        cv2.rectangle(out, (x0, y0), (x1, y1), color, 2 if t.since_update == 0 else 1)
+        name = names.get(t.cls, str(t.cls)) if isinstance(names, dict) else str(t.cls)
+        cv2.putText(out, f"#{t.track_id} {name}", (x0, max(y0 - 5, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+    return out
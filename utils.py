@@ -15,7 +15,7 @@ SUPPORTED_FPS = [15, 30, 60]
 
 def detect_cameras(max_test=5, mobile_camera_urls=None):
     """
-    检测可用的摄像头，返回 {index: name} 的dict
+    检测可用的摄像头，返回 {index或URL: name} 的dict
     Args:
         max_test: 本机摄像头最大检测数量。
         mobile_camera_urls: 可选，手机摄像头的URL列表（如通过IP Webcam提供的地址）。
@@ -35,14 +35,14 @@ def detect_cameras(max_test=5, mobile_camera_urls=None):
             if cap:
                 cap.release()
 
-    # 检测手机摄像头
+    # 检测手机摄像头，以URL作为键，采集线程据此使用网络流读取器
     if mobile_camera_urls:
-        for idx, url in enumerate(mobile_camera_urls, start=max_test):
+        for url in mobile_camera_urls:
             try:
-                # 测试手机摄像头流是否可用
-                response = requests.get(url, stream=True, timeout=2)
-                if response.status_code == 200:
-                    camera_dict[idx] = f"Mobile Camera {url}"
+                # 测试手机摄像头流是否可用(只读响应头，随即关闭连接)
+                with requests.get(url, stream=True, timeout=2) as response:
+                    if response.status_code == 200:
+                        camera_dict[url] = f"Mobile Camera {url}"
             except:
                 pass
 
@@ -1,30 +1,78 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # 封装一个简单的视频回放控制类，使用 QTimer 来按帧读取并发给主窗口显示。
+# 支持 0.25×~32× 变速：显示帧率有上限，高倍速时用 grab() 跳过中间帧(不解码转换为图像)，
+# 只读取并显示需要呈现的帧。
 import cv2
 from PyQt5.QtCore import QTimer
 import numpy as np
+import time
+from metrics import REGISTRY
+from frame_pool import FRAME_POOL, pooled_read
+from frame_envelope import FrameEnvelope
+from app_logging import get_logger
+
+PLAYBACK_SPEEDS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+MAX_DISPLAY_FPS = 30.0  # 界面最多每秒刷新的帧数，超出部分用 grab() 跳过
+
 
 class VideoPlayer:
     """
     用于本地视频回放的封装类
     """
-    def __init__(self, filePath, mainWindow, fps=30):
+    def __init__(self, filePath, mainWindow, fps=30, speed=1.0):
         self.filePath = filePath
         self.mainWindow = mainWindow
         self.cap = None
         self.isPlaying = False
         self.isPaused = False
-        self.fps = fps
+        self.fps = fps  # 视频文件的原始帧率，打开文件后以文件中的为准
+        self.speed = speed
+        self._due = 0.0  # 累计应前进的帧数(小数部分留到下一次)
+        self.frameShape = None  # 上一帧的形状，下一帧按此从帧池取缓冲区
+        self._lastTick = None
+        # 吞吐统计：每秒前进(含跳过)的帧数与实际显示的帧数
+        self.framesAdvanced = 0
+        self.framesPresented = 0
+        self.decodeFps = 0.0
+        self.presentFps = 0.0
+        self._statTime = time.perf_counter()
+        self._statAdvanced = 0
+        self._statPresented = 0
         self.timer = QTimer()
         self.timer.timeout.connect(self._next_frame)
+        self.logger = get_logger("player")
 
     def open(self):
         self.cap = cv2.VideoCapture(self.filePath)
         if not self.cap.isOpened():
             return False
+        fileFps = self.cap.get(cv2.CAP_PROP_FPS)
+        if 1.0 <= fileFps <= 240.0:
+            self.fps = fileFps
         return True
 
+    def _interval_ms(self):
+        return max(1, int(1000 / min(self.fps * self.speed, MAX_DISPLAY_FPS)))
+
+    def set_speed(self, speed):
+        """ 修改播放倍速，播放中立即生效 """
+        self.speed = float(speed)
+        self._due = 0.0
+        self._lastTick = None
+        if self.timer.isActive():
+            self.timer.start(self._interval_ms())
+
+    @property
+    def effectiveSpeed(self):
+        """ 实际达到的倍速(受磁盘与解码速度限制) """
+        return self.decodeFps / self.fps if self.fps else 0.0
+
+    def seek(self, index):
+        """ 跳转到指定帧 """
+        if self.cap:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, int(index)))
+
     def get_total_frames(self):
         if self.cap:
             return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -33,12 +81,15 @@ class VideoPlayer:
     def start(self):
         self.isPlaying = True
         self.isPaused = False
-        self.timer.start(int(1000 / (self.fps + 1e-6)))
+        self._lastTick = None
+        self.timer.start(self._interval_ms())
 
     def pause(self):
         self.isPaused = True
         self.isPlaying = False
         self.timer.stop()
+        self.decodeFps = 0.0
+        self.presentFps = 0.0
 
     def stop(self):
         self.isPlaying = False
@@ -54,24 +105,62 @@ class VideoPlayer:
         if not self.isPlaying or self.isPaused or (not self.cap):
             return
 
-        ret, frame = self.cap.read()
+        # 本次应前进的帧数：按实际经过的时间累计，显示帧率封顶后多出的帧用 grab() 跳过
+        start = time.perf_counter()
+        rate = self.fps * self.speed
+        if rate <= MAX_DISPLAY_FPS:
+            step = 1
+        else:
+            elapsed = 1.0 / MAX_DISPLAY_FPS if self._lastTick is None else min(start - self._lastTick, 0.5)
+            self._due += elapsed * rate
+            step = max(1, int(self._due))
+            self._due -= step
+        self._lastTick = start
+
+        for _ in range(step - 1):
+            if not self.cap.grab():
+                self.mainWindow.stop_video()
+                return
+        ret, frame = pooled_read(self.cap, self.frameShape)
         if not ret or frame is None:
             # 播放结束
             self.mainWindow.stop_video()
             return
+        try:
+            self._present(frame, start, step, time.monotonic())
+        finally:
+            FRAME_POOL.release(frame)
+
+    def _present(self, frame, start, step, decodeTs):
+        """ 统计并把帧交给主界面；帧来自帧缓冲池，返回后由 _next_frame 归还 """
+        captureTime = time.perf_counter() - start
+        self._update_stats(step)
 
         # 检查帧是否为有效的 numpy.ndarray
         if not isinstance(frame, np.ndarray):
-            self.mainWindow.logViewer.append(f"[ERROR] 无效的帧格式: {type(frame)}")
+            self.logger.error(f"无效的帧格式: {type(frame)}")
             self.mainWindow.stop_video()
             return
-
-        # 输出帧的形状，帮助调试
-        self.mainWindow.logViewer.append(f"[DEBUG] 帧形状: {frame.shape}")
+        self.frameShape = frame.shape
 
         current_pos = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
         # 更新主界面进度条显示
         self.mainWindow.update_playback_position(current_pos)
 
-        # 通知主界面更新画面
-        self.mainWindow.update_playback_frame(frame)
\ No newline at end of file
+        # 通知主界面更新画面(信封序号即帧号，用于检测结果缓存)
+        env = FrameEnvelope(frame, current_pos - 1, "playback", decodeTs)
+        env.mark("capture", captureTime)
+        self.mainWindow.update_playback_frame(env)
+
+    def _update_stats(self, step):
+        self.framesAdvanced += step
+        self.framesPresented += 1
+        now = time.perf_counter()
+        span = now - self._statTime
+        if span >= 1.0:
+            self.decodeFps = (self.framesAdvanced - self._statAdvanced) / span
+            self.presentFps = (self.framesPresented - self._statPresented) / span
+            self._statTime = now
+            self._statAdvanced = self.framesAdvanced
+            self._statPresented = self.framesPresented
+            REGISTRY.set_gauge("playback_decode_fps", round(self.decodeFps, 1), "playback")
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 可插拔的视频写入后端：
+#   - FfmpegWriter：把原始BGR帧通过管道送给本地 ffmpeg 子进程编码，
+#     编码在解释器之外并行进行，可配置编码器/preset/CRF/线程数；
+#   - OpenCVWriter：cv2.VideoWriter 的薄封装，作为没有 ffmpeg 时的后备。
+# 两者接口一致：write(frame, timestamp=None) / release() / isOpened() / backlog / dropped。
+# 传入采集时刻时按恒定帧率时间轴对齐(丢帧处重复上一帧、过密的帧跳过)，录像时长与实际时间一致。
+
+import os
+import sys
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+from collections import deque
+
+import cv2
+import numpy as np
+
+from frame_pool import FRAME_POOL
+
+logger = logging.getLogger("videoapp.writer")
+
+BACKEND_AUTO = "auto"
+BACKEND_FFMPEG = "ffmpeg"
+BACKEND_OPENCV = "opencv"
+
+FFMPEG_CODECS = ["libx264", "libx265", "mpeg4"]
+FFMPEG_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow"]
+DEFAULT_CODEC = "libx264"
+DEFAULT_PRESET = "veryfast"
+DEFAULT_CRF = 23
+
+
+def find_ffmpeg():
+    """ 返回 ffmpeg 可执行文件路径，找不到时返回 None """
+    return os.environ.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+
+
+def _subprocess_flags():
+    # Windows 下不弹出控制台窗口
+    return getattr(subprocess, "CREATE_NO_WINDOW", 0) if sys.platform.startswith("win") else 0
+
+
+def codec_args(codec, preset=DEFAULT_PRESET, crf=DEFAULT_CRF, threads=0):
+    """ 生成编码参数，不同编码器的质量参数写法不同 """
+    args = ["-c:v", codec]
+    if codec in ("libx264", "libx265"):
+        args += ["-preset", preset, "-crf", str(crf)]
+    elif codec == "mpeg4":
+        # mpeg4 没有 CRF，用 qscale 近似：CRF 0~51 映射到 q 2~31
+        args += ["-q:v", str(max(2, min(31, int(2 + crf * 29 / 51))))]
+    if threads:
+        args += ["-threads", str(threads)]
+    return args + ["-pix_fmt", "yuv420p"]
+
+
+class CfrPacer:
+    """
+    把按采集时刻到达的帧对齐到恒定帧率时间轴：
+    帧晚到(中间有丢帧)时需重复上一帧补齐空位，帧早到(该时间槽已写过帧)时跳过。
+    长时间中断(如网络重连)只补 max_gap 秒，其余时间轴整体后移，避免写入大量重复帧
+    """
+    def __init__(self, fps, max_gap=2.0):
+        self.fps = float(fps)
+        self.max_gap = max_gap
+        self.t0 = None
+        self.written = 0  # 时间轴上已占用的帧位数
+
+    def slots(self, ts):
+        """ 返回 (需重复上一帧的次数, 是否写入本帧) """
+        if self.t0 is None:
+            self.t0 = ts
+            self.written = 1
+            return 0, True
+        index = int(round((ts - self.t0) * self.fps))
+        if index < self.written:
+            return 0, False
+        repeat = index - self.written
+        limit = int(self.max_gap * self.fps)
+        if repeat > limit:
+            self.t0 += (repeat - limit) / self.fps
+            repeat = limit
+        self.written += repeat + 1
+        return repeat, True
+
+
+class _PacedWriter:
+    """
+    写入器公共部分：带时间戳写入时经 CfrPacer 对齐，子类实现 _write_frame()(返回该帧是否写入)。
+    frames 为已写入文件的帧数，写入后 frames - 1 即当前帧在录像中的帧号
+    """
+    def _init_pacing(self, fps):
+        self.pacer = CfrPacer(fps)
+        self.frames = 0
+        self.duplicated = 0  # 为补齐时间轴重复写入的帧数
+        self.skipped = 0     # 因过密而跳过的帧数
+        self._last = None    # 上一帧(按时间戳写入时保留，用于补帧)
+
+    def write(self, frame, timestamp=None):
+        """
+        timestamp 为帧的采集时刻(time.monotonic())，为 None 时按到达顺序逐帧写入。
+        返回当前帧是否写入了文件(被跳过或被编码队列丢弃时为 False)
+        """
+        if timestamp is None:
+            return self._count(self._write_frame(frame))
+        repeat, keep = self.pacer.slots(timestamp)
+        if not keep:
+            self.skipped += 1
+            return False
+        if repeat and self._last is not None:
+            for _ in range(repeat):
+                self._count(self._write_frame(self._last))
+            self.duplicated += repeat
+        written = self._count(self._write_frame(frame))
+        FRAME_POOL.retain(frame)
+        FRAME_POOL.release(self._last)
+        self._last = frame
+        return written
+
+    def _count(self, written):
+        if written:
+            self.frames += 1
+        return written
+
+    def _drop_last(self):
+        last, self._last = self._last, None
+        FRAME_POOL.release(last)
+
+
+class OpenCVWriter(_PacedWriter):
+    """ cv2.VideoWriter 封装，写入为同步调用 """
+    backlog = 0
+    dropped = 0
+
+    def __init__(self, path, fps, size, fourcc=None):
+        self.path = path
+        self.size = tuple(size)
+        fourcc = fourcc if fourcc is not None else cv2.VideoWriter_fourcc(*"mp4v")
+        self.writer = cv2.VideoWriter(path, fourcc, float(fps), self.size)
+        self._init_pacing(fps)
+
+    def isOpened(self):
+        return self.writer.isOpened()
+
+    def _write_frame(self, frame):
+        if frame.shape[1::-1] == self.size:
+            self.writer.write(frame)
+            return True
+        # 尺寸不一致时 VideoWriter 会静默丢帧，缩放到池中的缓冲区再写入
+        resized = FRAME_POOL.acquire((self.size[1], self.size[0]) + frame.shape[2:], frame.dtype)
+        try:
+            self.writer.write(cv2.resize(frame, self.size, dst=resized))
+        finally:
+            FRAME_POOL.release(resized)
+        return True
+
+    def release(self):
+        self._drop_last()
+        self.writer.release()
+
+
+class FfmpegWriter(_PacedWriter):
+    """
+    通过 stdin 管道把原始帧送给 ffmpeg 编码。
+    write() 只把帧放入有界队列，由写线程送入管道；编码跟不上时丢帧而不阻塞采集。
+    """
+    def __init__(self, path, fps, size, codec=DEFAULT_CODEC, preset=DEFAULT_PRESET, crf=DEFAULT_CRF,
+                 threads=0, queue_size=60, ffmpeg_bin=None):
+        self.path = path
+        self.size = tuple(size)
+        self.dropped = 0
+        self._init_pacing(fps)
+        self._errors = deque(maxlen=20)
+        ffmpeg_bin = ffmpeg_bin or find_ffmpeg()
+        if not ffmpeg_bin:
+            raise RuntimeError("未找到 ffmpeg 可执行文件")
+
+        w, h = self.size
+        cmd = [
+            ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", f"{float(fps):.3f}",
+            "-i", "-", "-an",
+        ] + codec_args(codec, preset, crf, threads) + [path]
+        self.proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            creationflags=_subprocess_flags()
+        )
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(target=self._write_loop, name="FfmpegWriter", daemon=True)
+        self._stderr = threading.Thread(target=self._read_stderr, name="FfmpegStderr", daemon=True)
+        self._writer.start()
+        self._stderr.start()
+
+    @property
+    def backlog(self):
+        """ 等待送入编码器的帧数 """
+        return self._queue.qsize()
+
+    def isOpened(self):
+        return self.proc.poll() is None
+
+    def _write_frame(self, frame):
+        """
+        帧进入队列期间由本写入器持有：池中的帧 retain 后直接入队(不复制)，
+        写入管道后 release；尺寸不一致时缩放到新取的池缓冲区
+        """
+        if frame.shape[1::-1] != self.size:
+            # 原始管道要求每帧尺寸严格一致
+            resized = FRAME_POOL.acquire((self.size[1], self.size[0]) + frame.shape[2:], frame.dtype)
+            frame = cv2.resize(frame, self.size, dst=resized)
+        else:
+            FRAME_POOL.retain(frame)
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            FRAME_POOL.release(frame)
+            self.dropped += 1
+            return False
+
+    def _write_loop(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            try:
+                # 直接写入numpy缓冲区，避免额外拷贝；写管道期间释放GIL
+                self.proc.stdin.write(np.ascontiguousarray(frame).data)
+            except (BrokenPipeError, OSError, ValueError) as e:
+                logger.error(f"ffmpeg 写入失败: {e} {' '.join(self._errors)}")
+                break
+            finally:
+                FRAME_POOL.release(frame)
+        # 排空队列，避免 write() 端一直阻塞或积压
+        while not self._queue.empty():
+            try:
+                FRAME_POOL.release(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _read_stderr(self):
+        for line in iter(self.proc.stderr.readline, b""):
+            self._errors.append(line.decode("utf-8", "replace").strip())
+
+    def release(self, timeout=30.0):
+        """ 送出剩余帧并等待 ffmpeg 完成文件封装 """
+        self._drop_last()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass  # 写线程已因管道错误退出
+        self._writer.join(timeout)
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        if self.proc.returncode not in (0, None):
+            logger.error(f"ffmpeg 退出码 {self.proc.returncode}: {' '.join(self._errors)}")
+
+
+def create_video_writer(path, fps, size, backend=BACKEND_AUTO, fourcc=None, codec=DEFAULT_CODEC,
+                        preset=DEFAULT_PRESET, crf=DEFAULT_CRF, threads=0):
+    """
+    按后端设置创建写入器。选择 ffmpeg 但不可用或启动失败时回退到 OpenCV。
+    """
+    if backend in (BACKEND_AUTO, BACKEND_FFMPEG) and find_ffmpeg():
+        try:
+            return FfmpegWriter(path, fps, size, codec=codec, preset=preset, crf=crf, threads=threads)
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"启动 ffmpeg 编码失败，回退到 OpenCV: {e}")
+    elif backend == BACKEND_FFMPEG:
+        logger.warning("未找到 ffmpeg，回退到 OpenCV VideoWriter")
+    return OpenCVWriter(path, fps, size, fourcc)
+
+
+def release_async(writer):
+    """
+    在后台线程中释放写入器：ffmpeg 需要编完剩余帧并封装文件，
+    分段切换时不应阻塞界面线程
+    """
+    if writer is None:
+        return None
+    t = threading.Thread(target=writer.release, name="WriterRelease")
+    t.start()
+    return t
+
+
+def transcode_file(src, dst, codec=DEFAULT_CODEC, preset=DEFAULT_PRESET, crf=DEFAULT_CRF, threads=0):
+    """
+    用 ffmpeg 直接转换文件格式(解码与编码都在子进程中完成)，
+    返回 (是否成功, 错误信息)
+    """
+    ffmpeg_bin = find_ffmpeg()
+    if not ffmpeg_bin:
+        return False, "未找到 ffmpeg"
+    cmd = [ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-y", "-i", src, "-an"] \
+        + codec_args(codec, preset, crf, threads) + [dst]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          creationflags=_subprocess_flags())
+    if proc.returncode != 0:
+        return False, proc.stderr.decode("utf-8", "replace").strip()
+    return True, ""